@@ -0,0 +1,78 @@
+"""
+Preenche users.phone_e164 (migration 015) para os usuários existentes
+
+Percorre a tabela em lotes por id (cada lote é uma transação curta), grava a
+chave canônica de src/core/phone.py e, no fim, lista chaves repetidas - o
+mesmo número salvo com e sem o nono dígito em contas diferentes, que
+precisam ser unificadas manualmente.
+
+Pode ser executado de novo a qualquer momento (só linhas com a chave
+ausente ou desatualizada são alteradas).
+
+Uso:
+    python backfill_phone_e164.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+from sqlalchemy import func, select, update
+from src.core.database import SessionLocal
+from src.core.phone import canonical_phone
+from src.models.demand import Demand  # noqa: F401 (relationships)
+from src.models.demand_supporter import DemandSupporter  # noqa: F401
+from src.models.interaction import Interaction  # noqa: F401
+from src.models.pl_interaction import PLInteraction  # noqa: F401
+from src.models.user import User
+
+
+def backfill(batch_size: int, dry_run: bool) -> int:
+    db = SessionLocal()
+    updated = 0
+    last_id = None
+
+    try:
+        while True:
+            query = select(User.id, User.phone, User.phone_e164).order_by(User.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(User.id > last_id)
+            rows = db.execute(query).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            changes = [
+                {"id": row.id, "phone_e164": canonical_phone(row.phone)}
+                for row in rows
+                if canonical_phone(row.phone) != row.phone_e164
+            ]
+            if changes and not dry_run:
+                # UPDATE em lote por chave primária (executemany)
+                db.execute(update(User), changes)
+                db.commit()
+
+            updated += len(changes)
+            print(f"   ... {updated} usuários {'a atualizar' if dry_run else 'atualizados'}")
+
+        duplicates = db.execute(
+            select(User.phone_e164, func.array_agg(User.phone))
+            .where(User.phone_e164.isnot(None))
+            .group_by(User.phone_e164)
+            .having(func.count() > 1)
+        ).all()
+        if duplicates:
+            print(f"\n⚠️  {len(duplicates)} números com mais de uma conta:")
+            for key, phones in duplicates:
+                print(f"   {key}: {', '.join(phones)}")
+
+        return updated
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("🚀 Preenchendo users.phone_e164...\n")
+    total = backfill(args.batch_size, args.dry_run)
+    print(f"\n✅ {total} usuários {'a atualizar (dry-run)' if args.dry_run else 'atualizados'}")
@@ -0,0 +1,114 @@
+"""
+Load test: sessão síncrona vs. AsyncSession em rotas async
+
+Sobe (em processo) um app FastAPI com duas rotas que fazem a mesma consulta
+de listagem de demandas, mais um pg_sleep que simula a latência de rede até
+o Postgres:
+
+- sync: `async def` + SessionLocal (padrão anterior das rotas) - cada
+  consulta bloqueia o event loop e as requisições ficam em fila
+- async: `async def` + AsyncSessionLocal (asyncpg) - o loop atende outras
+  requisições enquanto espera o banco
+
+Para cada nível de concorrência reporta requisições/s e latência p50/p95.
+A vazão da rota async deve crescer com a concorrência (até o tamanho do pool);
+a da rota sync fica estável.
+
+Uso:
+    python benchmarks/async_db_load.py [--requests 200] [--concurrency 1 10 50] [--db-latency-ms 5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import func, select, text
+from src.core.database import AsyncSessionLocal, SessionLocal, async_engine
+from src.models.demand import Demand
+from src.models.demand_supporter import DemandSupporter  # noqa: F401 (relationships)
+from src.models.interaction import Interaction  # noqa: F401
+from src.models.pl_interaction import PLInteraction  # noqa: F401
+from src.models.user import User  # noqa: F401
+
+DB_LATENCY_SECONDS = 0.005
+
+app = FastAPI()
+
+
+def _list_query():
+    return select(Demand.id, Demand.title).order_by(Demand.created_at.desc()).limit(20)
+
+
+@app.get("/sync")
+async def list_sync():
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT pg_sleep(:s)"), {"s": DB_LATENCY_SECONDS})
+        rows = db.execute(_list_query()).all()
+        total = db.scalar(select(func.count(Demand.id)))
+        return {"items": len(rows), "total": total}
+    finally:
+        db.close()
+
+
+@app.get("/async")
+async def list_async():
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT pg_sleep(:s)"), {"s": DB_LATENCY_SECONDS})
+        rows = (await db.execute(_list_query())).all()
+        total = await db.scalar(select(func.count(Demand.id)))
+        return {"items": len(rows), "total": total}
+
+
+async def load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    wall = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "req_per_s": round(requests / wall, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1),
+    }
+
+
+async def main():
+    global DB_LATENCY_SECONDS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 10, 50])
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    DB_LATENCY_SECONDS = args.db_latency_ms / 1000
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/sync", "/async"):
+            await load(client, path, 10, 5)  # aquecimento do pool
+            for concurrency in args.concurrency:
+                result = await load(client, path, args.requests, concurrency)
+                print({"route": path, "concurrency": concurrency, **result})
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Benchmark: ingestão de áudio (caminho antigo com arquivo temporário vs. em memória)
+
+Gera notas de voz sintéticas em Ogg/Opus (mesmo formato do WhatsApp) e mede,
+para cada duração:
+
+- legacy: grava /tmp/audio_<uuid>.ogg, decodifica tudo para obter a duração
+  (pydub se instalado, senão PyAV) e decodifica de novo a partir do disco
+  (o que o WhisperModel fazia ao receber o caminho)
+- in_memory: whisper_service.decode_audio_bytes (uma decodificação, duração
+  do cabeçalho do container)
+
+Com --transcribe, inclui a transcrição (WHISPER_MODEL) nos dois caminhos.
+
+Uso:
+    python benchmarks/audio_ingestion.py [--durations 10 30 60 120] [--repeat 5] [--transcribe]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import av
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faster_whisper import decode_audio
+from src.services import whisper_service
+
+
+def make_voice_note(seconds: float, rate: int = 48000) -> bytes:
+    """Ogg/Opus mono com um sinal parecido com voz (tons modulados + ruído)"""
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t))
+    signal = envelope * (0.2 * np.sin(2 * np.pi * 220 * t) + 0.1 * np.sin(2 * np.pi * 660 * t))
+    signal += 0.01 * np.random.default_rng(0).standard_normal(len(t))
+    samples = signal.astype(np.float32)
+
+    buffer = io.BytesIO()
+    with av.open(buffer, "w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=rate)
+        stream.layout = "mono"
+        for start in range(0, len(samples), 960):
+            frame = av.AudioFrame.from_ndarray(samples[start:start + 960][None, :], format="flt", layout="mono")
+            frame.rate = rate
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def legacy_ingest(content: bytes):
+    path = os.path.join(tempfile.gettempdir(), f"audio_{uuid.uuid4()}.ogg")
+    try:
+        with open(path, "wb") as f:
+            f.write(content)
+
+        try:
+            from pydub import AudioSegment
+            duration = len(AudioSegment.from_file(path)) / 1000.0
+        except Exception:
+            duration = len(decode_audio(path)) / whisper_service.SAMPLE_RATE
+
+        audio = decode_audio(path)
+        return audio, duration
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def in_memory_ingest(content: bytes):
+    return whisper_service.decode_audio_bytes(content)
+
+
+def measure(fn, content: bytes, repeat: int, transcribe: bool) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        audio, _ = fn(content)
+        if transcribe:
+            asyncio.run(whisper_service.transcribe_audio(audio))
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[10, 30, 60, 120])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--transcribe", action="store_true", help="inclui a transcrição no tempo medido")
+    args = parser.parse_args()
+
+    print(f"{'duration_s':>10} {'size_kb':>8} {'legacy_ms':>10} {'in_memory_ms':>13} {'speedup':>8} {'header_s':>9}")
+    for seconds in args.durations:
+        content = make_voice_note(seconds)
+        legacy = measure(legacy_ingest, content, args.repeat, args.transcribe)
+        in_memory = measure(in_memory_ingest, content, args.repeat, args.transcribe)
+        _, header_duration = whisper_service.decode_audio_bytes(content)
+        print(
+            f"{seconds:>10.0f} {len(content) / 1024:>8.1f} {legacy * 1000:>10.1f} "
+            f"{in_memory * 1000:>13.1f} {legacy / in_memory:>7.2f}x {header_duration:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
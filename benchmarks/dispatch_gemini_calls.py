@@ -0,0 +1,161 @@
+"""
+Benchmark: chamadas ao Gemini por fluxo de demanda completo
+
+Roda o fluxo guiado (menu -> descrição -> local -> categoria -> confirmação)
+pelo process_turn com STATE_DISPATCH_ENABLED desligado (classifica toda
+mensagem, comportamento antigo) e ligado (despacho por estado), e compara
+quantas chamadas ao Gemini cada modo faz.
+
+O Gemini e os embeddings são substituídos por respostas fixas (o objetivo é
+contar chamadas, não medir o modelo). Precisa de um Postgres acessível via
+DATABASE_URL com as migrations aplicadas; os dados criados são removidos no final.
+
+Uso:
+    python benchmarks/dispatch_gemini_calls.py [--flows 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.config import settings
+from src.core.database import SessionLocal
+from src.core.gemini import gemini_client
+from src.models.conversation_state import ConversationState
+from src.models.demand import Demand
+from src.models.interaction import Interaction
+from src.models.user import User
+from src.services.embedding_service import EmbeddingService
+from src.services.message_processor import InboundMessage, process_turn, drain_interaction_logs
+
+FLOW_MESSAGES = [
+    "1",
+    "Tem um buraco enorme na rua principal, perto da escola municipal",
+    "Rua das Flores, 123 - Centro",
+    "1",
+    "sim",
+]
+
+CANNED_RESPONSE = json.dumps({
+    "classification": "DEMANDA",
+    "theme": "infraestrutura",
+    "location_mentioned": False,
+    "location_text": None,
+    "urgency": "media",
+    "keywords": ["buraco"],
+    "title": "Buraco na rua principal",
+    "description": "Buraco na rua principal perto da escola",
+    "affected_entity": None,
+})
+
+calls = Counter()
+
+
+async def fake_generate_content(prompt: str, call_site: str = "default", cache: bool = True) -> str:
+    caller = sys._getframe(1).f_code.co_qualname
+    calls[caller] += 1
+    return CANNED_RESPONSE
+
+
+async def fake_generate_embedding(self, text: str) -> list:
+    return [0.0] * 768
+
+
+def create_user(db) -> str:
+    local = f"119{random.randint(10_000_000, 99_999_999)}"
+    user = User(
+        phone=local,
+        name="Benchmark",
+        status="active",
+        location_primary={"city": "São Paulo", "state": "SP", "neighborhood": "Centro"},
+    )
+    db.add(user)
+    db.commit()
+    return local
+
+
+def cleanup(db, local_phones):
+    users = db.query(User).filter(User.phone.in_(local_phones)).all()
+    user_ids = [u.id for u in users]
+    phones = [f"{p}@c.us" for p in local_phones]
+    db.query(Interaction).filter(Interaction.phone.in_(phones)).delete(synchronize_session=False)
+    db.query(ConversationState).filter(ConversationState.phone.in_(phones)).delete(synchronize_session=False)
+    db.query(Demand).filter(Demand.creator_id.in_(user_ids)).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    db.commit()
+
+
+async def run_mode(dispatch_enabled: bool, flows: int, local_phones: list) -> dict:
+    settings.STATE_DISPATCH_ENABLED = dispatch_enabled
+    calls.clear()
+    completed = 0
+    start = time.perf_counter()
+
+    for _ in range(flows):
+        db = SessionLocal()
+        try:
+            local = create_user(db)
+            local_phones.append(local)
+            phone = f"{local}@c.us"
+            db.add(ConversationState(phone=phone, current_stage="choosing_help_type", context_data={}))
+            db.commit()
+
+            for text in FLOW_MESSAGES:
+                await process_turn(phone, [InboundMessage(text)])
+
+            user = db.query(User).filter(User.phone == local).one()
+            completed += db.query(Demand).filter(Demand.creator_id == user.id).count()
+        finally:
+            db.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": "state_dispatch" if dispatch_enabled else "classify_every_message",
+        "flows": flows,
+        "completed_flows": completed,
+        "gemini_calls_total": sum(calls.values()),
+        "gemini_calls_per_flow": round(sum(calls.values()) / flows, 2),
+        "by_call_site": dict(calls),
+        "seconds_per_flow": round(elapsed / flows, 4),
+    }
+
+
+async def main(flows: int):
+    gemini_client.generate_content = fake_generate_content
+    EmbeddingService.generate_embedding = fake_generate_embedding
+
+    local_phones = []
+    try:
+        results = [
+            await run_mode(False, flows, local_phones),
+            await run_mode(True, flows, local_phones),
+        ]
+    finally:
+        await drain_interaction_logs()
+        db = SessionLocal()
+        cleanup(db, local_phones)
+        db.close()
+
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+
+    if any(r["completed_flows"] != flows for r in results):
+        print("WARNING: some flows did not create a demand; check the logs")
+
+    before, after = results[0]["gemini_calls_per_flow"], results[1]["gemini_calls_per_flow"]
+    if before:
+        print(f"Gemini calls per completed demand flow: {before} -> {after} ({(1 - after / before):.0%} fewer)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flows", type=int, default=5, help="fluxos completos por modo")
+    args = parser.parse_args()
+    asyncio.run(main(args.flows))
@@ -0,0 +1,144 @@
+"""
+Benchmark: log de interações por turno vs. em lote
+
+Simula turnos concorrentes do webhook que terminam gravando uma linha de
+`interactions`, de três formas:
+
+- per_turn: o padrão antigo - Interaction pelo ORM, commit e refresh dentro
+  do turno (o turno espera o banco)
+- sync: interaction_log com INTERACTION_LOG_MODE=sync (INSERT + COMMIT por
+  turno, sem refresh)
+- batched: interaction_log com INTERACTION_LOG_MODE=batched (buffer gravado
+  em INSERTs multi-linha)
+
+Para cada forma reporta latência do turno (p50/p95), turnos/s e a carga de
+escrita no banco: comandos e COMMITs por turno.
+
+Uso:
+    python benchmarks/interaction_log_writes.py [--turns 2000] [--concurrency 50] [--work-ms 2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from src.core.config import settings
+from src.core.database import SessionLocal, engine
+from src.models.demand import Demand  # noqa: F401 (relationships)
+from src.models.demand_supporter import DemandSupporter  # noqa: F401
+from src.models.interaction import Interaction
+from src.models.pl_interaction import PLInteraction  # noqa: F401
+from src.models.user import User  # noqa: F401
+from src.services.interaction_log import interaction_log
+
+PHONE_PREFIX = "bench-ilog-"
+
+
+class WriteCounter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def _row(turn: int) -> dict:
+    return {
+        "phone": f"{PHONE_PREFIX}{turn % 100}",
+        "message_type": "text",
+        "original_message": "a rua está cheia de buracos",
+        "classification": "DEMANDA",
+        "extracted_data": {"classification": "DEMANDA", "theme": "zeladoria"},
+    }
+
+
+def _legacy_write(row: dict):
+    db = SessionLocal()
+    try:
+        interaction = Interaction(**row)
+        db.add(interaction)
+        db.commit()
+        db.refresh(interaction)
+    finally:
+        db.close()
+
+
+async def run(mode: str, turns: int, concurrency: int, work_seconds: float) -> dict:
+    settings.INTERACTION_LOG_MODE = "sync" if mode == "sync" else "batched"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def turn(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await asyncio.sleep(work_seconds)  # classificação, handlers, etc.
+            if mode == "per_turn":
+                await asyncio.to_thread(_legacy_write, _row(i))
+            else:
+                await interaction_log.record([_row(i)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[turn(i) for i in range(turns)])
+    wall = time.perf_counter() - start
+    await interaction_log.close()
+
+    ordered = sorted(latencies)
+    return {
+        "turns_per_s": round(turns / wall, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 2),
+    }
+
+
+def cleanup():
+    db = SessionLocal()
+    try:
+        deleted = db.query(Interaction).filter(
+            Interaction.phone.like(f"{PHONE_PREFIX}%")
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--work-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    counter = WriteCounter()
+    try:
+        for mode in ("per_turn", "sync", "batched"):
+            counter.reset()
+            result = await run(mode, args.turns, args.concurrency, args.work_ms / 1000)
+            load = {
+                "statements_per_turn": round(counter.statements / args.turns, 3),
+                "commits_per_turn": round(counter.commits / args.turns, 3),
+            }
+            print({"mode": mode, **result, **load, "rows_written": cleanup()})
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Benchmark: nota de voz longa em uma única chamada vs. partes em paralelo
+
+Transcreve cada nota longa (uma de cada vez, sem concorrência) com um
+TranscriptionEngine de WHISPER_WORKERS workers em dois modos e compara a
+latência:
+
+- single: um model.transcribe sobre o áudio inteiro (caminho anterior)
+- parallel: cortes nas pausas do VAD, uma parte por worker, textos
+  reunidos em ordem (WHISPER_PARALLEL_MIN_SECONDS)
+
+Use notas reais longas (2-5 min) com --audio; sem elas, gera notas
+sintéticas, que o VAD pode descartar em parte (os números ficam otimistas).
+Requer o modelo WHISPER_MODEL disponível localmente ou para download.
+
+Uso:
+    python benchmarks/parallel_transcription.py --audio longas/*.ogg [--workers 4] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.core.config import settings
+from src.core.whisper_model import whisper_singleton
+from src.services.transcription_engine import TranscriptionEngine
+
+
+def load_notes(paths):
+    if paths:
+        contents = []
+        for path in paths:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        return contents
+
+    from audio_ingestion import make_voice_note
+    print("No --audio given: using synthetic notes (VAD may drop them)")
+    return [make_voice_note(seconds) for seconds in (120, 180, 300)]
+
+
+async def run(engine: TranscriptionEngine, notes, repeat: int) -> dict:
+    latencies, audio_seconds = [], 0.0
+    for content in notes:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = await engine.transcribe(content)
+            latencies.append(time.perf_counter() - start)
+            audio_seconds += result.audio_seconds
+    return {
+        "latency_mean_s": round(statistics.mean(latencies), 2),
+        "latency_max_s": round(max(latencies), 2),
+        "rtf": round(sum(latencies) / audio_seconds, 3) if audio_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", nargs="*", default=[])
+    parser.add_argument("--workers", type=int, default=max(2, settings.WHISPER_WORKERS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-seconds", type=float, default=settings.WHISPER_PARALLEL_MIN_SECONDS or 60.0)
+    args = parser.parse_args()
+
+    # O modelo é carregado com num_workers/cpu_threads para esta quantidade de workers
+    settings.WHISPER_WORKERS = args.workers
+    settings.WHISPER_ADAPTIVE_QUALITY = False  # mesmo nível (full) nos dois modos
+    notes = load_notes(args.audio)
+    whisper_singleton.get_model()  # carga do modelo fora da medição
+
+    results = {}
+    for mode, threshold in (("single", 0.0), ("parallel", args.min_seconds)):
+        settings.WHISPER_PARALLEL_MIN_SECONDS = threshold
+        engine = TranscriptionEngine(num_workers=args.workers, queue_size=args.workers, mode="thread")
+        try:
+            asyncio.run(run(engine, notes[:1], 1))  # aquecimento
+            results[mode] = asyncio.run(run(engine, notes, args.repeat))
+        finally:
+            engine.shutdown()
+        print({"mode": mode, "workers": args.workers, "notes": len(notes), **results[mode]})
+
+    speedup = results["single"]["latency_mean_s"] / max(1e-9, results["parallel"]["latency_mean_s"])
+    print(f"Speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
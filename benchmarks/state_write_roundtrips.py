@@ -0,0 +1,175 @@
+"""
+Micro-benchmark: escritas do estado da conversa (idas ao banco e bytes por turno)
+
+Simula uma entrevista de rascunho de demanda (demand_handler): set_state
+inicial, N turnos que acrescentam a resposta ao full_text e um set_state
+final, de duas formas:
+
+- legacy: SELECT da linha pelo ORM, contexto inteiro reescrito no UPDATE,
+  pg_notify separado e COMMIT (o padrão anterior do gerenciador de estado)
+- upsert: AsyncConversationStateManager atual - INSERT ... ON CONFLICT DO UPDATE /
+  UPDATE parcial (`||` + jsonb_set) com RETURNING e pg_notify no mesmo comando
+
+As duas formas rodam sobre o engine assíncrono (AsyncSession), como os
+handlers. Para cada forma reporta comandos enviados (incluindo COMMIT), bytes
+de SQL + parâmetros (em texto) enviados ao servidor e latência média por turno.
+--rtt-ms soma uma latência de rede simulada a cada comando (o Postgres local
+responde em microssegundos e esconde o custo das idas ao banco).
+
+Observação: o Postgres (MVCC) grava uma nova versão da linha - e do valor
+TOAST do JSONB - em toda atualização; o ganho do update parcial é no que
+trafega do cliente para o servidor e no número de idas ao banco.
+
+Uso:
+    python benchmarks/state_write_roundtrips.py [--turns 10] [--answer-chars 300] [--conversations 20] [--rtt-ms 1]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, event, select, text
+from src.core.database import AsyncSessionLocal, async_engine
+from src.core.state_cache import NOTIFY_CHANNEL
+from src.core.state_manager import AsyncConversationStateManager
+from src.models.conversation_state import ConversationState
+
+PHONE_PREFIX = "bench-state-"
+
+
+def _parameter_bytes(parameters) -> int:
+    values = parameters.values() if isinstance(parameters, dict) else (parameters or ())
+    return sum(len(str(value).encode()) for value in values)
+
+
+class WireCounter:
+    """Conta comandos e bytes enviados pelo engine assíncrono"""
+
+    def __init__(self, rtt_seconds: float):
+        self.rtt_seconds = rtt_seconds
+        self.statements = 0
+        self.bytes = 0
+        event.listen(async_engine.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(async_engine.sync_engine, "commit", self._on_commit)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.bytes += len(statement.encode()) + _parameter_bytes(parameters)
+        time.sleep(self.rtt_seconds)
+
+    def _on_commit(self, conn):
+        self.statements += 1
+        self.bytes += len("COMMIT")
+        time.sleep(self.rtt_seconds)
+
+    def reset(self):
+        self.statements = 0
+        self.bytes = 0
+
+
+async def _load_state(phone: str, db):
+    result = await db.execute(select(ConversationState).where(ConversationState.phone == phone))
+    return result.scalars().first()
+
+
+async def legacy_set_state(phone: str, stage: str, context: dict, db):
+    state = await _load_state(phone, db)
+    if state:
+        state.current_stage = stage
+        state.context_data = dict(context)
+    else:
+        db.add(ConversationState(phone=phone, current_stage=stage, context_data=dict(context)))
+    await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": phone})
+    await db.commit()
+
+
+async def legacy_update_context(phone: str, new_data: dict, db):
+    state = await _load_state(phone, db)
+    state.context_data = {**(state.context_data or {}), **new_data}
+    await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": phone})
+    await db.commit()
+
+
+def initial_context(answer: str) -> dict:
+    return {
+        "full_text": answer,
+        "classification": {"theme": "zeladoria", "scope_level": 1, "keywords": ["buraco", "rua"]},
+        "collected_data": {},
+        "missing_field": None,
+    }
+
+
+async def run_legacy(phone: str, turns: int, answer: str, db):
+    context = initial_context(answer)
+    await legacy_set_state(phone, "demand_drafting", context, db)
+    for turn in range(turns):
+        context["full_text"] += "\n" + answer
+        context["collected_data"]["details"] = f"turno {turn}"
+        await legacy_update_context(phone, context, db)
+    await legacy_set_state(phone, "demand_review", context, db)
+
+
+async def run_upsert(phone: str, turns: int, answer: str, db):
+    manager = AsyncConversationStateManager()
+    context = initial_context(answer)
+    await manager.set_state(phone, "demand_drafting", context, db)
+    for turn in range(turns):
+        context["full_text"] += "\n" + answer
+        context["collected_data"]["details"] = f"turno {turn}"
+        await manager.update_context(
+            phone,
+            {"missing_field": "details", "collected_data": context["collected_data"]},
+            db,
+            append_text={"full_text": "\n" + answer}
+        )
+    await manager.set_state(phone, "demand_review", context, db)
+
+
+async def run(args):
+    answer = ("a rua está cheia de buracos " * 20)[:args.answer_chars]
+    writes_per_conversation = args.turns + 2
+    counter = WireCounter(args.rtt_ms / 1000)
+
+    async with AsyncSessionLocal() as db:
+        try:
+            for name, run_mode in (("legacy", run_legacy), ("upsert", run_upsert)):
+                counter.reset()
+                latencies = []
+                for i in range(args.conversations):
+                    phone = f"{PHONE_PREFIX}{name}-{i}"
+                    start = time.perf_counter()
+                    await run_mode(phone, args.turns, answer, db)
+                    latencies.append((time.perf_counter() - start) / writes_per_conversation)
+
+                writes = args.conversations * writes_per_conversation
+                print({
+                    "mode": name,
+                    "statements_per_write": round(counter.statements / writes, 2),
+                    "bytes_per_write": round(counter.bytes / writes),
+                    "mean_ms_per_write": round(statistics.mean(latencies) * 1000, 2),
+                })
+        finally:
+            await db.rollback()
+            await db.execute(delete(ConversationState).where(ConversationState.phone.like(f"{PHONE_PREFIX}%")))
+            await db.commit()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--answer-chars", type=int, default=300)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
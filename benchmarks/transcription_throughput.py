@@ -0,0 +1,100 @@
+"""
+Benchmark: vazão de transcrição por requisição vs. micro-batching
+
+Dispara N notas de voz simultâneas contra um TranscriptionEngine em cada modo
+e mede o tempo total (vazão agregada em segundos de áudio por segundo) e a
+latência por nota:
+
+- per_request: um model.transcribe(beam_size=5) por nota (WHISPER_WORKERS workers)
+- batched: trechos de fala de todas as notas pendentes em lotes de
+  WHISPER_BATCH_SIZE (BatchedInferencePipeline)
+
+Use notas reais (.ogg/.opus/.wav) com --audio; sem elas, gera notas
+sintéticas, que o VAD pode descartar em parte (os números ficam otimistas).
+Requer o modelo WHISPER_MODEL disponível localmente ou para download.
+
+Uso:
+    python benchmarks/transcription_throughput.py --audio notas/*.ogg [--concurrency 16] [--batch-size 8]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.core.config import settings
+from src.core.whisper_model import whisper_singleton
+from src.services.transcription_engine import TranscriptionEngine
+
+
+def load_notes(paths, concurrency):
+    if paths:
+        contents = []
+        for path in paths:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+    else:
+        from audio_ingestion import make_voice_note
+        print("No --audio given: using synthetic notes (VAD may drop them)")
+        contents = [make_voice_note(seconds) for seconds in (8, 15, 25, 40)]
+    return [contents[i % len(contents)] for i in range(concurrency)]
+
+
+async def run(engine: TranscriptionEngine, notes):
+    latencies = []
+
+    async def one(content):
+        start = time.perf_counter()
+        result = await engine.transcribe(content)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(content) for content in notes])
+    wall = time.perf_counter() - start
+    audio_seconds = sum(r.audio_seconds for r in results)
+    return {
+        "wall_s": round(wall, 2),
+        "audio_s": round(audio_seconds, 1),
+        "throughput_x_realtime": round(audio_seconds / wall, 2),
+        "latency_p50_s": round(statistics.median(latencies), 2),
+        "latency_max_s": round(max(latencies), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", nargs="*", default=[])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=settings.WHISPER_BATCH_SIZE)
+    parser.add_argument("--window-ms", type=int, default=settings.WHISPER_BATCH_WINDOW_MS)
+    args = parser.parse_args()
+
+    settings.WHISPER_BATCH_SIZE = args.batch_size
+    notes = load_notes(args.audio, args.concurrency)
+    whisper_singleton.get_model()  # carga do modelo fora da medição
+
+    for batching in (False, True):
+        engine = TranscriptionEngine(
+            num_workers=settings.WHISPER_WORKERS,
+            queue_size=args.concurrency,
+            mode="thread",
+            batching=batching,
+            batch_size=args.batch_size,
+            batch_window=args.window_ms / 1000
+        )
+        try:
+            asyncio.run(run(engine, notes[:1]))  # aquecimento
+            result = asyncio.run(run(engine, notes))
+        finally:
+            engine.shutdown()
+        print({"mode": "batched" if batching else "per_request", "notes": len(notes), **result})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: WER e latência por nível de qualidade da transcrição
+
+Transcreve cada nota de um conjunto local com cada nível de
+transcription_policy.py (fast / greedy / full) e reporta, por nível:
+WER (word error rate) contra a transcrição de referência, latência média e
+p95 e real-time factor.
+
+O conjunto é um diretório com pares <nome>.<ogg|opus|wav|mp3> + <nome>.txt
+(texto de referência). A normalização ignora caixa, acentuação e pontuação
+para que o WER meça palavras, não formatação.
+
+Requer os modelos WHISPER_MODEL e WHISPER_FAST_MODEL disponíveis localmente
+ou para download.
+
+Uso:
+    python benchmarks/transcription_tiers.py amostras/ [--repeat 3] [--tiers fast full]
+"""
+
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+import time
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.whisper_model import whisper_singleton
+from src.services.transcription_engine import TRANSCRIBE_OPTIONS, SAMPLE_RATE, decode_audio_bytes
+from src.services.transcription_policy import tiers
+
+AUDIO_EXTENSIONS = (".ogg", ".opus", ".wav", ".mp3", ".m4a")
+
+
+def normalize(text: str) -> list:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^\w\s]", " ", text).split()
+
+
+def word_errors(reference: list, hypothesis: list) -> int:
+    """Distância de edição (substituições + inserções + remoções) em palavras"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def load_samples(directory: str):
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        base, ext = os.path.splitext(path)
+        if ext.lower() not in AUDIO_EXTENSIONS or not os.path.exists(base + ".txt"):
+            continue
+        with open(path, "rb") as f:
+            audio, _ = decode_audio_bytes(f.read())
+        with open(base + ".txt", encoding="utf-8") as f:
+            reference = f.read()
+        samples.append((os.path.basename(path), audio, normalize(reference)))
+    return samples
+
+
+def run_tier(tier, samples, repeat: int) -> dict:
+    model = whisper_singleton.get_model(tier.model, tier.compute_type)
+    options = {**TRANSCRIBE_OPTIONS, "beam_size": tier.beam_size}
+
+    # Aquecimento fora da medição
+    list(model.transcribe(samples[0][1], **options)[0])
+
+    latencies, errors, words, audio_seconds = [], 0, 0, 0.0
+    for _, audio, reference in samples:
+        for attempt in range(repeat):
+            start = time.perf_counter()
+            segments, _ = model.transcribe(audio, **options)
+            text = " ".join(segment.text for segment in segments)
+            latencies.append(time.perf_counter() - start)
+            audio_seconds += len(audio) / SAMPLE_RATE
+
+            if attempt == 0:
+                errors += word_errors(reference, normalize(text))
+                words += len(reference)
+
+    ordered = sorted(latencies)
+    return {
+        "tier": tier.name,
+        "model": tier.model or "WHISPER_MODEL",
+        "beam": tier.beam_size,
+        "wer": round(errors / max(1, words), 4),
+        "latency_mean_s": round(statistics.mean(latencies), 3),
+        "latency_p95_s": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+        "rtf": round(sum(latencies) / audio_seconds, 3) if audio_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="diretório com pares áudio + .txt de referência")
+    parser.add_argument("--repeat", type=int, default=3, help="repetições por nota (latência)")
+    parser.add_argument("--tiers", nargs="*", default=list(tiers().keys()))
+    args = parser.parse_args()
+
+    samples = load_samples(args.directory)
+    if not samples:
+        sys.exit(f"No audio + .txt pairs found in {args.directory}")
+    print(f"{len(samples)} samples, {sum(len(a) for _, a, _ in samples) / SAMPLE_RATE:.0f}s of audio")
+
+    available = tiers()
+    for name in args.tiers:
+        print(run_tier(available[name], samples, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
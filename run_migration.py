@@ -22,6 +22,14 @@ MIGRATIONS = [
     'sql/006_create_legislative_items.sql',
     'sql/007_add_auth_fields.sql',
     'sql/008_add_profile_fields.sql',
+    'sql/009_create_webhook_jobs.sql',
+    'sql/010_add_webhook_jobs_merged_into.sql',
+    'sql/011_create_processed_messages.sql',
+    'sql/012_create_transcription_cache.sql',
+    'sql/013_add_transcription_tier.sql',
+    'sql/014_partition_interactions.sql',
+    'sql/015_add_users_phone_e164.sql',
+    'sql/016_create_gemini_response_cache.sql',
 ]
 
 def run_migration(migration_file, conn, cursor):
@@ -9,6 +9,7 @@ DROP TABLE IF EXISTS legislative_items CASCADE;
 DROP TABLE IF EXISTS demand_supporters CASCADE;
 DROP TABLE IF EXISTS demands CASCADE;
 DROP TABLE IF EXISTS interactions CASCADE;
+DROP TABLE IF EXISTS interaction_daily_rollups CASCADE;
 DROP TABLE IF EXISTS conversation_states CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 
@@ -0,0 +1,29 @@
+-- Step 9: Create webhook_jobs table (fila durável do /webhook)
+-- Execute manually in PostgreSQL after migration 008
+
+CREATE TABLE IF NOT EXISTS webhook_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    phone VARCHAR(50) NOT NULL,
+    message_type VARCHAR(20) NOT NULL,
+    text TEXT,
+    audio_data BYTEA,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    response TEXT,
+    audio_duration_seconds FLOAT,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Index used by workers to claim the next job (FOR UPDATE SKIP LOCKED)
+CREATE INDEX IF NOT EXISTS idx_webhook_jobs_claim ON webhook_jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_webhook_jobs_phone ON webhook_jobs(phone);
+
+-- Comments
+COMMENT ON TABLE webhook_jobs IS 'Inbound WhatsApp messages queued for asynchronous processing';
+COMMENT ON COLUMN webhook_jobs.status IS 'pending, processing, done, failed';
+COMMENT ON COLUMN webhook_jobs.available_at IS 'Job is not claimed before this time (retry backoff)';
+COMMENT ON COLUMN webhook_jobs.response IS 'Generated reply, kept so delivery retries do not reprocess the message';
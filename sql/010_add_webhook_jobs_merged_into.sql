@@ -0,0 +1,9 @@
+-- Step 10: Debounce support for webhook_jobs
+-- Execute manually in PostgreSQL after migration 009
+
+ALTER TABLE webhook_jobs
+ADD COLUMN IF NOT EXISTS merged_into UUID;
+
+CREATE INDEX IF NOT EXISTS idx_webhook_jobs_merged_into ON webhook_jobs(merged_into);
+
+COMMENT ON COLUMN webhook_jobs.merged_into IS 'Job that absorbed this message into a single debounced turn (status = merged)';
@@ -0,0 +1,24 @@
+-- Step 11: Create processed_messages table (deduplicação do /webhook por message_id)
+-- Execute manually in PostgreSQL after migration 010
+
+CREATE TABLE IF NOT EXISTS processed_messages (
+    message_id VARCHAR(128) PRIMARY KEY,
+    phone VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'processing',
+    response TEXT,
+    job_id UUID,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Index used to purge entries older than MESSAGE_DEDUP_TTL_SECONDS
+CREATE INDEX IF NOT EXISTS idx_processed_messages_created_at ON processed_messages(created_at);
+
+-- The queue workers need the message id to record the final response
+ALTER TABLE webhook_jobs
+ADD COLUMN IF NOT EXISTS message_id VARCHAR(128);
+
+-- Comments
+COMMENT ON TABLE processed_messages IS 'Idempotency keys for /webhook: one row per WhatsApp message id';
+COMMENT ON COLUMN processed_messages.status IS 'processing (in flight) or done (response cached)';
+COMMENT ON COLUMN processed_messages.response IS 'Reply returned to duplicates of this message without reprocessing';
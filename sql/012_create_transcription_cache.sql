@@ -0,0 +1,21 @@
+-- Step 12: Create transcription_cache table (transcrições endereçadas por hash do áudio)
+-- Execute manually in PostgreSQL after migration 011
+
+CREATE TABLE IF NOT EXISTS transcription_cache (
+    audio_sha256 VARCHAR(64) NOT NULL,
+    model VARCHAR(50) NOT NULL,
+    text TEXT NOT NULL,
+    audio_seconds FLOAT NOT NULL,
+    file_seconds FLOAT NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ,
+    PRIMARY KEY (audio_sha256, model)
+);
+
+-- Index used to purge entries older than TRANSCRIPTION_CACHE_TTL_SECONDS
+CREATE INDEX IF NOT EXISTS idx_transcription_cache_created_at ON transcription_cache(created_at);
+
+-- Comments
+COMMENT ON TABLE transcription_cache IS 'Whisper transcriptions keyed by SHA-256 of the uploaded audio bytes';
+COMMENT ON COLUMN transcription_cache.model IS 'WHISPER_MODEL that produced the text (a model change invalidates the entry)';
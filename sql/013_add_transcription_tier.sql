@@ -0,0 +1,12 @@
+-- Step 13: Record the adaptive transcription quality tier
+-- Execute manually in PostgreSQL after migration 012
+
+ALTER TABLE interactions
+    ADD COLUMN IF NOT EXISTS transcription_tier VARCHAR(20);
+
+ALTER TABLE transcription_cache
+    ADD COLUMN IF NOT EXISTS tier VARCHAR(20);
+
+-- Comments
+COMMENT ON COLUMN interactions.transcription_tier IS 'Whisper quality tier used for the audio (fast, greedy, full)';
+COMMENT ON COLUMN transcription_cache.tier IS 'Quality tier that produced the cached text';
@@ -0,0 +1,94 @@
+-- Step 14: Partition interactions by month (created_at) and add daily rollups
+-- Execute manually in PostgreSQL after migration 013
+--
+-- Recreates interactions as a RANGE-partitioned table (one partition per UTC month),
+-- copies the existing rows and drops the old table. Future partitions are created
+-- and old ones rolled up/dropped by src/services/interaction_partitions.py.
+-- Index changes: message_type/classification indexes removed (analytics use the
+-- rollups), created_at becomes BRIN, demand_id becomes partial (mostly NULL).
+
+-- 1. Move the current table (and its index/constraint names) out of the way
+ALTER TABLE interactions RENAME TO interactions_legacy;
+
+DO $$
+DECLARE
+    idx RECORD;
+BEGIN
+    FOR idx IN SELECT indexname FROM pg_indexes WHERE tablename = 'interactions_legacy' LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', idx.indexname, idx.indexname || '_legacy');
+    END LOOP;
+END $$;
+
+-- 2. Partitioned table (the primary key must include the partition key)
+CREATE TABLE interactions (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    phone VARCHAR(50) NOT NULL,
+    user_id UUID REFERENCES users(id),
+    demand_id UUID REFERENCES demands(id),
+    message_type VARCHAR(20) NOT NULL,
+    original_message TEXT,
+    transcription TEXT,
+    audio_duration_seconds FLOAT,
+    transcription_tier VARCHAR(20),
+    classification VARCHAR(50),
+    extracted_data JSONB,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX idx_interactions_phone ON interactions(phone);
+CREATE INDEX idx_interactions_user_id ON interactions(user_id);
+CREATE INDEX idx_interactions_demand_id ON interactions(demand_id) WHERE demand_id IS NOT NULL;
+CREATE INDEX idx_interactions_created_at ON interactions USING BRIN (created_at);
+
+-- 3. One partition per month from the oldest row until two months ahead
+DO $$
+DECLARE
+    month_start TIMESTAMP;
+    last_month TIMESTAMP := date_trunc('month', NOW() AT TIME ZONE 'UTC') + INTERVAL '2 months';
+BEGIN
+    SELECT date_trunc('month', COALESCE(MIN(created_at), NOW()) AT TIME ZONE 'UTC')
+      INTO month_start
+      FROM interactions_legacy;
+
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF interactions FOR VALUES FROM (%L) TO (%L)',
+            'interactions_p' || to_char(month_start, 'YYYY_MM'),
+            month_start AT TIME ZONE 'UTC',
+            (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC'
+        );
+        month_start := month_start + INTERVAL '1 month';
+    END LOOP;
+END $$;
+
+-- 4. Copy the rows and drop the old table
+INSERT INTO interactions (
+    id, phone, user_id, demand_id, message_type, original_message, transcription,
+    audio_duration_seconds, transcription_tier, classification, extracted_data, created_at
+)
+SELECT
+    id, phone, user_id, demand_id, message_type, original_message, transcription,
+    audio_duration_seconds, transcription_tier, classification, extracted_data, COALESCE(created_at, NOW())
+FROM interactions_legacy;
+
+DROP TABLE interactions_legacy;
+
+-- 5. Daily rollups (kept after the raw partitions leave the retention window)
+CREATE TABLE IF NOT EXISTS interaction_daily_rollups (
+    day DATE NOT NULL,
+    classification VARCHAR(50) NOT NULL,
+    message_type VARCHAR(20) NOT NULL,
+    interactions INTEGER NOT NULL,
+    distinct_phones INTEGER NOT NULL,
+    audio_count INTEGER NOT NULL DEFAULT 0,
+    audio_seconds_total FLOAT NOT NULL DEFAULT 0,
+    avg_audio_duration_seconds FLOAT GENERATED ALWAYS AS (audio_seconds_total / NULLIF(audio_count, 0)) STORED,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (day, classification, message_type)
+);
+
+-- Comments
+COMMENT ON TABLE interactions IS 'Chatbot message log, RANGE-partitioned by month on created_at (UTC)';
+COMMENT ON TABLE interaction_daily_rollups IS 'Per-day (UTC) interaction counts by classification and message_type; outlives raw partitions';
+COMMENT ON COLUMN interaction_daily_rollups.classification IS 'NONE when the message was not classified';
@@ -0,0 +1,13 @@
+-- Step 15: Canonical E.164 phone key for user lookups
+-- Execute manually in PostgreSQL after migration 014
+-- Existing rows are filled by backfill_phone_e164.py (canonicalization lives in src/core/phone.py)
+
+ALTER TABLE users
+    ADD COLUMN IF NOT EXISTS phone_e164 VARCHAR(20);
+
+-- Not UNIQUE: legacy duplicates (same number saved with and without the 9th digit)
+-- are reported by the backfill instead of failing the migration
+CREATE INDEX IF NOT EXISTS idx_users_phone_e164 ON users(phone_e164);
+
+-- Comments
+COMMENT ON COLUMN users.phone_e164 IS 'Canonical E.164 phone (+55 DDD number, mobile numbers with the 9th digit)';
@@ -0,0 +1,21 @@
+-- Step 16: Create gemini_response_cache table (respostas do Gemini por hash do prompt)
+-- Execute manually in PostgreSQL after migration 015
+
+CREATE TABLE IF NOT EXISTS gemini_response_cache (
+    prompt_sha256 VARCHAR(64) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    call_site VARCHAR(50) NOT NULL,
+    response TEXT NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    last_hit_at TIMESTAMPTZ,
+    PRIMARY KEY (prompt_sha256, model)
+);
+
+-- Index used to purge expired entries
+CREATE INDEX IF NOT EXISTS idx_gemini_response_cache_expires_at ON gemini_response_cache(expires_at);
+
+-- Comments
+COMMENT ON TABLE gemini_response_cache IS 'Gemini responses keyed by SHA-256 of the whitespace-normalized prompt';
+COMMENT ON COLUMN gemini_response_cache.call_site IS 'Agent/route that generated the entry (its GEMINI_CACHE_TTL_BY_CALL_SITE TTL sets expires_at)';
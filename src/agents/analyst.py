@@ -39,7 +39,7 @@ class AnalystAgent:
         """
         
         try:
-            response_text = await self.client.generate_content(prompt) 
+            response_text = await self.client.generate_content(prompt, call_site="analyst")
             result = self.client.parse_json(response_text)
             # Sanitização: remover qualquer referência inesperada a 'urgency'
             if isinstance(result, dict) and result.get('missing_field') == 'urgency':
@@ -75,7 +75,7 @@ class AnalystAgent:
         }}
         """
         try:
-            response_text = await self.client.generate_content(prompt) 
+            response_text = await self.client.generate_content(prompt, call_site="analyst", priority="background")
             return self.client.parse_json(response_text)
         except Exception:
             return {
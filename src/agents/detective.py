@@ -1,7 +1,8 @@
 from src.core.gemini import gemini_client
 from src.models.legislative_item import LegislativeItem
 from src.models.pl_interaction import PLInteraction
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -21,7 +22,7 @@ class DetectiveAgent:
         self,
         theme: str,
         keywords: List[str],
-        db: Session,
+        db: AsyncSession,
         scope_level: int = 3,
         location: Optional[Dict] = None,
         user_message: Optional[str] = None
@@ -73,7 +74,7 @@ class DetectiveAgent:
         try:
             # 1. Chamar o Gemini (Linha que faltava no seu código)
             logger.info(f"🔍 Asking Gemini for PLs: theme={theme}")
-            response_text = await self.client.generate_content(prompt)
+            response_text = await self.client.generate_content(prompt, call_site="detective")
             
             # 2. Parsear o JSON
             results = self.client.parse_json(response_text)
@@ -137,7 +138,7 @@ class DetectiveAgent:
     async def _upsert_legislative_item(
         self,
         item_data: Dict,
-        db: Session
+        db: AsyncSession
     ) -> Optional[LegislativeItem]:
         """Salva o item legislativo no banco para histórico"""
         try:
@@ -145,9 +146,10 @@ class DetectiveAgent:
             external_id = item_data.get('id', 'unknown')
             
             # Verificar se já existe
-            existing = db.query(LegislativeItem).filter(
-                LegislativeItem.external_id == external_id
-            ).first()
+            result = await db.execute(
+                select(LegislativeItem).where(LegislativeItem.external_id == external_id)
+            )
+            existing = result.scalars().first()
             
             title = item_data.get('title', 'Sem título')
             description = item_data.get('description', '')
@@ -157,7 +159,7 @@ class DetectiveAgent:
                 existing.ementa = description
                 existing.summary = description
                 existing.updated_at = datetime.now()
-                db.commit()
+                await db.commit()
                 return existing
             else:
                 item = LegislativeItem(
@@ -174,16 +176,16 @@ class DetectiveAgent:
                     keywords=[]
                 )
                 db.add(item)
-                db.commit()
-                db.refresh(item)
+                await db.commit()
+                await db.refresh(item)
                 return item
         
         except Exception as e:
             logger.error(f"Error upserting item: {e}")
-            db.rollback()
+            await db.rollback()
             return None
 
-    async def register_pl_view(self, user_id: str, pl_id: str, db: Session):
+    async def register_pl_view(self, user_id: str, pl_id: str, db: AsyncSession):
         """Registra que o usuário visualizou um item"""
         try:
             interaction = PLInteraction(
@@ -192,10 +194,10 @@ class DetectiveAgent:
                 interaction_type='view'
             )
             db.add(interaction)
-            db.commit()
+            await db.commit()
         except Exception as e:
             logger.error(f"Error registering view: {e}")
-            db.rollback()
+            await db.rollback()
 
     async def close(self):
         pass
\ No newline at end of file
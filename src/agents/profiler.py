@@ -1,68 +1,33 @@
 import hashlib
 import logging
-import google.generativeai as genai
 from typing import Optional, Dict
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.user import User
-from src.core.config import settings
+from src.core.gemini import gemini_client
+from src.core.phone import canonical_phone, national_number
+from src.core.user_cache import find_user_async
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import json
 
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-genai.configure(api_key=settings.GOOGLE_GEMINI_API_KEY)
-
 class ProfilerAgent:
     """Gerencia o fluxo de onboarding do usuário"""
 
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.client = gemini_client
         self.geolocator = Nominatim(user_agent="coral-bot", timeout=10)
 
-    async def check_user_exists(self, phone: str, db: Session) -> Optional[User]:
-        """Verifica se usuário já existe no banco de dados"""
+    async def find_user_async(self, phone: str, db: AsyncSession) -> Optional[User]:
+        """Verifica se usuário já existe no banco de dados (sessão do turno no message_processor)"""
         try:
-            # Normalize phone number: remove '55' prefix and '@c.us' suffix if present
-            
-            normalized_phone = phone
-            
-            # Remove suffix
-            if "@" in normalized_phone:
-                normalized_phone = normalized_phone.split("@")[0]
-            
-            # Remove DDI (55) if present
-            if normalized_phone.startswith("55"):
-                # Check if it's a valid DDI 55 (Brazil) number length
-                # Min length without DDI: 10 (DDD + 8 digits) -> Total 12
-                # Max length without DDI: 11 (DDD + 9 digits) -> Total 13
-                if len(normalized_phone) >= 12:
-                    normalized_phone = normalized_phone[2:]
-                
-            logger.info(f"Checking user existence for phone: {phone} (Normalized: {normalized_phone})")
-            
-            # Try exact match first
-            user = db.query(User).filter(User.phone == normalized_phone).first()
-            
-            # If not found, try alternative formats (handling the 9th digit)
-            if not user:
-                if len(normalized_phone) == 10: # DDD + 8 digits (Missing 9)
-                    # Try adding 9: DDD + 9 + 8 digits
-                    alternative_phone = f"{normalized_phone[:2]}9{normalized_phone[2:]}"
-                    logger.info(f"Trying alternative phone (add 9): {alternative_phone}")
-                    user = db.query(User).filter(User.phone == alternative_phone).first()
-                    
-                elif len(normalized_phone) == 11: # DDD + 9 + 8 digits
-                    # Try removing 9: DDD + 8 digits
-                    alternative_phone = f"{normalized_phone[:2]}{normalized_phone[3:]}"
-                    logger.info(f"Trying alternative phone (remove 9): {alternative_phone}")
-                    user = db.query(User).filter(User.phone == alternative_phone).first()
+            user = await find_user_async(phone, db)
 
             if user:
                 logger.info(f"✅ User FOUND: {user.phone} | ID: {user.id} | Status: {user.status}")
             else:
-                logger.info(f"🆕 NEW user: {normalized_phone}")
+                logger.info(f"🆕 NEW user: {canonical_phone(phone)}")
             return user
         except Exception as e:
             logger.error(f"❌ Error checking user existence: {e}")
@@ -117,8 +82,7 @@ Texto do usuário: "{text}"
 JSON:"""
 
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
+            response_text = (await self.client.generate_content(prompt, call_site="profiler")).strip()
             
             # Remove markdown code blocks if present
             if response_text.startswith("```"):
@@ -226,25 +190,21 @@ JSON:"""
         logger.info(f"Generated Civic ID for {phone}: {civic_id[:16]}...")
         return civic_id
 
-    async def create_user(self, phone: str, location_data: Dict, db: Session) -> User:
+    async def create_user(self, phone: str, location_data: Dict, db: AsyncSession) -> User:
         """
         Cria novo usuário no banco de dados com ID Cívico.
         
         Args:
             phone: Número de telefone
             location_data: Dados de localização (JSONB)
-            db: Sessão do banco de dados
+            db: Sessão assíncrona do banco de dados
             
         Returns:
             User object criado
         """
         try:
-            # Normalize phone number for storage
-            normalized_phone = phone
-            if "@" in normalized_phone:
-                normalized_phone = normalized_phone.split("@")[0]
-            if normalized_phone.startswith("55") and len(normalized_phone) > 11:
-                normalized_phone = normalized_phone[2:]
+            # Normalize phone number for storage (DDD + número; phone_e164 é preenchido pelo modelo)
+            normalized_phone = national_number(phone) or phone.split("@")[0]
 
             # Generate Civic ID (for future use)
             civic_id = self.generate_civic_id_hash(normalized_phone)
@@ -256,13 +216,13 @@ JSON:"""
             )
             
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             
             logger.info(f"User created successfully: {user.id}")
             return user
             
         except Exception as e:
             logger.error(f"Error creating user: {e}")
-            db.rollback()
+            await db.rollback()
             raise
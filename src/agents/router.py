@@ -76,7 +76,7 @@ class RouterAgent:
         """
         
         try:
-            response_text = await self.client.generate_content(prompt)
+            response_text = await self.client.generate_content(prompt, call_site="router")
             result = self.client.parse_json(response_text)
             
             if not self._is_valid_result(result):
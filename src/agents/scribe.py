@@ -52,7 +52,7 @@ class ScribeAgent:
 
         try:
             logger.info("✍️ Scribe drafting legislative idea...")
-            response_text = await self.client.generate_content(prompt)
+            response_text = await self.client.generate_content(prompt, call_site="scribe")
             return self.client.parse_json(response_text)
         except Exception as e:
             logger.error(f"❌ Error in ScribeAgent (legislative idea): {e}")
@@ -91,7 +91,7 @@ class ScribeAgent:
 
         try:
             logger.info("✍️ Scribe drafting formal demand...")
-            response_text = await self.client.generate_content(prompt)
+            response_text = await self.client.generate_content(prompt, call_site="scribe")
             return self.client.parse_json(response_text)
         except Exception as e:
             logger.error(f"❌ Error in ScribeAgent (formal demand): {e}")
@@ -120,7 +120,7 @@ class ScribeAgent:
         """
         
         try:
-            response_text = await self.client.generate_content(prompt)
+            response_text = await self.client.generate_content(prompt, call_site="scribe")
             return self.client.parse_json(response_text)
         except Exception:
             return {"position": "Neutro", "suggested_text": user_opinion}
@@ -35,7 +35,7 @@ class WriterAgent:
         context_str = str(context) if context else "Nenhum dado específico."
         prompt = f"{self.system_prompt}\nDADOS: {context_str}\nTAREFA: {instructions}\nGere APENAS a resposta."
         try:
-            response = await self.client.generate_content(prompt)
+            response = await self.client.generate_content(prompt, call_site="writer")
             return response.strip()
         except Exception as e:
             logger.error(f"❌ Error in WriterAgent: {e}")
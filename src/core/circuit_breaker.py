@@ -0,0 +1,180 @@
+"""
+Circuit breaker das chamadas ao Gemini
+
+Com o Gemini lento ou fora do ar, cada agente esperava o próprio timeout
+antes de cair no fallback local (heurística do Router, base local de leis,
+respostas fixas do Writer) - uma única mensagem empilhava 3-5 timeouts.
+
+O breaker observa as chamadas numa janela deslizante
+(GEMINI_BREAKER_WINDOW_SECONDS) e abre quando, com pelo menos
+GEMINI_BREAKER_MIN_CALLS chamadas, a taxa de erros passa de
+GEMINI_BREAKER_ERROR_RATE ou a de chamadas lentas passa de
+GEMINI_BREAKER_SLOW_RATE. Aberto, toda chamada falha na hora com
+CircuitOpenError e os agentes vão direto para o caminho local. Depois de
+GEMINI_BREAKER_OPEN_SECONDS fica meio-aberto: até
+GEMINI_BREAKER_HALF_OPEN_PROBES chamadas de teste passam; se todas forem
+rápidas e sem erro o circuito fecha, senão volta a abrir.
+
+Estado local do processo (cada worker decide pelo que observa), exposto em /health.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from src.core.config import settings
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """O circuito está aberto: a chamada não foi feita (o chamador usa o fallback local)"""
+
+
+class CircuitBreaker:
+    """Abre por taxa de erro ou de lentidão; recupera com chamadas de teste"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.changed_at = time.time()
+        self.trips = 0
+        self.last_trip_reason: Optional[str] = None
+        self._opened_at = 0.0
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()  # (instante, erro, lenta)
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        metrics.register_gauge(f"{name}_circuit_state", lambda: _STATE_GAUGE[self.state])
+
+    # ------------------------------------------------------------------
+    # Antes da chamada
+    # ------------------------------------------------------------------
+
+    def rejects(self) -> bool:
+        """True se o circuito está aberto e ainda não é hora de testar (não reserva nada)"""
+        return (
+            settings.GEMINI_CIRCUIT_BREAKER_ENABLED
+            and self.state == OPEN
+            and time.monotonic() - self._opened_at < settings.GEMINI_BREAKER_OPEN_SECONDS
+        )
+
+    def reject(self):
+        metrics.inc("circuit_breaker_rejected_total", breaker=self.name)
+        raise CircuitOpenError(f"{self.name} circuit is {self.state}")
+
+    def acquire(self):
+        """
+        Libera uma chamada ou levanta CircuitOpenError. Toda chamada liberada
+        precisa terminar em record() ou abandon().
+        """
+        if not settings.GEMINI_CIRCUIT_BREAKER_ENABLED:
+            return
+
+        if self.state == OPEN:
+            if self.rejects():
+                self.reject()
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= settings.GEMINI_BREAKER_HALF_OPEN_PROBES:
+                self.reject()
+            self._probes_in_flight += 1
+
+    # ------------------------------------------------------------------
+    # Depois da chamada
+    # ------------------------------------------------------------------
+
+    def record(self, seconds: float, failed: bool):
+        """Registra o resultado de uma chamada liberada por acquire()"""
+        if not settings.GEMINI_CIRCUIT_BREAKER_ENABLED:
+            return
+
+        slow = seconds >= settings.GEMINI_BREAKER_SLOW_CALL_SECONDS
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if failed or slow:
+                self._open("probe " + ("failed" if failed else f"took {seconds:.1f}s"))
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= settings.GEMINI_BREAKER_HALF_OPEN_PROBES:
+                self._transition(CLOSED)
+            return
+
+        if self.state == OPEN:
+            return  # chamada iniciada antes de abrir
+
+        now = time.monotonic()
+        self._outcomes.append((now, failed, slow))
+        self._prune(now)
+
+        calls = len(self._outcomes)
+        if calls < settings.GEMINI_BREAKER_MIN_CALLS:
+            return
+
+        error_rate = sum(1 for _, f, _ in self._outcomes if f) / calls
+        slow_rate = sum(1 for _, _, s in self._outcomes if s) / calls
+        if error_rate >= settings.GEMINI_BREAKER_ERROR_RATE:
+            self._open(f"error rate {error_rate:.0%} over {calls} calls")
+        elif slow_rate >= settings.GEMINI_BREAKER_SLOW_RATE:
+            self._open(f"{slow_rate:.0%} of {calls} calls slower than {settings.GEMINI_BREAKER_SLOW_CALL_SECONDS}s")
+
+    def abandon(self):
+        """Chamada liberada que foi cancelada antes de terminar"""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    def _prune(self, now: float):
+        cutoff = now - settings.GEMINI_BREAKER_WINDOW_SECONDS
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _open(self, reason: str):
+        self.trips += 1
+        self.last_trip_reason = reason
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+        metrics.inc("circuit_breaker_trips_total", breaker=self.name)
+        logger.warning(f"🔌 {self.name} circuit opened: {reason}; agents use local fallbacks for {settings.GEMINI_BREAKER_OPEN_SECONDS}s")
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        self.changed_at = time.time()
+        self._outcomes.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state != OPEN:
+            logger.info(f"🔌 {self.name} circuit {previous} -> {state}")
+
+    def status(self) -> Dict:
+        self._prune(time.monotonic())
+        calls = len(self._outcomes)
+        status = {
+            "state": self.state if settings.GEMINI_CIRCUIT_BREAKER_ENABLED else "disabled",
+            "since": self.changed_at,
+            "calls_in_window": calls,
+            "error_rate": round(sum(1 for _, f, _ in self._outcomes if f) / calls, 3) if calls else 0.0,
+            "slow_rate": round(sum(1 for _, _, s in self._outcomes if s) / calls, 3) if calls else 0.0,
+            "trips": self.trips,
+            "last_trip_reason": self.last_trip_reason,
+        }
+        if self.state == OPEN:
+            remaining = settings.GEMINI_BREAKER_OPEN_SECONDS - (time.monotonic() - self._opened_at)
+            status["probe_in_seconds"] = round(max(0.0, remaining), 1)
+        return status
+
+
+gemini_breaker = CircuitBreaker("gemini")
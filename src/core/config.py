@@ -1,3 +1,4 @@
+from typing import Dict
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,7 +11,79 @@ class Settings(BaseSettings):
     GEMINI_MODEL_FLASH: str = "gemini-2.0-flash-lite"
     WHISPER_MODEL: str = "base"
     WHISPER_DEVICE: str = "cpu"
+    WHISPER_PRELOAD: bool = True  # carrega e aquece o modelo no startup (por worker do uvicorn)
+    WHISPER_WORKER_MODE: str = "thread"  # thread | process
+    WHISPER_WORKERS: int = 1  # transcrições simultâneas
+    WHISPER_CPU_THREADS: int = 0  # threads do CTranslate2 por worker (0 = núcleos / workers)
+    WHISPER_QUEUE_SIZE: int = 8  # áudios aguardando worker; além disso rejeita/adia
+    WHISPER_QUEUE_RETRY_AFTER_SECONDS: float = 5.0
+    # Micro-batching: trechos de fala de áudios simultâneos transcritos em um único lote
+    WHISPER_BATCHING_ENABLED: bool = False
+    WHISPER_BATCH_SIZE: int = 8  # trechos (até 30 s) por passo do modelo
+    WHISPER_BATCH_WINDOW_MS: int = 50  # espera máxima para completar um lote
+    # Áudios a partir desta duração são divididos no VAD e transcritos em paralelo (0 = desligado; requer WHISPER_WORKERS > 1)
+    WHISPER_PARALLEL_MIN_SECONDS: float = 60.0
+    # Níveis de qualidade adaptativos (modelo/beam por duração do áudio e tamanho da fila)
+    WHISPER_ADAPTIVE_QUALITY: bool = True  # False = sempre o nível "full"
+    WHISPER_FULL_BEAM_SIZE: int = 5
+    WHISPER_FAST_MODEL: str = ""  # modelo do nível "fast", ex: "tiny" ("" = WHISPER_MODEL)
+    WHISPER_FAST_COMPUTE_TYPE: str = ""  # "" = padrão do device
+    WHISPER_SHORT_AUDIO_SECONDS: float = 5.0  # áudios mais curtos usam o nível "fast"
+    WHISPER_GREEDY_QUEUE_DEPTH: int = 2  # fila a partir da qual usa busca gulosa
+    WHISPER_FAST_QUEUE_DEPTH: int = 4  # fila a partir da qual usa o nível "fast"
+    # Cache de transcrições por hash do áudio (notas encaminhadas/reenviadas)
+    TRANSCRIPTION_CACHE_ENABLED: bool = True
+    TRANSCRIPTION_CACHE_PERSIST: bool = True  # também grava em transcription_cache (Postgres)
+    TRANSCRIPTION_CACHE_SIZE: int = 1000
+    TRANSCRIPTION_CACHE_TTL_SECONDS: int = 7 * 86400
+    # Cache de respostas do Gemini (modelo + hash do prompt normalizado)
+    GEMINI_CACHE_ENABLED: bool = True
+    GEMINI_CACHE_PERSIST: bool = True  # também grava em gemini_response_cache (Postgres)
+    GEMINI_CACHE_SIZE: int = 2000
+    GEMINI_CACHE_TTL_SECONDS: int = 86400  # call sites sem TTL próprio
+    GEMINI_CACHE_TTL_BY_CALL_SITE: Dict[str, int] = {  # TTL por agente/rota (JSON na env; 0 = não guarda)
+        "router": 7 * 86400,
+        "detective": 3 * 86400,
+    }
+    # Chamadas idênticas simultâneas ao Gemini (geração e embeddings) compartilham uma única requisição
+    LLM_SINGLE_FLIGHT_ENABLED: bool = True
+    # Agendador das chamadas ao Gemini: vagas por modelo, cota RPM/TPM, prioridades e retry
+    LLM_SCHEDULER_ENABLED: bool = True
+    LLM_MAX_CONCURRENCY: int = 8  # chamadas simultâneas por modelo
+    LLM_RPM_LIMIT: int = 1000  # requisições por minuto por modelo (0 = sem limite)
+    LLM_TPM_LIMIT: int = 1000000  # tokens por minuto por modelo (0 = sem limite)
+    LLM_MODEL_LIMITS: Dict[str, Dict[str, int]] = {}  # por modelo, ex: {"gemini-2.0-flash-lite": {"concurrency": 4, "rpm": 30, "tpm": 1000000}}
+    LLM_PRIORITY_BY_CALL_SITE: Dict[str, str] = {  # interactive | standard | background (demais call sites: standard)
+        "router": "interactive",
+        "profiler": "interactive",
+        "analyst": "interactive",
+        "formalize": "interactive",
+        "writer": "background",
+        "scribe": "background",
+    }
+    LLM_MAX_RETRIES: int = 3  # novas tentativas em 429/5xx
+    LLM_RETRY_BASE_SECONDS: float = 1.0  # backoff exponencial com jitter a partir deste valor
+    LLM_RETRY_MAX_SECONDS: float = 30.0  # teto do backoff; retry-after maior que isso falha na hora (o agente usa o fallback)
+    # Timeout de cada tentativa e circuit breaker (aberto = agentes vão direto para o fallback local)
+    GEMINI_CALL_TIMEOUT_SECONDS: float = 20.0  # 0 = sem timeout
+    GEMINI_CIRCUIT_BREAKER_ENABLED: bool = True
+    GEMINI_BREAKER_WINDOW_SECONDS: float = 60.0  # janela deslizante observada
+    GEMINI_BREAKER_MIN_CALLS: int = 10  # chamadas mínimas na janela para avaliar as taxas
+    GEMINI_BREAKER_ERROR_RATE: float = 0.5  # abre com esta fração de erros (timeout, 5xx, cota)
+    GEMINI_BREAKER_SLOW_CALL_SECONDS: float = 8.0  # chamada considerada lenta
+    GEMINI_BREAKER_SLOW_RATE: float = 0.8  # abre com esta fração de chamadas lentas
+    GEMINI_BREAKER_OPEN_SECONDS: float = 30.0  # tempo aberto antes de testar de novo
+    GEMINI_BREAKER_HALF_OPEN_PROBES: int = 2  # chamadas de teste (todas precisam dar certo para fechar)
     
+    # Pool de conexões do Postgres (cada engine - síncrono e asyncpg - tem o seu)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # espera máxima por uma conexão livre (s)
+    DB_POOL_RECYCLE: int = 1800  # reabre conexões mais antigas que isso (s; -1 = nunca)
+    DB_POOL_PRE_PING: bool = True  # testa a conexão antes de entregá-la (descarta conexões mortas)
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # statement_timeout de cada conexão (0 = sem limite)
+    DB_SLOW_HOLD_SECONDS: float = 5.0  # warning quando uma conexão fica emprestada por mais tempo
+
     # Authentication
     JWT_SECRET: str
     JWT_EXPIRES_IN: str = "7d"
@@ -20,6 +93,70 @@ class Settings(BaseSettings):
     WHATSAPP_BOT_URL: str = "http://localhost:3000"
     SKIP_WHATSAPP_IN_DEV: bool = True  # Skip WhatsApp in development mode
 
+    # Webhook Queue (processamento assíncrono com resposta 202 imediata)
+    WEBHOOK_QUEUE_ENABLED: bool = False
+    WEBHOOK_QUEUE_WORKERS: int = 4
+    WEBHOOK_QUEUE_POLL_INTERVAL: float = 0.5  # segundos entre consultas quando a fila está vazia
+    WEBHOOK_QUEUE_MAX_ATTEMPTS: int = 5
+    WEBHOOK_QUEUE_RETRY_BASE_SECONDS: float = 2.0
+    WEBHOOK_QUEUE_RETRY_MAX_SECONDS: float = 300.0
+    WEBHOOK_QUEUE_VISIBILITY_TIMEOUT: int = 300  # jobs "processing" mais antigos que isso são reivindicados de novo
+
+    # Serialização por telefone (advisory lock no Postgres)
+    PHONE_LOCK_ENABLED: bool = True
+    PHONE_LOCK_TIMEOUT_SECONDS: float = 60.0
+    PHONE_LOCK_POOL_SIZE: int = 10  # conexões dedicadas aos advisory locks = turnos simultâneos por processo
+
+    # Debounce: mensagens do mesmo telefone dentro da janela viram um único turno (0 = desligado)
+    MESSAGE_DEBOUNCE_SECONDS: float = 0.0
+    MESSAGE_DEBOUNCE_MAX_SECONDS: float = 15.0
+
+    # Deduplicação do /webhook por message_id (reenvios do bot recebem a resposta guardada)
+    MESSAGE_DEDUP_ENABLED: bool = True
+    MESSAGE_DEDUP_TTL_SECONDS: int = 86400
+    MESSAGE_DEDUP_CACHE_SIZE: int = 10000
+    MESSAGE_DEDUP_INFLIGHT_WAIT_SECONDS: float = 30.0  # cópia aguarda a original terminar
+    MESSAGE_DEDUP_STALE_SECONDS: int = 300  # reserva 'processing' mais antiga que isso pode ser retomada
+
+    # Cache write-through do estado da conversa (leituras sem ida ao banco)
+    STATE_CACHE_ENABLED: bool = True
+    STATE_CACHE_SIZE: int = 10000
+    STATE_CACHE_TTL_SECONDS: int = 300
+    STATE_CACHE_INVALIDATION: str = "notify"  # notify (LISTEN/NOTIFY entre workers) | none (um único worker)
+
+    # Expiração de conversas abandonadas (desde last_message_at; 0 = nunca expira)
+    STATE_TTL_SECONDS: int = 86400
+    STATE_TTL_BY_STAGE: Dict[str, int] = {  # sobrescreve o TTL por estágio (JSON na env)
+        "law_found": 7200,
+        "asking_question": 7200,
+        "choosing_help_type": 7200,
+    }
+    STATE_SWEEP_ENABLED: bool = True  # remove estados expirados em segundo plano
+    STATE_SWEEP_INTERVAL_SECONDS: float = 600.0
+    STATE_SWEEP_BATCH_SIZE: int = 500  # linhas por DELETE (transações curtas)
+
+    # Log de interações: linhas gravadas em lote (INSERT multi-linha) fora do caminho crítico
+    INTERACTION_LOG_MODE: str = "batched"  # batched (buffer; gravado no shutdown) | sync (turno aguarda a gravação)
+    INTERACTION_LOG_BATCH_SIZE: int = 200
+    INTERACTION_LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    INTERACTION_LOG_MAX_BUFFER: int = 10000  # linhas retidas enquanto o banco falha; além disso descarta as mais antigas
+
+    # Partições mensais de interactions: criação antecipada, retenção e resumos diários
+    INTERACTIONS_MAINTENANCE_ENABLED: bool = True  # desligado, só o startup cria partições: reinicie antes dos meses pré-criados acabarem
+    INTERACTIONS_MAINTENANCE_INTERVAL_SECONDS: float = 6 * 3600
+    INTERACTIONS_PARTITION_PREMAKE_MONTHS: int = 2  # meses futuros criados com antecedência
+    INTERACTIONS_RETENTION_MONTHS: int = 6  # partições brutas mantidas; as mais antigas viram só resumos (0 = mantém tudo)
+
+    # Cache de usuários por telefone canônico (invalidado por LISTEN/NOTIFY junto com o state cache)
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 300
+
+    # Despacho por estado: menus e fluxos guiados não chamam o classificador (False = classifica toda mensagem)
+    STATE_DISPATCH_ENABLED: bool = True
+    # Dispara a classificação junto com a busca de usuário/estado (menor latência; menus também pagam a chamada)
+    SPECULATIVE_CLASSIFICATION: bool = False
+
     class Config:
         env_file = ".env"
 
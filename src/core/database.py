@@ -1,15 +1,56 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .db_pool import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedLockPool,
+    InstrumentedQueuePool,
+    instrument_engine,
+    pool_options,
+    statement_timeout_connect_args,
+)
 
 # Ensure we use 127.0.0.1 instead of localhost to avoid Windows/Docker resolution issues
 # This is a runtime fix, but ideally should be in .env
 db_url = settings.DATABASE_URL.replace("localhost", "127.0.0.1")
 
-engine = create_engine(db_url)
+# Pool dimensionado pelo Settings (DB_POOL_*) e instrumentado (db_pool.py)
+engine = create_engine(
+    db_url,
+    poolclass=InstrumentedQueuePool,
+    connect_args=statement_timeout_connect_args("psycopg2"),
+    **pool_options()
+)
+instrument_engine(engine, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono (asyncpg) para rotas e serviços async: as consultas não
+# bloqueiam o event loop. Mesmo banco do DATABASE_URL, trocando só o driver.
+async_db_url = make_url(db_url).set(drivername="postgresql+asyncpg")
+
+async_engine = create_async_engine(
+    async_db_url,
+    poolclass=InstrumentedAsyncQueuePool,
+    connect_args=statement_timeout_connect_args("asyncpg"),
+    **pool_options()
+)
+instrument_engine(async_engine.sync_engine, "async")
+# expire_on_commit=False: atributos continuam acessíveis após o commit sem
+# lazy load (que não é permitido fora de um contexto await)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+# Pool só para os advisory locks por telefone (phone_lock): cada turno prende
+# uma conexão durante todo o processamento, sem tirar conexões dos outros pools
+lock_engine = create_async_engine(
+    async_db_url,
+    poolclass=InstrumentedLockPool,
+    **pool_options(pool_size=settings.PHONE_LOCK_POOL_SIZE, max_overflow=0)
+)
+instrument_engine(lock_engine.sync_engine, "lock")
+
 Base = declarative_base()
 
 def get_db():
@@ -19,6 +60,18 @@ def get_db():
     finally:
         db.close()
 
+def with_session(fn, *args, **kwargs):
+    """Executa fn(*args, db, **kwargs) em uma sessão própria (para rodar via asyncio.to_thread)"""
+    db = SessionLocal()
+    try:
+        return fn(*args, db, **kwargs)
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """
     Creates all tables defined in the metadata.
@@ -26,6 +79,7 @@ def init_db():
     """
     # Import models here to ensure they are registered with Base
     from src.models.interaction import Interaction  # noqa
+    from src.models.interaction_rollup import InteractionDailyRollup  # noqa
     from src.models.user import User  # noqa
     from src.models.demand import Demand  # noqa
     from src.models.demand_supporter import DemandSupporter  # noqa
@@ -33,6 +87,10 @@ def init_db():
     from src.models.legislative_item import LegislativeItem  # noqa
     from src.models.pl_interaction import PLInteraction  # noqa
     from src.models.verification_code import VerificationCode  # noqa
+    from src.models.webhook_job import WebhookJob  # noqa
+    from src.models.processed_message import ProcessedMessage  # noqa
+    from src.models.transcription_cache import TranscriptionCacheEntry  # noqa
+    from src.models.gemini_response_cache import GeminiResponseCacheEntry  # noqa
 
     # Configure the registry to resolve all relationships
     from sqlalchemy.orm import configure_mappers
@@ -46,3 +104,7 @@ def init_db():
 
     Base.metadata.create_all(bind=engine)
 
+    # interactions é particionada por mês: garante a partição do mês atual (e dos próximos)
+    from src.services.interaction_partitions import interaction_partitions
+    interaction_partitions.ensure_current_partitions()
+
@@ -0,0 +1,179 @@
+"""
+Pool de conexões do Postgres instrumentado
+
+Os dois engines (síncrono/psycopg2 e asyncpg) usam pools QueuePool
+dimensionados pelo Settings (DB_POOL_*); os advisory locks por telefone têm
+um pool asyncpg próprio (PHONE_LOCK_POOL_SIZE). Todos publicam no /metrics:
+
+- db_pool_checked_out / db_pool_overflow / db_pool_size (gauges por pool)
+- db_pool_wait_seconds: tempo esperando o pool entregar uma conexão
+  (inclui abrir uma conexão nova quando há folga de overflow)
+- db_pool_checkout_seconds: latência total do checkout (espera + pre-ping)
+- db_pool_timeouts_total: checkouts que estouraram DB_POOL_TIMEOUT
+- db_connection_hold_seconds: quanto tempo cada conexão ficou emprestada
+- db_request_hold_seconds{route}: soma do tempo de conexão por requisição HTTP
+
+Conexões presas por mais de DB_SLOW_HOLD_SECONDS geram um warning com a
+rota que as segurava (exceto as marcadas com mark_long_lived, como as do
+pool de locks por telefone, que ficam presas durante todo o turno).
+"""
+
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.core.config import settings
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Uso de conexões da requisição HTTP em andamento (compartilhado com as
+# threads de asyncio.to_thread, que copiam o contexto)
+_request_usage: ContextVar[Optional[Dict]] = ContextVar("db_request_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+class _InstrumentedPoolMixin:
+    pool_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.inc("db_pool_timeouts_total", pool=self.pool_label)
+            logger.warning(f"⏳ DB pool ({self.pool_label}) exhausted: {self.status()}")
+            raise
+        finally:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - start, pool=self.pool_label)
+
+    def connect(self):
+        start = time.perf_counter()
+        connection = super().connect()
+        metrics.observe("db_pool_checkout_seconds", time.perf_counter() - start, pool=self.pool_label)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pool_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pool_label = "async"
+
+
+class InstrumentedLockPool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pool_label = "lock"
+
+
+def pool_options(pool_size: Optional[int] = None, max_overflow: Optional[int] = None) -> Dict:
+    """
+    Argumentos de create_engine/create_async_engine vindos do Settings
+
+    Orçamento de conexões por processo (multiplicar pelos workers do uvicorn
+    e nós, e manter abaixo do max_connections do Postgres):
+    - engine síncrono: DB_POOL_SIZE + DB_MAX_OVERFLOW (inclui a conexão do
+      LISTEN do state_cache, presa enquanto o processo roda)
+    - engine asyncpg: DB_POOL_SIZE + DB_MAX_OVERFLOW
+    - locks por telefone: PHONE_LOCK_POOL_SIZE, sem overflow (cada turno em
+      andamento prende uma conexão; turnos além disso esperam na fila do pool)
+    """
+    return {
+        "pool_size": settings.DB_POOL_SIZE if pool_size is None else pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def statement_timeout_connect_args(driver: str) -> Dict:
+    """statement_timeout definido na abertura de cada conexão (0 = sem limite)"""
+    timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout <= 0:
+        return {}
+    if driver == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(timeout)}}
+    return {"options": f"-c statement_timeout={timeout}"}
+
+
+def instrument_engine(engine, label: str):
+    """Registra gauges e eventos de checkout/checkin do pool de `engine` (Engine síncrono)"""
+
+    def pool_gauge(read):
+        # engine.pool é lido a cada snapshot: dispose() troca o objeto do pool
+        return lambda: read(engine.pool) if isinstance(engine.pool, QueuePool) else None
+
+    metrics.register_gauge(f"db_pool_checked_out{{pool={label}}}", pool_gauge(lambda pool: pool.checkedout()))
+    metrics.register_gauge(f"db_pool_overflow{{pool={label}}}", pool_gauge(lambda pool: max(0, pool.overflow())))
+    metrics.register_gauge(f"db_pool_size{{pool={label}}}", pool_gauge(lambda pool: pool.size()))
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        usage = _request_usage.get()
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        connection_record.info["request_usage"] = usage
+        if usage is not None:
+            with _usage_lock:
+                usage["open"] += 1
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        usage = connection_record.info.pop("request_usage", None)
+        long_lived = connection_record.info.pop("long_lived", False)
+        if checked_out_at is None:
+            return
+
+        held = time.perf_counter() - checked_out_at
+        metrics.observe("db_connection_hold_seconds", held, pool=label)
+
+        if usage is not None:
+            with _usage_lock:
+                usage["hold_seconds"] += held
+                usage["checkouts"] += 1
+                usage["open"] -= 1
+                complete = usage["finished"] and usage["open"] == 0
+            if complete:
+                # A sessão da dependência (get_db) foi fechada depois da resposta
+                _record_request_usage(usage)
+
+        if held >= settings.DB_SLOW_HOLD_SECONDS and not long_lived:
+            route = usage["route"] if usage else "background"
+            logger.warning(f"🐢 DB connection ({label}) held for {held:.1f}s by {route}")
+
+
+def mark_long_lived(connection):
+    """Conexão que fica emprestada de propósito (não gera warning de conexão presa)"""
+    connection.info["long_lived"] = True
+
+
+def start_request_usage(path: str):
+    """Passa a contabilizar as conexões usadas pela requisição atual (path aparece nos warnings)"""
+    usage = {"route": path, "hold_seconds": 0.0, "checkouts": 0, "open": 0, "finished": False}
+    return usage, _request_usage.set(usage)
+
+
+def finish_request_usage(usage: Dict, token, route: str):
+    """
+    Fim da requisição (route = template da rota, ex: /api/demands/{demand_id}).
+
+    Conexões ainda emprestadas (sessões fechadas só depois da resposta)
+    entram na conta quando voltarem ao pool.
+    """
+    _request_usage.reset(token)
+    with _usage_lock:
+        usage["finished"] = True
+        usage["label"] = route
+        complete = usage["open"] == 0
+    if complete:
+        _record_request_usage(usage)
+
+
+def _record_request_usage(usage: Dict):
+    if usage["checkouts"]:
+        metrics.observe("db_request_hold_seconds", usage["hold_seconds"], route=usage["label"])
+        metrics.observe("db_request_checkouts", usage["checkouts"], route=usage["label"])
@@ -1,14 +1,187 @@
+"""
+Cliente do Gemini com cache de respostas
+
+Muitos prompts se repetem exatamente (mensagens fixas do Writer, "oi"/"bom dia"
+no Router, o mesmo rascunho no formalize-ai) e cada repetição seria uma chamada
+paga de 0,5-3 s. A chave do cache é o SHA-256 do modelo + prompt normalizado
+(espaços colapsados: a indentação das f-strings não muda a chave).
+
+Duas camadas:
+1. LRU em memória (GEMINI_CACHE_SIZE)
+2. Tabela `gemini_response_cache` no Postgres (GEMINI_CACHE_PERSIST),
+   compartilhada entre workers e preservada entre deploys
+
+Cada chamada informa o call_site (agente/rota): o TTL vem de
+GEMINI_CACHE_TTL_BY_CALL_SITE (ou GEMINI_CACHE_TTL_SECONDS) e as métricas
+gemini_cache_requests_total{call_site, result} são separadas por agente.
+Prompts que precisam variar passam cache=False.
+
+Chamadas idênticas simultâneas (mesma chave) compartilham uma única ida ao
+Gemini (src/core/single_flight.py), mesmo para call sites com TTL 0. As
+chamadas que chegam ao modelo passam pelo agendador (src/core/llm_scheduler.py):
+concorrência, cota RPM/TPM, prioridade e retry. Cada tentativa tem timeout
+(GEMINI_CALL_TIMEOUT_SECONDS) e alimenta o circuit breaker
+(src/core/circuit_breaker.py): com o circuito aberto a chamada falha na hora
+com CircuitOpenError e o agente usa o seu fallback local. Respostas em cache
+continuam sendo servidas.
+"""
+
+import asyncio
 import google.generativeai as genai
-from src.core.config import settings
+import hashlib
 import json
 import logging
 import re
-from typing import Any
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from src.core.cache import TTLCache
+from src.core.circuit_breaker import CircuitOpenError, gemini_breaker
+from src.core.config import settings
+from src.core.database import SessionLocal
+from src.core.llm_scheduler import llm_scheduler
+from src.core.metrics import metrics
+from src.core.single_flight import SingleFlight
+from src.models.gemini_response_cache import GeminiResponseCacheEntry
 
 logger = logging.getLogger(__name__)
 
+_WHITESPACE = re.compile(r"\s+")
+
+# Estimativa de tokens do prompt para o balde TPM (corrigida pelo uso real)
+_CHARS_PER_TOKEN = 4
+
+# Intervalo mínimo entre limpezas de entradas expiradas no banco
+_PURGE_INTERVAL_SECONDS = 3600
+
+
+def _is_outage(exc: Exception) -> bool:
+    """Erros que indicam Gemini indisponível (timeout, 5xx, cota); 4xx de prompt inválido não contam"""
+    if isinstance(exc, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    return not isinstance(exc, google_exceptions.ClientError)
+
+
+class GeminiResponseCache:
+    """Respostas por modelo + hash do prompt (memória + Postgres)"""
+
+    def __init__(self):
+        self._memory = TTLCache(maxsize=settings.GEMINI_CACHE_SIZE, ttl=settings.GEMINI_CACHE_TTL_SECONDS)
+        self._last_purge = 0.0
+        metrics.register_gauge("gemini_cache_entries", lambda: len(self._memory))
+
+    @staticmethod
+    def prompt_key(model: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        normalized = _WHITESPACE.sub(" ", prompt).strip()
+        if generation_config:
+            normalized += "\n" + json.dumps(generation_config, sort_keys=True)
+        return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def ttl_for(call_site: str) -> int:
+        return settings.GEMINI_CACHE_TTL_BY_CALL_SITE.get(call_site, settings.GEMINI_CACHE_TTL_SECONDS)
+
+    def get_memory(self, key: str, call_site: str) -> Optional[str]:
+        cached = self._memory.get(key)
+        if cached is not None:
+            metrics.inc("gemini_cache_requests_total", call_site=call_site, result="hit_memory")
+        return cached
+
+    async def get_stored(self, key: str, model: str, call_site: str) -> Optional[str]:
+        if settings.GEMINI_CACHE_PERSIST:
+            try:
+                stored = await asyncio.to_thread(self._load, key, model)
+            except Exception as e:
+                # O cache é best-effort: sem o banco, segue para a chamada ao Gemini
+                logger.warning(f"Could not read Gemini cache {key[:12]}: {e}")
+                stored = None
+            if stored is not None:
+                response, remaining_seconds = stored
+                self._memory.set(key, response, ttl=remaining_seconds)
+                metrics.inc("gemini_cache_requests_total", call_site=call_site, result="hit_db")
+                return response
+
+        metrics.inc("gemini_cache_requests_total", call_site=call_site, result="miss")
+        return None
+
+    async def set(self, key: str, model: str, call_site: str, response: str, ttl: int):
+        self._memory.set(key, response, ttl=ttl)
+
+        if settings.GEMINI_CACHE_PERSIST:
+            try:
+                await asyncio.to_thread(self._store, key, model, call_site, response, ttl)
+            except Exception as e:
+                logger.warning(f"Could not persist Gemini response {key[:12]}: {e}")
+
+    def _load(self, key: str, model: str) -> Optional[Tuple[str, float]]:
+        db = SessionLocal()
+        try:
+            self._purge_expired(db)
+
+            # Leitura + contagem do hit em um único comando
+            row = db.execute(
+                update(GeminiResponseCacheEntry)
+                .where(
+                    GeminiResponseCacheEntry.prompt_sha256 == key,
+                    GeminiResponseCacheEntry.model == model,
+                    GeminiResponseCacheEntry.expires_at > func.now()
+                )
+                .values(hit_count=GeminiResponseCacheEntry.hit_count + 1, last_hit_at=func.now())
+                .returning(
+                    GeminiResponseCacheEntry.response,
+                    func.extract("epoch", GeminiResponseCacheEntry.expires_at - func.now())
+                )
+            ).first()
+            db.commit()
+            return (row[0], float(row[1])) if row else None
+        finally:
+            db.close()
+
+    def _store(self, key: str, model: str, call_site: str, response: str, ttl: int):
+        db = SessionLocal()
+        try:
+            stmt = insert(GeminiResponseCacheEntry).values(
+                prompt_sha256=key,
+                model=model,
+                call_site=call_site,
+                response=response,
+                expires_at=func.now() + timedelta(seconds=ttl)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[GeminiResponseCacheEntry.prompt_sha256, GeminiResponseCacheEntry.model],
+                set_={
+                    "call_site": stmt.excluded.call_site,
+                    "response": stmt.excluded.response,
+                    "expires_at": stmt.excluded.expires_at,
+                    "created_at": func.now()
+                }
+            )
+            db.execute(stmt)
+            db.commit()
+        finally:
+            db.close()
+
+    def _purge_expired(self, db):
+        if time.monotonic() - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+
+        deleted = db.query(GeminiResponseCacheEntry).filter(
+            GeminiResponseCacheEntry.expires_at <= func.now()
+        ).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            logger.info(f"🧹 Purged {deleted} expired Gemini responses")
+
+
 class GeminiClient:
     def __init__(self):
+        self.cache = GeminiResponseCache()
+        self._in_flight = SingleFlight("gemini")
+
         if not settings.GOOGLE_GEMINI_API_KEY:
             logger.warning("GOOGLE_GEMINI_API_KEY not set")
             self.model = None
@@ -17,16 +190,108 @@ class GeminiClient:
         genai.configure(api_key=settings.GOOGLE_GEMINI_API_KEY)
         self.model = genai.GenerativeModel(settings.GEMINI_MODEL_FLASH)
 
-    async def generate_content(self, prompt: str) -> str:
+    async def generate_content(
+        self,
+        prompt: str,
+        call_site: str = "default",
+        cache: bool = True,
+        priority: Optional[str] = None,
+        generation_config: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Gera a resposta do prompt, reaproveitando respostas já geradas.
+
+        Args:
+            prompt: Prompt completo
+            call_site: Agente/rota que chama (TTL do cache, prioridade e rótulo das métricas)
+            cache: False para prompts cuja resposta precisa variar a cada chamada (sem cache nem coalescência)
+            priority: interactive | standard | background (None = LLM_PRIORITY_BY_CALL_SITE)
+            generation_config: Parâmetros de geração (temperature, max_output_tokens, ...)
+
+        Returns:
+            Texto da resposta
+        """
         if not self.model:
             raise ValueError("Gemini API key not configured")
-        
+
+        model_name = settings.GEMINI_MODEL_FLASH
+        call = lambda: self._call_model(prompt, call_site, priority, generation_config)
+
+        ttl = self.cache.ttl_for(call_site) if cache and settings.GEMINI_CACHE_ENABLED else 0
+        coalesce = cache and settings.LLM_SINGLE_FLIGHT_ENABLED
+        if ttl <= 0:
+            metrics.inc("gemini_cache_requests_total", call_site=call_site, result="bypass")
+            if not coalesce:
+                return await call()
+
+        key = self.cache.prompt_key(model_name, prompt, generation_config)
+        if ttl > 0:
+            cached = self.cache.get_memory(key, call_site)
+            if cached is not None:
+                return cached
+
+        fetch = lambda: self._load_or_generate(call, key, model_name, call_site, ttl)
+        if coalesce:
+            return await self._in_flight.run(key, fetch, call_site=call_site)
+        return await fetch()
+
+    async def _load_or_generate(self, call, key: str, model_name: str, call_site: str, ttl: int) -> str:
+        if ttl > 0:
+            stored = await self.cache.get_stored(key, model_name, call_site)
+            if stored is not None:
+                return stored
+
+        text = await call()
+        if ttl > 0 and text.strip():
+            await self.cache.set(key, model_name, call_site, text, ttl)
+        return text
+
+    async def _call_model(
+        self,
+        prompt: str,
+        call_site: str,
+        priority: Optional[str],
+        generation_config: Optional[Dict[str, Any]]
+    ) -> str:
+        if gemini_breaker.rejects():
+            # Nem entra na fila: o agente vai direto para o fallback local
+            metrics.inc("gemini_fast_fallbacks_total", call_site=call_site)
+            gemini_breaker.reject()
+
         try:
-            response = await self.model.generate_content_async(prompt)
+            response = await llm_scheduler.run(
+                settings.GEMINI_MODEL_FLASH,
+                lambda: self._attempt(prompt, generation_config),
+                call_site=call_site,
+                priority=priority,
+                tokens=len(prompt) // _CHARS_PER_TOKEN,
+                tokens_used=lambda r: r.usage_metadata.total_token_count
+            )
             return response.text
+        except CircuitOpenError:
+            metrics.inc("gemini_fast_fallbacks_total", call_site=call_site)
+            raise
+        except Exception as e:
+            logger.error(f"Error calling Gemini ({call_site}): {e}")
+            raise
+
+    async def _attempt(self, prompt: str, generation_config: Optional[Dict[str, Any]]):
+        """Uma tentativa: passa pelo circuit breaker, com timeout, e registra o resultado nele"""
+        gemini_breaker.acquire()
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(prompt, generation_config=generation_config),
+                timeout=settings.GEMINI_CALL_TIMEOUT_SECONDS or None
+            )
+        except asyncio.CancelledError:
+            gemini_breaker.abandon()
+            raise
         except Exception as e:
-            logger.error(f"Error calling Gemini: {e}")
+            gemini_breaker.record(time.monotonic() - started, failed=_is_outage(e))
             raise
+        gemini_breaker.record(time.monotonic() - started, failed=False)
+        return response
 
     def parse_json(self, text: str) -> Any:
         """
@@ -0,0 +1,285 @@
+"""
+Agendador das chamadas ao Gemini
+
+Em rajadas o Gemini responde 429 (ResourceExhausted) e cada agente cai no seu
+fallback degradado. Toda chamada ao modelo passa por aqui (GeminiClient):
+
+1. Concorrência por modelo (LLM_MAX_CONCURRENCY): as vagas são entregues por
+   prioridade - "interactive" (classificação, extração do turno atual) antes de
+   "standard" e "background" (síntese de textos longos); FIFO dentro da classe.
+2. Baldes de tokens por modelo no tamanho da cota: LLM_RPM_LIMIT requisições
+   e LLM_TPM_LIMIT tokens por minuto (estimativa do prompt na entrada,
+   corrigida pelo usage_metadata da resposta).
+3. Retry de 429/5xx com backoff exponencial com jitter; um retry-after
+   informado pelo Gemini é respeitado e pausa o modelo inteiro (as outras
+   chamadas também esperam, em vez de gastar a cota em novos 429).
+
+Métricas por agente (call_site): llm_queue_seconds, llm_throttled_total,
+llm_retries_total e llm_calls_total.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from google.api_core import exceptions as google_exceptions
+from src.core.config import settings
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIORITIES = {"interactive": 0, "standard": 1, "background": 2}
+
+# Erros transitórios (cota, sobrecarga, timeout) que valem nova tentativa
+_RETRYABLE = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+_QUOTA = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+
+_RETRY_DELAY_PATTERNS = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry in\s+([\d.]+)\s*s", re.IGNORECASE),
+)
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """
+    Atraso pedido pelo servidor: RetryInfo nos detalhes do erro gRPC,
+    header Retry-After (REST) ou o texto da mensagem.
+    """
+    for detail in getattr(exc, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (delay.seconds or delay.nanos):
+            return delay.seconds + delay.nanos / 1e9
+
+    response = getattr(exc, "response", None)
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+
+    for pattern in _RETRY_DELAY_PATTERNS:
+        match = pattern.search(str(exc))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Balde reabastecido continuamente: `per_minute` unidades por minuto, rajada até o mesmo valor"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver `amount` unidades (0 = disponível agora)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        """Consome `amount` (pode ficar negativo: corrige estimativas que ficaram abaixo do uso real)"""
+        self._refill()
+        self.tokens -= amount
+
+
+class _ModelLane:
+    """Vagas, baldes e pausa de um modelo"""
+
+    def __init__(self, model: str):
+        limits = settings.LLM_MODEL_LIMITS.get(model, {})
+        rpm = limits.get("rpm", settings.LLM_RPM_LIMIT)
+        tpm = limits.get("tpm", settings.LLM_TPM_LIMIT)
+
+        self.model = model
+        self.slots = max(1, int(limits.get("concurrency", settings.LLM_MAX_CONCURRENCY)))
+        self.active = 0
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, level: int):
+        if self.active < self.slots and not self.queued:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # a vaga chegou junto com o cancelamento: repassa
+            raise
+
+    def release(self):
+        # A vaga passa direto para o próximo da fila (active não muda)
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_time(self, tokens: int) -> float:
+        wait = self.paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def take(self, tokens: int):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+
+class LLMScheduler:
+    """Concorrência, cota e retry das chamadas ao Gemini, por modelo"""
+
+    def __init__(self):
+        self._lanes: Dict[str, _ModelLane] = {}
+        metrics.register_gauge("llm_queue_depth", lambda: sum(lane.queued for lane in self._lanes.values()))
+        metrics.register_gauge("llm_active_calls", lambda: sum(lane.active for lane in self._lanes.values()))
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane(model)
+        return lane
+
+    @staticmethod
+    def priority_for(call_site: str) -> str:
+        return settings.LLM_PRIORITY_BY_CALL_SITE.get(call_site, "standard")
+
+    @staticmethod
+    def retry_delay(exc: Exception, attempt: int) -> Optional[float]:
+        """
+        Espera antes da próxima tentativa, ou None se o erro não for
+        transitório, as tentativas acabaram ou o retry-after é longo demais.
+        """
+        if not isinstance(exc, _RETRYABLE) or attempt >= settings.LLM_MAX_RETRIES:
+            return None
+
+        # Backoff exponencial com "full jitter"
+        ceiling = min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+        backoff = random.uniform(0, ceiling)
+
+        retry_after = retry_after_seconds(exc)
+        if retry_after is None:
+            return backoff
+        if retry_after > settings.LLM_RETRY_MAX_SECONDS:
+            return None
+        return retry_after * random.uniform(1.0, 1.2)  # jitter: os que esperavam não voltam juntos
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        call_site: str = "default",
+        priority: Optional[str] = None,
+        tokens: int = 0,
+        tokens_used: Optional[Callable[[T], int]] = None
+    ) -> T:
+        """
+        Executa `call` respeitando a concorrência e a cota de `model`, com retry.
+
+        Args:
+            model: Modelo chamado (cada modelo tem suas vagas e baldes)
+            call: Fábrica da corrotina (chamada de novo a cada tentativa)
+            call_site: Agente/rota que chama (rótulo das métricas; define a prioridade padrão)
+            priority: interactive | standard | background (None = LLM_PRIORITY_BY_CALL_SITE)
+            tokens: Estimativa de tokens debitada do balde TPM antes da chamada
+            tokens_used: Extrai o uso real do resultado para corrigir o balde
+
+        Returns:
+            O resultado de `call`
+        """
+        if not settings.LLM_SCHEDULER_ENABLED:
+            return await call()
+
+        lane = self._lane(model)
+        priority = priority or self.priority_for(call_site)
+        level = PRIORITIES.get(priority, PRIORITIES["standard"])
+        attempt = 0
+
+        while True:
+            queued_at = time.monotonic()
+            await lane.acquire(level)
+            try:
+                await self._throttle(lane, tokens, call_site)
+                metrics.observe("llm_queue_seconds", time.monotonic() - queued_at, call_site=call_site, priority=priority)
+
+                try:
+                    with metrics.timer("llm_call_seconds", call_site=call_site):
+                        result = await call()
+                except Exception as e:
+                    delay = self.retry_delay(e, attempt)
+                    if delay is None:
+                        metrics.inc("llm_calls_total", call_site=call_site, result="error")
+                        raise
+                    if isinstance(e, _QUOTA):
+                        lane.pause(delay)
+                    reason = type(e).__name__
+                else:
+                    if tokens_used is not None and lane.tokens is not None:
+                        try:
+                            lane.tokens.take(max(0, tokens_used(result) - tokens))
+                        except Exception:
+                            pass  # sem usage_metadata: fica a estimativa
+                    metrics.inc("llm_calls_total", call_site=call_site, result="ok")
+                    return result
+            finally:
+                lane.release()
+
+            attempt += 1
+            metrics.inc("llm_retries_total", call_site=call_site, reason=reason)
+            logger.warning(f"⏳ Gemini {reason} for {call_site}; retry {attempt}/{settings.LLM_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _throttle(self, lane: _ModelLane, tokens: int, call_site: str):
+        """Aguarda a pausa do modelo e os baldes RPM/TPM, e debita a chamada"""
+        throttled = False
+        while True:
+            wait = lane.wait_time(tokens)
+            if wait <= 0:
+                lane.take(tokens)
+                break
+            if not throttled:
+                throttled = True
+                metrics.inc("llm_throttled_total", call_site=call_site, model=lane.model)
+            await asyncio.sleep(wait)
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de amostras mantidas por série de histograma (reservatório circular)
+_RESERVOIR_SIZE = 2048
+
+
+def _series_key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_key(key: Tuple[str, Tuple[Tuple[str, str], ...]]) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in labels)
+    return f"{name}{{{label_str}}}"
+
+
+class _Histogram:
+    """Histograma simples: contadores agregados + reservatório para percentis."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = deque(maxlen=_RESERVOIR_SIZE)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.samples.append(value)
+
+    def _percentile(self, ordered: list, p: float) -> float:
+        if not ordered:
+            return 0.0
+        idx = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "min": round(self.min, 6) if self.min is not None else None,
+            "max": round(self.max, 6) if self.max is not None else None,
+            "p50": round(self._percentile(ordered, 0.50), 6),
+            "p95": round(self._percentile(ordered, 0.95), 6),
+            "p99": round(self._percentile(ordered, 0.99), 6),
+        }
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas em memória (por processo).
+
+    Suporta contadores, gauges (valor fixo ou calculado na leitura) e
+    histogramas com percentis. Exposto em JSON pelo endpoint /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict = {}
+        self._gauges: Dict = {}
+        self._histograms: Dict = {}
+        self._gauge_callbacks: Dict[str, Callable[[], object]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], object]):
+        """Registra um gauge calculado sob demanda (ex: profundidade da fila)."""
+        with self._lock:
+            self._gauge_callbacks[name] = callback
+
+    def observe(self, name: str, value: float, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Mede a duração (segundos) do bloco e registra no histograma `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_series_key(name, labels), 0)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counters = {_format_key(k): v for k, v in self._counters.items()}
+            gauges = {_format_key(k): v for k, v in self._gauges.items()}
+            histograms = {_format_key(k): h.snapshot() for k, h in self._histograms.items()}
+            callbacks = dict(self._gauge_callbacks)
+
+        for name, callback in callbacks.items():
+            try:
+                gauges[name] = callback()
+            except Exception as e:
+                logger.warning(f"Could not compute gauge {name}: {e}")
+                gauges[name] = None
+
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,79 @@
+"""
+Canonicalização de telefones (E.164)
+
+O mesmo número chega em formatos diferentes: JID do WhatsApp
+("556199998888@c.us"), com ou sem o DDI 55, com ou sem o nono dígito
+(contas antigas do WhatsApp ainda usam o número de 8 dígitos), e o
+cadastro web envia DDD + número. A chave canônica é o E.164 com o nono
+dígito nos celulares:
+
+    "556188887777@c.us" -> "+5561988887777"
+    "61988887777"       -> "+5561988887777"
+    "6133334444"        -> "+556133334444"   (fixo: sem nono dígito)
+
+users.phone_e164 guarda essa chave (indexada); buscas usam phone_variants
+para casar também linhas gravadas com a outra forma do nono dígito.
+"""
+
+import re
+from typing import List, Optional
+
+BRAZIL_DDI = "55"
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def national_number(raw: Optional[str]) -> Optional[str]:
+    """
+    DDD + número (10 ou 11 dígitos), sem DDI, sufixo de JID ou pontuação.
+
+    Returns:
+        Os dígitos nacionais, ou None se não parecer um número brasileiro
+    """
+    if not raw:
+        return None
+    digits = _NON_DIGITS.sub("", raw.split("@")[0])
+
+    if len(digits) in (12, 13) and digits.startswith(BRAZIL_DDI):
+        return digits[2:]
+    # JIDs e "+..." sempre trazem o DDI: sem 55, o número é estrangeiro
+    international = "@" in raw or raw.lstrip().startswith("+")
+    if len(digits) in (10, 11) and not international:
+        return digits
+    return None
+
+
+def canonical_phone(raw: Optional[str]) -> Optional[str]:
+    """
+    Chave canônica E.164 de um telefone em qualquer formato aceito.
+
+    Celulares (primeiro dígito do assinante 6-9) sem o nono dígito ganham o 9;
+    números estrangeiros viram "+<dígitos>".
+
+    Returns:
+        "+55DDDNNNNNNNNN", ou None para entradas vazias/sem dígitos
+    """
+    national = national_number(raw)
+    if national is None:
+        digits = _NON_DIGITS.sub("", (raw or "").split("@")[0])
+        return f"+{digits}" if digits else None
+
+    if len(national) == 10 and national[2] in "6789":
+        national = f"{national[:2]}9{national[2:]}"
+    return f"+{BRAZIL_DDI}{national}"
+
+
+def phone_variants(raw: Optional[str]) -> List[str]:
+    """
+    Chave canônica + a forma alternativa do nono dígito, para uma única
+    consulta `phone_e164 IN (...)` que também encontra linhas antigas.
+    """
+    key = canonical_phone(raw)
+    if key is None:
+        return []
+
+    variants = [key]
+    national = key[len(BRAZIL_DDI) + 1:] if key.startswith(f"+{BRAZIL_DDI}") else None
+    if national and len(national) == 11 and national[2] == "9":
+        variants.append(f"+{BRAZIL_DDI}{national[:2]}{national[3:]}")
+    return variants
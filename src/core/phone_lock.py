@@ -0,0 +1,157 @@
+"""
+Serialização de mensagens por telefone
+
+Mensagens do mesmo telefone são processadas uma de cada vez (o estado da
+conversa é lido e escrito sem corridas); telefones diferentes continuam
+rodando em paralelo.
+
+Duas camadas:
+1. asyncio.Lock por telefone (FIFO) - mantém a ordem de chegada dentro do processo
+2. pg_advisory_lock com chave = hash do telefone - exclusão entre workers do
+   uvicorn e entre nós. O lock é de sessão (o turno faz vários commits, então
+   um lock de transação seria solto no meio) e fica preso a uma conexão do
+   lock_engine, um pool asyncpg próprio de PHONE_LOCK_POOL_SIZE conexões:
+   turnos longos não tiram conexões dos pools das rotas e dos handlers. Se o
+   processo morrer o Postgres libera o lock automaticamente.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from sqlalchemy import exc, text
+from src.core.config import settings
+from src.core.database import lock_engine
+from src.core.db_pool import mark_long_lived
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Intervalo de polling do pg_try_advisory_lock (cresce até o máximo)
+_POLL_INITIAL = 0.02
+_POLL_MAX = 0.25
+
+
+class PhoneLockTimeout(Exception):
+    """Não foi possível obter o lock do telefone dentro do tempo limite"""
+
+
+def phone_lock_key(phone: str) -> int:
+    """
+    Chave bigint estável para o advisory lock.
+
+    Não usa hash() do Python: ele é randomizado por processo e os workers
+    precisam concordar na mesma chave.
+    """
+    normalized = phone.split("@")[0]
+    digest = hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class _LocalLock:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiters = 0
+
+
+_local_locks: Dict[str, _LocalLock] = {}
+
+
+async def _try_acquire(connection, key: int) -> bool:
+    acquired = (await connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})).scalar()
+    await connection.commit()
+    return bool(acquired)
+
+
+async def _release(connection, key: int):
+    try:
+        await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        await connection.commit()
+    except Exception as e:
+        # Lock de sessão: a conexão não pode voltar ao pool ainda segurando o lock
+        logger.error(f"❌ Error releasing advisory lock {key}: {e}")
+        await connection.invalidate()
+    finally:
+        await connection.close()
+
+
+async def _connect(deadline: float):
+    try:
+        connection = await asyncio.wait_for(lock_engine.connect(), timeout=max(0.0, deadline - time.monotonic()))
+    except (asyncio.TimeoutError, exc.TimeoutError):
+        raise PhoneLockTimeout("lock pool exhausted")
+    mark_long_lived(connection)
+    return connection
+
+
+async def _acquire_advisory(key: int, deadline: float):
+    connection = await _connect(deadline)
+    delay = _POLL_INITIAL
+
+    try:
+        while not await _try_acquire(connection, key):
+            if time.monotonic() >= deadline:
+                raise PhoneLockTimeout(f"advisory lock {key} busy")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX)
+    except BaseException:
+        await connection.close()
+        raise
+
+    return connection
+
+
+@asynccontextmanager
+async def phone_lock(phone: str):
+    """
+    Garante processamento exclusivo (e em ordem) das mensagens de um telefone.
+
+    Raises:
+        PhoneLockTimeout: se o lock não for obtido em PHONE_LOCK_TIMEOUT_SECONDS
+    """
+    if not settings.PHONE_LOCK_ENABLED:
+        yield
+        return
+
+    key = phone_lock_key(phone)
+    local_key = phone.split("@")[0]
+    local = _local_locks.get(local_key)
+    if local is None:
+        local = _local_locks[local_key] = _LocalLock()
+
+    start = time.monotonic()
+    deadline = start + settings.PHONE_LOCK_TIMEOUT_SECONDS
+    local.waiters += 1
+    connection = None
+
+    try:
+        try:
+            await asyncio.wait_for(local.lock.acquire(), timeout=settings.PHONE_LOCK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise PhoneLockTimeout(f"local lock for {local_key} busy")
+
+        try:
+            connection = await _acquire_advisory(key, deadline)
+        except BaseException:
+            local.lock.release()
+            raise
+
+        metrics.observe("phone_lock_wait_seconds", time.monotonic() - start)
+
+        try:
+            yield
+        finally:
+            await _release(connection, key)
+            local.lock.release()
+
+    except PhoneLockTimeout:
+        metrics.inc("phone_lock_timeouts_total")
+        logger.warning(f"⏳ Timed out waiting for conversation lock of {phone}")
+        raise
+
+    finally:
+        local.waiters -= 1
+        if local.waiters == 0 and _local_locks.get(local_key) is local:
+            del _local_locks[local_key]
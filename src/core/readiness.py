@@ -0,0 +1,62 @@
+"""
+Prontidão do serviço (/ready)
+
+/health só diz que o processo está de pé; /ready diz se ele já consegue
+atender uma mensagem sem pagar custos de inicialização: modelo do Whisper
+carregado e aquecido, pool do banco respondendo e cliente do Gemini
+configurado.
+"""
+
+import logging
+import time
+from typing import Dict
+from sqlalchemy import text
+from src.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+class ReadinessState:
+    """Componentes inicializados em segundo plano no startup"""
+
+    def __init__(self):
+        self._components: Dict[str, Dict] = {}
+
+    def pending(self, name: str):
+        self._components[name] = {"ready": False, "since": time.time()}
+
+    def mark_ready(self, name: str, **details):
+        self._components[name] = {"ready": True, **details}
+
+    def mark_failed(self, name: str, error: str):
+        self._components[name] = {"ready": False, "error": error}
+
+    def check(self) -> Dict:
+        components = {name: dict(state) for name, state in self._components.items()}
+        components["database"] = _check_database()
+        components["gemini"] = _check_gemini()
+        return {
+            "ready": all(c["ready"] for c in components.values()),
+            "components": components
+        }
+
+
+def _check_database() -> Dict:
+    try:
+        start = time.perf_counter()
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return {"ready": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        return {"ready": False, "error": str(e)[:200]}
+
+
+def _check_gemini() -> Dict:
+    from src.core.gemini import gemini_client
+
+    if gemini_client.model is None:
+        return {"ready": False, "error": "GOOGLE_GEMINI_API_KEY not configured"}
+    return {"ready": True}
+
+
+readiness = ReadinessState()
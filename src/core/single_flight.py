@@ -0,0 +1,72 @@
+"""
+Coalescência de chamadas idênticas em andamento (single-flight)
+
+Quando um problema do bairro viraliza, dezenas de moradores mandam quase a
+mesma mensagem no mesmo minuto e os agentes disparam chamadas idênticas ao
+Gemini (geração e embeddings) ao mesmo tempo. Com SingleFlight, a primeira
+chamada de uma chave executa; as que chegam enquanto ela está em andamento
+aguardam o mesmo resultado (ou a mesma exceção) em vez de gastar cota.
+
+Vale só dentro do processo; entre workers o cache persistente de respostas
+(src/core/gemini.py) cobre as repetições.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from src.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Uma chamada em andamento por chave; as simultâneas compartilham o resultado"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        metrics.register_gauge(f"{name}_in_flight_calls", lambda: len(self._in_flight))
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]], **labels) -> T:
+        """
+        Executa `call`, ou aguarda a execução já em andamento para `key`.
+
+        A chamada roda numa task própria: cancelar quem a iniciou (cliente
+        desconectado, classificação especulativa descartada) só interrompe a
+        espera dele - os demais continuam aguardando a mesma execução.
+
+        Args:
+            key: Identifica chamadas equivalentes
+            call: Fábrica da corrotina (só é chamada se não houver outra em andamento)
+            **labels: Rótulos extras do contador single_flight_coalesced_total
+
+        Returns:
+            O resultado da chamada compartilhada
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            metrics.inc("single_flight_coalesced_total", group=self.name, **labels)
+        else:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled() or asyncio.current_task().cancelling():
+                raise
+            # A execução compartilhada foi cancelada por fora, mas este
+            # chamador não: refaz a chamada por conta própria
+            return await call()
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # evita "exception was never retrieved" quando ninguém aguardava
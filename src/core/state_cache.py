@@ -0,0 +1,248 @@
+"""
+Cache write-through do estado da conversa (ConversationState)
+
+Toda mensagem lê o estado do telefone; com o cache, a leitura no caminho
+quente não vai ao banco. O AsyncConversationStateManager grava primeiro no
+Postgres e depois atualiza o cache (write-through), então o próprio
+processo nunca lê um estado velho.
+
+Invalidação entre workers/nós (STATE_CACHE_INVALIDATION=notify):
+- cada escrita faz pg_notify('conversation_state', '<instância>:<telefone>')
+  na mesma transação (só é entregue no commit)
+- uma thread por processo faz LISTEN no canal e descarta o telefone do
+  cache local (notificações da própria instância são ignoradas)
+- leituras que vão ao banco só entram no cache se nenhuma invalidação
+  chegou enquanto a consulta rodava (evita gravar um valor já superado)
+- sem o LISTEN ativo (startup, queda da conexão) o cache fica desligado e
+  é esvaziado ao reconectar, pois notificações podem ter sido perdidas
+
+A mesma conexão de LISTEN atende outros caches do processo (subscribe),
+ex: o cache de usuários (src/core/user_cache.py).
+
+Com um único worker, STATE_CACHE_INVALIDATION=none dispensa o LISTEN.
+O TTL (STATE_CACHE_TTL_SECONDS) limita a idade de qualquer entrada.
+"""
+
+import copy
+import logging
+import select
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.models.conversation_state import ConversationState
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "conversation_state"
+
+# Intervalo do select() da thread de LISTEN e espera máxima entre reconexões
+_LISTEN_POLL_SECONDS = 1.0
+_RECONNECT_MAX_SECONDS = 30.0
+
+
+@dataclass(frozen=True)
+class StateSnapshot:
+    """Cópia imutável de uma linha de conversation_states"""
+    current_stage: str
+    context_data: Optional[Dict[str, Any]]
+    last_message_at: Optional[datetime]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, state: ConversationState) -> "StateSnapshot":
+        return cls(
+            current_stage=state.current_stage,
+            context_data=copy.deepcopy(state.context_data),
+            last_message_at=state.last_message_at if isinstance(state.last_message_at, datetime) else None,
+            created_at=state.created_at if isinstance(state.created_at, datetime) else None
+        )
+
+    def to_state(self, phone: str) -> ConversationState:
+        """ConversationState avulso (fora de qualquer sessão); alterá-lo não afeta o cache"""
+        return ConversationState(
+            phone=phone,
+            current_stage=self.current_stage,
+            context_data=copy.deepcopy(self.context_data),
+            last_message_at=self.last_message_at,
+            created_at=self.created_at
+        )
+
+
+# Entrada de "telefone sem estado" (usuários novos também não consultam o banco)
+ABSENT = object()
+
+
+class ConversationStateCache:
+    """LRU + TTL por telefone, invalidado entre processos por LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._entries = TTLCache(
+            maxsize=settings.STATE_CACHE_SIZE,
+            ttl=settings.STATE_CACHE_TTL_SECONDS
+        )
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listening = False
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._subscribers: Dict[str, Tuple[Callable[[str], None], Callable[[], None]]] = {}
+
+        metrics.register_gauge("state_cache_entries", lambda: len(self._entries))
+        metrics.register_gauge("state_cache_active", lambda: int(self.active))
+
+    @property
+    def listening(self) -> bool:
+        return self._listening
+
+    def subscribe(self, channel: str, on_notify: Callable[[str], None], on_reset: Callable[[], None]):
+        """
+        Entrega as notificações de outro canal a um cache do processo.
+
+        Args:
+            channel: Canal do pg_notify (LISTEN feito na próxima (re)conexão)
+            on_notify: Recebe o payload de cada notificação
+            on_reset: Chamado quando o LISTEN cai ou reconecta (notificações podem ter sido perdidas)
+        """
+        self._subscribers[channel] = (on_notify, on_reset)
+
+    @property
+    def active(self) -> bool:
+        if not settings.STATE_CACHE_ENABLED:
+            return False
+        return settings.STATE_CACHE_INVALIDATION == "none" or self._listening
+
+    def lookup(self, phone: str) -> Tuple[bool, Any]:
+        """
+        Returns:
+            (hit, StateSnapshot ou ABSENT); hit=False quando é preciso ir ao banco
+        """
+        if not self.active:
+            return False, None
+
+        entry = self._entries.get(phone)
+        if entry is None:
+            metrics.inc("state_cache_requests_total", result="miss")
+            return False, None
+
+        metrics.inc("state_cache_requests_total", result="hit")
+        return True, entry
+
+    def begin_load(self) -> int:
+        """Marca o início de uma leitura no banco (ver store_loaded)"""
+        return self._generation
+
+    def store_loaded(self, phone: str, state: Optional[ConversationState], generation: int):
+        """Guarda o resultado de uma leitura, se nenhuma invalidação chegou durante ela"""
+        if not self.active:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries.set(phone, StateSnapshot.from_row(state) if state else ABSENT)
+
+    def store_written(self, phone: str, snapshot: Optional[StateSnapshot]):
+        """Write-through: valor que esta instância acabou de gravar (None = estado removido)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.set(phone, snapshot or ABSENT)
+
+    def invalidate(self, phone: Optional[str] = None):
+        """Descarta um telefone (ou tudo, com phone=None)"""
+        with self._lock:
+            self._generation += 1
+            if phone is None:
+                self._entries.clear()
+            else:
+                self._entries.delete(phone)
+
+    def notify_payload(self, phone: str) -> str:
+        return f"{self.instance_id}:{phone}"
+
+    # ------------------------------------------------------------------
+    # LISTEN (invalidação entre processos)
+    # ------------------------------------------------------------------
+
+    def start_listener(self, engine):
+        """Inicia a thread de LISTEN (chamado no startup da aplicação)"""
+        if not settings.STATE_CACHE_ENABLED or settings.STATE_CACHE_INVALIDATION != "notify":
+            return
+        if self._listener is not None and self._listener.is_alive():
+            return
+
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen_loop, args=(engine,), name="state-cache-listener", daemon=True
+        )
+        self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=_LISTEN_POLL_SECONDS * 2)
+            self._listener = None
+
+    def _set_listening(self, listening: bool):
+        # Nos dois sentidos o cache é esvaziado: notificações podem ter sido perdidas
+        self.invalidate()
+        for _, on_reset in self._subscribers.values():
+            on_reset()
+        self._listening = listening
+
+    def _listen_loop(self, engine):
+        delay = 1.0
+        while not self._stop.is_set():
+            connection = None
+            try:
+                # Conexão dedicada, fora do pool (detach): fica presa ao LISTEN
+                connection = engine.raw_connection()
+                connection.detach()
+                dbapi_connection = connection.dbapi_connection
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    for channel in (NOTIFY_CHANNEL, *self._subscribers):
+                        cursor.execute(f"LISTEN {channel}")
+
+                self._set_listening(True)
+                logger.info("🗂️ Conversation state cache listening for invalidations")
+                delay = 1.0
+
+                while not self._stop.is_set():
+                    if select.select([dbapi_connection], [], [], _LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notification = dbapi_connection.notifies.pop(0)
+                        if notification.channel in self._subscribers:
+                            self._subscribers[notification.channel][0](notification.payload)
+                        else:
+                            self._handle_notification(notification.payload)
+
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning(f"State cache listener disconnected ({e}); cache disabled, retrying in {delay:.0f}s")
+                self._stop.wait(delay)
+                delay = min(delay * 2, _RECONNECT_MAX_SECONDS)
+            finally:
+                self._set_listening(False)
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def _handle_notification(self, payload: str):
+        instance_id, _, phone = payload.partition(":")
+        if instance_id == self.instance_id:
+            return
+        metrics.inc("state_cache_invalidations_total")
+        self.invalidate(phone)
+
+
+state_cache = ConversationStateCache()
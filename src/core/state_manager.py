@@ -1,160 +1,282 @@
+import copy
 import logging
 from typing import Optional, Dict
-from sqlalchemy.orm import Session
+from sqlalchemy import Text, case, cast, delete, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, array, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.core.state_cache import ABSENT, NOTIFY_CHANNEL, StateSnapshot, state_cache
+from src.core.state_ttl import expired_clause, is_expired
 from src.models.conversation_state import ConversationState
 
 logger = logging.getLogger(__name__)
 
-class ConversationStateManager:
-    """Gerencia estados da conversa para multi-turn interactions"""
+def _notify_params(phone: str) -> Optional[Dict]:
+    """Parâmetros do pg_notify que invalida o telefone nos outros workers (None = desligado)"""
+    if not settings.STATE_CACHE_ENABLED or settings.STATE_CACHE_INVALIDATION != "notify":
+        return None
+    return {"channel": NOTIFY_CHANNEL, "payload": state_cache.notify_payload(phone)}
 
-    def get_state(self, phone: str, db: Session) -> Optional[ConversationState]:
+
+def _with_notify(dml, phone: str):
+    """
+    Junta a escrita e o pg_notify em um único comando:
+    WITH written AS (<dml> RETURNING ...) SELECT written.*, pg_notify(...) FROM written
+
+    Só notifica se alguma linha foi escrita.
+    """
+    notify = _notify_params(phone)
+    if not notify:
+        return dml
+    written = dml.cte("written")
+    return select(*written.c, func.pg_notify(notify["channel"], notify["payload"]).label("notified"))
+
+
+def _upsert_statement(phone: str, stage: str, context: Optional[Dict]):
+    """INSERT ... ON CONFLICT (phone) DO UPDATE ... RETURNING em uma ida ao banco"""
+    stmt = insert(ConversationState).values(
+        phone=phone,
+        current_stage=stage,
+        context_data=context,
+        last_message_at=func.now()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ConversationState.phone],
+        set_={
+            "current_stage": stmt.excluded.current_stage,
+            "context_data": stmt.excluded.context_data,
+            "last_message_at": func.now(),
+            # Estado expirado (ainda não varrido) é uma conversa nova
+            "created_at": case((expired_clause(), func.now()), else_=ConversationState.created_at)
+        }
+    ).returning(ConversationState.created_at, ConversationState.last_message_at)
+    return _with_notify(stmt, phone)
+
+
+def _patch_statement(phone: str, new_data: Dict, append_text: Optional[Dict[str, str]]):
+    """
+    UPDATE parcial do contexto: `context_data || :new_data` e, para cada chave
+    de append_text, jsonb_set com o texto concatenado no próprio banco (o
+    documento inteiro não trafega).
+    """
+    stored = ConversationState.context_data
+    context = func.coalesce(stored, cast("{}", JSONB))
+
+    if new_data:
+        context = context.op("||", return_type=JSONB)(literal(new_data, JSONB))
+
+    for key, suffix in (append_text or {}).items():
+        appended = func.concat(func.coalesce(stored[key].astext, ""), cast(suffix, Text))
+        context = func.jsonb_set(context, cast(array([key]), ARRAY(Text)), func.to_jsonb(appended), type_=JSONB)
+
+    stmt = (
+        update(ConversationState)
+        .where(ConversationState.phone == phone, ~expired_clause())
+        .values(context_data=context, last_message_at=func.now())
+        .returning(
+            ConversationState.current_stage,
+            ConversationState.context_data,
+            ConversationState.created_at,
+            ConversationState.last_message_at
+        )
+    )
+    return _with_notify(stmt, phone)
+
+
+def _delete_statement(phone: str):
+    stmt = delete(ConversationState).where(ConversationState.phone == phone).returning(ConversationState.phone)
+    return _with_notify(stmt, phone)
+
+
+def _returned_snapshot(row) -> StateSnapshot:
+    """Snapshot a partir do RETURNING do UPDATE (o contexto já mesclado pelo banco)"""
+    return StateSnapshot(
+        current_stage=row.current_stage,
+        context_data=row.context_data,
+        last_message_at=row.last_message_at,
+        created_at=row.created_at
+    )
+
+
+def _cached_state(phone: str):
+    """
+    Returns:
+        (hit, estado); estado é um ConversationState avulso ou None
+    """
+    hit, entry = state_cache.lookup(phone)
+    if not hit:
+        return False, None
+    if entry is ABSENT:
+        logger.debug(f"No state found for {phone} (cache)")
+        return True, None
+    if _expired(phone, entry.current_stage, entry.last_message_at):
+        return True, None
+    logger.debug(f"State found for {phone} (cache): {entry.current_stage}")
+    return True, entry.to_state(phone)
+
+
+def _expired(phone: str, stage: str, last_message_at) -> bool:
+    """Estado expirado (ainda não removido pelo sweeper) é lido como inexistente"""
+    if not is_expired(stage, last_message_at):
+        return False
+    logger.info(f"State for {phone} expired ({stage})")
+    metrics.inc("conversation_state_expired_reads_total")
+    return True
+
+
+class AsyncConversationStateManager:
+    """
+    Gerencia estados da conversa para multi-turn interactions (AsyncSession + asyncpg).
+
+    Leituras passam pelo state_cache (write-through): em um hit não há ida ao
+    banco. Os estados retornados são objetos avulsos (fora da sessão); para
+    mudar o estado use set_state/update_context/clear_state.
+    """
+
+    async def get_state(self, phone: str, db: AsyncSession) -> Optional[ConversationState]:
         """
         Busca o estado atual da conversa para um telefone.
-        
+
         Args:
             phone: Número de telefone
-            db: Sessão do banco de dados
-            
+            db: Sessão assíncrona do banco de dados
+
         Returns:
             ConversationState ou None se não existir
         """
         try:
-            # Forçar busca no banco (não usar cache)
-            db.expire_all()
-            
-            state = db.query(ConversationState).filter(
-                ConversationState.phone == phone
-            ).first()
-            
-            if state:
-                # Forçar reload dos dados do banco
-                db.refresh(state)
+            hit, state = _cached_state(phone)
+            if hit:
+                return state
+
+            generation = state_cache.begin_load()
+
+            # populate_existing: sempre os valores do banco, nunca os do identity map
+            result = await db.execute(
+                select(ConversationState)
+                .where(ConversationState.phone == phone)
+                .execution_options(populate_existing=True)
+            )
+            state = result.scalars().first()
+
+            state_cache.store_loaded(phone, state, generation)
+
+            if state and not _expired(phone, state.current_stage, state.last_message_at):
                 logger.info(f"State found for {phone}: {state.current_stage}")
                 logger.debug(f"State context_data: {state.context_data}")
-            else:
-                logger.info(f"No state found for {phone}")
-                
-            return state
-            
+                return StateSnapshot.from_row(state).to_state(phone)
+
+            logger.info(f"No state found for {phone}")
+            return None
+
         except Exception as e:
             logger.error(f"Error getting conversation state: {e}")
             return None
 
-    def set_state(
-        self, 
-        phone: str, 
-        stage: str, 
-        context: Dict, 
-        db: Session
+    async def set_state(
+        self,
+        phone: str,
+        stage: str,
+        context: Dict,
+        db: AsyncSession
     ) -> ConversationState:
         """
-        Define ou atualiza o estado da conversa (upsert).
-        
+        Define ou atualiza o estado da conversa (upsert em um único comando).
+
         Args:
             phone: Número de telefone
             stage: Novo estágio da conversa
             context: Dados de contexto (JSONB)
-            db: Sessão do banco de dados
-            
+            db: Sessão assíncrona do banco de dados
+
         Returns:
             ConversationState criado ou atualizado
         """
         try:
-            state = db.query(ConversationState).filter(
-                ConversationState.phone == phone
-            ).first()
-            
-            if state:
-                # Update existing state
-                state.current_stage = stage
-                state.context_data = context
-                state.last_message_at = func.now()
-                logger.info(f"Updated state for {phone}: {stage}")
-            else:
-                # Create new state
-                state = ConversationState(
-                    phone=phone,
-                    current_stage=stage,
-                    context_data=context
-                )
-                db.add(state)
-                logger.info(f"Created new state for {phone}: {stage}")
-            
-            db.commit()
-            db.refresh(state)
-            return state
-            
+            row = (await db.execute(_upsert_statement(phone, stage, context))).first()
+            await db.commit()
+
+            snapshot = StateSnapshot(
+                current_stage=stage,
+                context_data=copy.deepcopy(context),
+                last_message_at=row.last_message_at,
+                created_at=row.created_at
+            )
+            state_cache.store_written(phone, snapshot)
+            logger.info(f"Saved state for {phone}: {stage}")
+            return snapshot.to_state(phone)
+
         except Exception as e:
             logger.error(f"Error setting conversation state: {e}")
-            db.rollback()
+            await db.rollback()
+            state_cache.invalidate(phone)
             raise
 
-    def clear_state(self, phone: str, db: Session) -> bool:
+    async def clear_state(self, phone: str, db: AsyncSession) -> bool:
         """
         Remove o estado da conversa (conversa finalizada).
-        
-        Args:
-            phone: Número de telefone
-            db: Sessão do banco de dados
-            
+
         Returns:
             True se removido com sucesso, False caso contrário
         """
         try:
-            deleted_count = db.query(ConversationState).filter(
-                ConversationState.phone == phone
-            ).delete()
-            
-            db.commit()
-            
-            if deleted_count > 0:
+            deleted = (await db.execute(_delete_statement(phone))).first() is not None
+            await db.commit()
+            state_cache.store_written(phone, None)
+
+            if deleted:
                 logger.info(f"Cleared state for {phone}")
                 return True
             else:
                 logger.info(f"No state to clear for {phone}")
                 return False
-                
+
         except Exception as e:
             logger.error(f"Error clearing conversation state: {e}")
-            db.rollback()
+            await db.rollback()
+            state_cache.invalidate(phone)
             return False
 
-    def update_context(self, phone: str, new_data: Dict, db: Session) -> bool:
+    async def update_context(
+        self,
+        phone: str,
+        new_data: Dict,
+        db: AsyncSession,
+        append_text: Optional[Dict[str, str]] = None
+    ) -> bool:
         """
         Atualiza o contexto sem mudar o estágio.
-        
+
+        Atualização parcial no banco (`context_data || new_data`): envie só as
+        chaves que mudaram, não o contexto inteiro.
+
         Args:
             phone: Número de telefone
-            new_data: Novos dados para adicionar ao contexto
-            db: Sessão do banco de dados
-            
+            new_data: Chaves novas/alteradas do contexto
+            db: Sessão assíncrona do banco de dados
+            append_text: {chave: texto} concatenado ao valor texto já gravado
+                na chave (ex: {"full_text": "\\n" + mensagem})
+
         Returns:
             True se atualizado com sucesso, False caso contrário
         """
         try:
-            state = db.query(ConversationState).filter(
-                ConversationState.phone == phone
-            ).first()
-            
-            if not state:
+            row = (await db.execute(_patch_statement(phone, new_data, append_text))).first()
+            await db.commit()
+
+            if row is None:
                 logger.warning(f"No state found to update context for {phone}")
+                state_cache.store_written(phone, None)
                 return False
-            
-            # Merge new data with existing context
-            if state.context_data:
-                state.context_data.update(new_data)
-            else:
-                state.context_data = new_data
-            
-            state.last_message_at = func.now()
-            
-            db.commit()
+
+            state_cache.store_written(phone, _returned_snapshot(row))
             logger.info(f"Updated context for {phone}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Error updating context: {e}")
-            db.rollback()
+            await db.rollback()
+            state_cache.invalidate(phone)
             return False
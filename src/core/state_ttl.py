@@ -0,0 +1,96 @@
+"""
+Expiração do estado da conversa por estágio
+
+Conversas abandonadas expiram STATE_TTL_SECONDS depois da última mensagem
+(last_message_at, indexado); STATE_TTL_BY_STAGE sobrescreve o prazo de
+estágios específicos. TTL 0 = nunca expira.
+
+Estados expirados são lidos como inexistentes no caminho quente (ver
+state_manager) e removidos em lotes pelo StateSweeper.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, case, not_, null
+from sqlalchemy.sql import func
+from src.core.config import settings
+from src.models.conversation_state import ConversationState
+
+
+def stage_ttls() -> Dict[str, int]:
+    """Estágios com TTL próprio (segundos)"""
+    return dict(settings.STATE_TTL_BY_STAGE)
+
+
+def ttl_for(stage: Optional[str]) -> int:
+    """TTL (segundos) de um estágio; 0 = nunca expira"""
+    return stage_ttls().get(stage, settings.STATE_TTL_SECONDS)
+
+
+def is_expired(stage: Optional[str], last_message_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    """
+    Args:
+        stage: current_stage do estado
+        last_message_at: última mensagem (None = ainda não gravado: não expira)
+        now: referência (padrão: agora, UTC)
+    """
+    ttl = ttl_for(stage)
+    if ttl <= 0 or last_message_at is None:
+        return False
+    now = now or datetime.now(timezone.utc)
+    return last_message_at < now - timedelta(seconds=ttl)
+
+
+def _ttl_or_null(seconds: int):
+    # TTL 0 vira NULL: a comparação dá NULL e o estado não expira
+    return seconds if seconds > 0 else null()
+
+
+def expired_clause():
+    """
+    Expressão SQL equivalente a is_expired para a linha atual (TTL por
+    estágio via CASE). Usada em consultas por telefone; a varredura usa
+    sweep_filters, que aproveitam o índice de last_message_at.
+    """
+    configured = stage_ttls()
+    default = _ttl_or_null(settings.STATE_TTL_SECONDS)
+    ttl = default
+    if configured:
+        ttl = case(
+            {stage: _ttl_or_null(seconds) for stage, seconds in configured.items()},
+            value=ConversationState.current_stage,
+            else_=default
+        )
+
+    return func.coalesce(
+        ConversationState.last_message_at < func.now() - func.make_interval(0, 0, 0, 0, 0, 0, ttl),
+        False
+    )
+
+
+def sweep_filters() -> List[Tuple[str, object]]:
+    """
+    Um filtro por grupo de TTL: cada estágio configurado e o "resto" (TTL
+    padrão). Cada filtro compara last_message_at com uma constante, então o
+    Postgres usa o índice.
+
+    Returns:
+        Lista de (rótulo, condição); grupos com TTL 0 ficam de fora
+    """
+    filters = []
+    configured = stage_ttls()
+
+    for stage, seconds in configured.items():
+        if seconds > 0:
+            filters.append((stage, and_(
+                ConversationState.current_stage == stage,
+                ConversationState.last_message_at < func.now() - timedelta(seconds=seconds)
+            )))
+
+    if settings.STATE_TTL_SECONDS > 0:
+        default = ConversationState.last_message_at < func.now() - timedelta(seconds=settings.STATE_TTL_SECONDS)
+        if configured:
+            default = and_(not_(ConversationState.current_stage.in_(list(configured))), default)
+        filters.append(("default", default))
+
+    return filters
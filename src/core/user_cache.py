@@ -0,0 +1,213 @@
+"""
+Busca de usuário por telefone, com cache em processo
+
+Toda mensagem do webhook procura o usuário pelo telefone. find_user_async
+faz uma única consulta indexada que casa a chave canônica
+(users.phone_e164, ver src/core/phone.py) com as duas formas do nono dígito
+- e, enquanto o backfill não terminou, também a coluna phone legada.
+
+Usuários encontrados ficam num LRU + TTL por chave canônica. Em um hit o
+usuário é anexado à sessão com merge(load=False), sem ida ao banco;
+alterações nele são gravadas normalmente (só as colunas modificadas).
+Buscas sem resultado não são guardadas (o usuário novo é criado logo depois).
+
+Invalidação: qualquer flush que crie, altere ou remova um User descarta a
+chave no commit e faz pg_notify('user_cache', ...) na mesma transação; os
+outros workers recebem pela conexão de LISTEN do state_cache. UPDATE/DELETE
+em lote executados pela sessão (session.execute(update(User)...),
+query(User).delete()) não dizem quais telefones mudaram: esvaziam o cache
+inteiro (payload '*'). Escritas em users fora de uma Session (connection.execute
+ou SQL externo) não são vistas - passe sempre pela sessão. Sem o LISTEN ativo
+o cache fica desligado (como o state_cache).
+"""
+
+import copy
+import logging
+from typing import Optional, Set
+from sqlalchemy import case, event, inspect, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.core.phone import canonical_phone, national_number, phone_variants
+from src.core.state_cache import state_cache
+from src.models.user import User
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "user_cache"
+_NOTIFY_SQL = text("SELECT pg_notify(:channel, :payload)")
+_SESSION_KEYS = "user_cache_keys"
+_ALL_KEYS = "*"
+
+
+def _lookup_query(phone: str):
+    """
+    Uma consulta para todas as formas do telefone; a linha com a chave
+    canônica exata vem primeiro.
+    """
+    key = canonical_phone(phone)
+    conditions = [User.phone_e164.in_(phone_variants(phone))]
+
+    national = national_number(phone)
+    if national:
+        # Linhas ainda não preenchidas pelo backfill (phone_e164 NULL)
+        legacy = {national, *(v[3:] for v in phone_variants(phone) if v.startswith("+55"))}
+        conditions.append(User.phone.in_(sorted(legacy)))
+
+    return (
+        select(User)
+        .where(or_(*conditions))
+        .order_by(case((User.phone_e164 == key, 0), else_=1), User.created_at)
+        .limit(1)
+    )
+
+
+def _detached_copy(user: User) -> User:
+    """Cópia limpa e fora de sessão (JSONB/arrays copiados: mutações não vazam para o cache)"""
+    detached = User()
+    for attr in inspect(User).column_attrs:
+        set_committed_value(detached, attr.key, copy.deepcopy(getattr(user, attr.key)))
+    make_transient_to_detached(detached)
+    return detached
+
+
+class UserCache:
+    """LRU + TTL de usuários por chave canônica do telefone"""
+
+    def __init__(self):
+        self._entries = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+        self._generation = 0
+
+        metrics.register_gauge("user_cache_entries", lambda: len(self._entries))
+        state_cache.subscribe(NOTIFY_CHANNEL, self._handle_notification, self.clear)
+
+    @property
+    def active(self) -> bool:
+        if not settings.USER_CACHE_ENABLED:
+            return False
+        return settings.STATE_CACHE_INVALIDATION == "none" or state_cache.listening
+
+    def get(self, key: str) -> Optional[User]:
+        if not self.active:
+            return None
+        user = self._entries.get(key)
+        metrics.inc("user_cache_requests_total", result="hit" if user is not None else "miss")
+        return user
+
+    def begin_load(self) -> int:
+        return self._generation
+
+    def store_loaded(self, key: str, user: User, generation: int):
+        """Guarda o resultado de uma consulta, se nenhuma invalidação chegou durante ela"""
+        if not self.active or generation != self._generation:
+            return
+        self._entries.set(key, _detached_copy(user))
+
+    def invalidate(self, key: str):
+        self._generation += 1
+        self._entries.delete(key)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def _handle_notification(self, payload: str):
+        instance_id, _, key = payload.partition(":")
+        if instance_id == state_cache.instance_id:
+            return  # já invalidado no after_commit
+        metrics.inc("user_cache_invalidations_total")
+        if key == _ALL_KEYS:
+            self.clear()
+        else:
+            self.invalidate(key)
+
+
+user_cache = UserCache()
+
+
+async def find_user_async(phone: str, db: AsyncSession) -> Optional[User]:
+    """
+    Busca o usuário de um telefone em qualquer formato (JID, com/sem DDI ou nono dígito).
+
+    Args:
+        phone: Telefone como recebido
+        db: Sessão assíncrona do banco de dados (o usuário retornado pertence a ela)
+
+    Returns:
+        User ou None
+    """
+    key = canonical_phone(phone)
+    if key is None:
+        return None
+
+    cached = user_cache.get(key)
+    if cached is not None:
+        return await db.merge(_detached_copy(cached), load=False)
+
+    generation = user_cache.begin_load()
+    user = (await db.execute(_lookup_query(phone))).scalars().first()
+    if user is not None:
+        user_cache.store_loaded(key, user, generation)
+    return user
+
+
+# ----------------------------------------------------------------------
+# Invalidação: vale para toda sessão (síncrona ou AsyncSession)
+# ----------------------------------------------------------------------
+
+def _changed_keys(session: Session) -> Set[str]:
+    keys: Set[str] = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, User):
+            continue
+        keys.update(k for k in (obj.phone_e164, canonical_phone(obj.phone)) if k)
+        # Telefone alterado: a chave antiga também sai do cache
+        for old_phone in inspect(obj).attrs.phone.history.deleted or ():
+            old_key = canonical_phone(old_phone)
+            if old_key:
+                keys.add(old_key)
+    return keys
+
+
+def _record_changes(session: Session, keys: Set[str]):
+    """Guarda as chaves para o after_commit e avisa os outros workers na mesma transação"""
+    session.info.setdefault(_SESSION_KEYS, set()).update(keys)
+
+    if settings.USER_CACHE_ENABLED and settings.STATE_CACHE_INVALIDATION == "notify":
+        connection = session.connection()
+        for key in keys:
+            connection.execute(_NOTIFY_SQL, {"channel": NOTIFY_CHANNEL, "payload": f"{state_cache.instance_id}:{key}"})
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_user_changes(session: Session, flush_context, instances):
+    keys = _changed_keys(session)
+    if keys:
+        _record_changes(session, keys)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_user_writes(orm_execute_state):
+    # UPDATE/DELETE em lote não passam pelo flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if any(mapper.class_ is User for mapper in orm_execute_state.all_mappers):
+        _record_changes(orm_execute_state.session, {_ALL_KEYS})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session):
+    keys = session.info.pop(_SESSION_KEYS, set())
+    if _ALL_KEYS in keys:
+        user_cache.clear()
+        return
+    for key in keys:
+        user_cache.invalidate(key)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_user_changes(session: Session, previous_transaction):
+    session.info.pop(_SESSION_KEYS, None)
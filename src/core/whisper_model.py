@@ -2,35 +2,103 @@ from faster_whisper import WhisperModel
 from src.core.config import settings
 import logging
 import os
+import threading
+import time
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+def default_compute_type() -> str:
+    device = os.getenv("WHISPER_DEVICE", "cpu")
+    return "int8" if device == "cpu" else "float16"
+
+
+def default_model_size() -> str:
+    return os.getenv("WHISPER_MODEL", "base")
+
+
 class WhisperModelSingleton:
+    """
+    Modelos carregados no processo, um por (tamanho, compute_type).
+
+    O modelo padrão é WHISPER_MODEL; os níveis de qualidade adaptativos
+    (transcription_policy.py) podem pedir um modelo menor, carregado na
+    primeira vez que for usado.
+    """
     _instance = None
     _model = None
+    _models = {}
+    _lock = threading.Lock()
+    load_seconds = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def get_model(self):
-        if self._model is None:
-            logger.info("Loading Whisper model... This might take a while.")
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def get_model(self, model_size: str = None, compute_type: str = None):
+        model_size = model_size or default_model_size()
+        compute_type = compute_type or default_compute_type()
+        key = (model_size, compute_type)
+
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            logger.info(f"Loading Whisper model {model_size} ({compute_type})... This might take a while.")
+            start = time.perf_counter()
             try:
-                model_size = os.getenv("WHISPER_MODEL", "base")
                 device = os.getenv("WHISPER_DEVICE", "cpu")
-                compute_type = "int8" if device == "cpu" else "float16"
-                
-                self._model = WhisperModel(
+
+                # Modo thread: um modelo atende todos os workers; modo process: um modelo por processo
+                num_workers = settings.WHISPER_WORKERS if settings.WHISPER_WORKER_MODE == "thread" else 1
+                cpu_threads = settings.WHISPER_CPU_THREADS or max(1, (os.cpu_count() or 1) // max(1, settings.WHISPER_WORKERS))
+
+                model = WhisperModel(
                     model_size,
                     device=device,
-                    compute_type=compute_type
+                    compute_type=compute_type,
+                    cpu_threads=cpu_threads,
+                    num_workers=num_workers
+                )
+                load_seconds = time.perf_counter() - start
+                self._models[key] = model
+                if key == (default_model_size(), default_compute_type()):
+                    self.load_seconds = load_seconds
+                    self._model = model
+                logger.info(
+                    f"Whisper model loaded successfully in {load_seconds:.1f}s "
+                    f"(cpu_threads={cpu_threads}, num_workers={num_workers})"
                 )
-                logger.info("Whisper model loaded successfully")
             except Exception as e:
                 logger.error(f"Failed to load Whisper model: {e}")
                 raise
-        return self._model
+        return model
+
+    def warmup(self) -> float:
+        """
+        Roda uma transcrição curta (1 s de áudio sintético) para inicializar
+        o CTranslate2 antes da primeira mensagem real.
+
+        Returns:
+            Duração do aquecimento em segundos
+        """
+        model = self.get_model()
+        rng = np.random.default_rng(0)
+        clip = (0.01 * rng.standard_normal(16000)).astype(np.float32)
+
+        start = time.perf_counter()
+        segments, _ = model.transcribe(clip, language="pt", beam_size=1, vad_filter=False)
+        list(segments)  # o gerador só decodifica quando consumido
+        return time.perf_counter() - start
 
 whisper_singleton = WhisperModelSingleton()
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, Text, Integer, DateTime
+from sqlalchemy.sql import func
+from src.core.database import Base
+
+class GeminiResponseCacheEntry(Base):
+    """
+    Resposta do Gemini já gerada, endereçada pelo SHA-256 do prompt normalizado.
+
+    Prompts idênticos (mensagens fixas do Writer, "oi"/"bom dia" no Router,
+    o mesmo rascunho no formalize-ai) reaproveitam o texto sem nova chamada paga.
+    """
+    __tablename__ = "gemini_response_cache"
+
+    prompt_sha256 = Column(String(64), primary_key=True)
+    model = Column(String(100), primary_key=True)  # modelo que gerou a resposta
+    call_site = Column(String(50), nullable=False)  # agente/rota que fez a chamada
+    response = Column(Text, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<GeminiResponseCacheEntry(sha256={self.prompt_sha256[:12]}, call_site={self.call_site}, hits={self.hit_count})>"
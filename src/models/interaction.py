@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Float, DateTime, JSON, ForeignKey
+from sqlalchemy import Column, String, Text, Float, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -6,19 +6,36 @@ from src.core.database import Base
 import uuid
 
 class Interaction(Base):
+    """
+    Log de mensagens do chatbot, particionado por mês em created_at.
+
+    Partições são criadas e removidas pelo interaction_partitions
+    (retenção); dias antigos ficam resumidos em interaction_daily_rollups.
+    A chave primária inclui created_at (exigência do particionamento).
+    """
     __tablename__ = "interactions"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    phone = Column(String(50), nullable=False, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=True, index=True)
-    demand_id = Column(UUID(as_uuid=True), ForeignKey('demands.id'), nullable=True, index=True)
-    message_type = Column(String(20), nullable=False, index=True)  # 'text', 'audio', 'image'
+    phone = Column(String(50), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=True)
+    demand_id = Column(UUID(as_uuid=True), ForeignKey('demands.id'), nullable=True)
+    message_type = Column(String(20), nullable=False)  # 'text', 'audio', 'image'
     original_message = Column(Text, nullable=True)
     transcription = Column(Text, nullable=True)
     audio_duration_seconds = Column(Float, nullable=True)
-    classification = Column(String(50), nullable=True, index=True)  # 'ONBOARDING', 'DEMANDA', 'DUVIDA', 'OUTRO'
+    transcription_tier = Column(String(20), nullable=True)  # 'fast', 'greedy', 'full' (transcription_policy)
+    classification = Column(String(50), nullable=True)  # 'ONBOARDING', 'DEMANDA', 'DUVIDA', 'OUTRO'
     extracted_data = Column(JSONB, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_interactions_phone', 'phone'),
+        Index('idx_interactions_user_id', 'user_id'),
+        # BRIN: quase nenhum custo por INSERT em uma tabela só de acréscimos
+        Index('idx_interactions_created_at', 'created_at', postgresql_using='brin'),
+        Index('idx_interactions_demand_id', 'demand_id', postgresql_where=demand_id.isnot(None)),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
 
     # Relationships
     user = relationship("User", back_populates="interactions")
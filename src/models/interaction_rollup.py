@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, Computed
+from sqlalchemy.sql import func
+from src.core.database import Base
+
+class InteractionDailyRollup(Base):
+    """
+    Resumo diário (UTC) de interactions por classificação e tipo de mensagem.
+
+    Preenchido pelo interaction_partitions para todo dia completo; continua
+    valendo depois que a partição bruta do mês sai da retenção.
+    """
+    __tablename__ = "interaction_daily_rollups"
+
+    day = Column(Date, primary_key=True)
+    classification = Column(String(50), primary_key=True)  # 'NONE' quando a mensagem não foi classificada
+    message_type = Column(String(20), primary_key=True)
+    interactions = Column(Integer, nullable=False)
+    distinct_phones = Column(Integer, nullable=False)
+    audio_count = Column(Integer, nullable=False, default=0)
+    audio_seconds_total = Column(Float, nullable=False, default=0)
+    avg_audio_duration_seconds = Column(Float, Computed("audio_seconds_total / NULLIF(audio_count, 0)", persisted=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<InteractionDailyRollup(day={self.day}, classification={self.classification}, type={self.message_type})>"
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Text, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from src.core.database import Base
+
+class ProcessedMessage(Base):
+    """
+    Registro de idempotência do /webhook: uma linha por message_id do WhatsApp.
+
+    A chave primária garante que a mesma mensagem (reenviada pelo bot após
+    restart ou retry do axios) seja processada uma única vez; as cópias
+    recebem a resposta guardada aqui.
+    """
+    __tablename__ = "processed_messages"
+
+    message_id = Column(String(128), primary_key=True)
+    phone = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default='processing')  # processing, done
+    response = Column(Text, nullable=True)
+    job_id = Column(UUID(as_uuid=True), nullable=True)  # job da fila (modo WEBHOOK_QUEUE_ENABLED)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ProcessedMessage(message_id={self.message_id}, status={self.status})>"
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, String, Text, Float, Integer, DateTime
+from sqlalchemy.sql import func
+from src.core.database import Base
+
+class TranscriptionCacheEntry(Base):
+    """
+    Transcrição já calculada, endereçada pelo SHA-256 dos bytes do áudio.
+
+    Notas de voz encaminhadas por vários moradores (ou reenviadas) chegam
+    com os mesmos bytes e reaproveitam o texto sem passar pelo Whisper.
+    """
+    __tablename__ = "transcription_cache"
+
+    audio_sha256 = Column(String(64), primary_key=True)
+    model = Column(String(50), primary_key=True)  # WHISPER_MODEL usado na transcrição
+    text = Column(Text, nullable=False)
+    audio_seconds = Column(Float, nullable=False)
+    file_seconds = Column(Float, nullable=False)
+    tier = Column(String(20), nullable=True)  # nível de qualidade que gerou o texto
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<TranscriptionCacheEntry(sha256={self.audio_sha256[:12]}, model={self.model}, hits={self.hit_count})>"
@@ -1,8 +1,9 @@
 from sqlalchemy import Column, String, DateTime, JSON, Boolean, Text, ARRAY
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from src.core.database import Base
+from src.core.phone import canonical_phone
 import uuid
 
 class User(Base):
@@ -10,6 +11,7 @@ class User(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     phone = Column(String(50), unique=True, nullable=False, index=True)
+    phone_e164 = Column(String(20), nullable=True, index=True)  # chave canônica (src/core/phone.py), mantida por set_phone
     
     # Authentication fields
     name = Column(String(255), nullable=True)
@@ -43,5 +45,10 @@ class User(Base):
     demands = relationship("Demand", back_populates="creator")
     supported_demands = relationship("DemandSupporter", back_populates="user")
 
+    @validates('phone')
+    def set_phone(self, key, phone):
+        self.phone_e164 = canonical_phone(phone)
+        return phone
+
     def __repr__(self):
         return f"<User(id={self.id}, phone={self.phone}, email={self.email}, status={self.status})>"
@@ -0,0 +1,38 @@
+from sqlalchemy import Column, String, Text, Float, Integer, DateTime, LargeBinary, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+from src.core.database import Base
+import uuid
+
+class WebhookJob(Base):
+    """
+    Mensagem recebida pelo /webhook aguardando processamento assíncrono.
+
+    Os workers reivindicam jobs com SELECT ... FOR UPDATE SKIP LOCKED,
+    então vários processos/nós podem consumir a mesma fila com segurança.
+    """
+    __tablename__ = "webhook_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    phone = Column(String(50), nullable=False, index=True)
+    message_type = Column(String(20), nullable=False)  # 'text', 'audio'
+    text = Column(Text, nullable=True)
+    audio_data = Column(LargeBinary, nullable=True)  # áudio bruto (transcrito pelo worker)
+    status = Column(String(20), nullable=False, default='pending')  # pending, processing, done, failed, merged
+    message_id = Column(String(128), nullable=True)  # id da mensagem no WhatsApp (dedup)
+    merged_into = Column(UUID(as_uuid=True), nullable=True, index=True)  # job que absorveu esta mensagem (debounce)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    response = Column(Text, nullable=True)  # resposta gerada (reenviada sem reprocessar em caso de retry)
+    audio_duration_seconds = Column(Float, nullable=True)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_webhook_jobs_claim', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return f"<WebhookJob(id={self.id}, phone={self.phone}, status={self.status}, attempts={self.attempts})>"
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
-from src.core.database import get_db
+from src.core.database import get_async_db
+from src.core.user_cache import find_user_async
 from src.models.user import User
 from src.services.auth_service import AuthService
 from src.services.whatsapp_service import WhatsAppService
@@ -47,13 +49,13 @@ class MessageResponse(BaseModel):
 @router.post("/login", response_model=AuthResponse)
 async def login(
     request: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login with email and password
     """
     # Find user by email
-    user = db.query(User).filter(User.email == request.email).first()
+    user = (await db.scalars(select(User).where(User.email == request.email))).first()
     
     if not user or not user.password_hash:
         raise HTTPException(
@@ -91,7 +93,7 @@ async def login(
 @router.post("/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     request: RegisterRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Register a new user and send verification code via WhatsApp
@@ -104,7 +106,7 @@ async def register(
         )
     
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = (await db.scalars(select(User).where(User.email == request.email))).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -119,7 +121,7 @@ async def register(
         )
     
     # Check if CPF already exists
-    existing_cpf = db.query(User).filter(User.cpf == request.cpf).first()
+    existing_cpf = (await db.scalars(select(User).where(User.cpf == request.cpf))).first()
     if existing_cpf:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -141,19 +143,8 @@ async def register(
             detail=error_msg
         )
     
-    # Check if phone already exists
-    # We need to check both formats (with and without 9) to avoid duplicates
-    
-    phones_to_check = [request.phone]
-    
-    if len(request.phone) == 11: # Has 9 digit
-        # Check without 9
-        phones_to_check.append(f"{request.phone[:2]}{request.phone[3:]}")
-    elif len(request.phone) == 10: # No 9 digit
-        # Check with 9
-        phones_to_check.append(f"{request.phone[:2]}9{request.phone[2:]}")
-        
-    existing_phone = db.query(User).filter(User.phone.in_(phones_to_check)).first()
+    # Check if phone already exists (both formats, with and without 9, in one query)
+    existing_phone = await find_user_async(request.phone, db)
     
     if existing_phone:
         # If phone exists and has a password, it means it's already a full account
@@ -211,11 +202,11 @@ async def register(
         )
         db.add(user)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # Generate and send verification code
-    code = AuthService.create_verification_code(request.email, db)
+    code = await AuthService.create_verification_code_async(request.email, db)
     
     # Send code via WhatsApp
     whatsapp_result = await WhatsAppService.send_verification_code(request.phone, code)
@@ -239,20 +230,20 @@ async def register(
 @router.post("/verify", response_model=AuthResponse)
 async def verify_code(
     request: VerifyCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Verify the code sent via WhatsApp
     """
     # Verify the code
-    if not AuthService.verify_code(request.email, request.code, db):
+    if not await AuthService.verify_code_async(request.email, request.code, db):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Código inválido ou expirado"
         )
     
     # Find user and mark as verified
-    user = db.query(User).filter(User.email == request.email).first()
+    user = (await db.scalars(select(User).where(User.email == request.email))).first()
     
     if not user:
         raise HTTPException(
@@ -261,8 +252,8 @@ async def verify_code(
         )
     
     user.is_verified = True
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # Generate JWT token
     token = AuthService.create_jwt_token(str(user.id), user.email)
@@ -280,13 +271,13 @@ async def verify_code(
 @router.post("/resend-code", response_model=MessageResponse)
 async def resend_code(
     request: ResendCodeRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Resend verification code via WhatsApp
     """
     # Find user
-    user = db.query(User).filter(User.email == request.email).first()
+    user = (await db.scalars(select(User).where(User.email == request.email))).first()
     
     if not user:
         raise HTTPException(
@@ -301,7 +292,7 @@ async def resend_code(
         )
     
     # Generate and send new code
-    code = AuthService.create_verification_code(request.email, db)
+    code = await AuthService.create_verification_code_async(request.email, db)
     
     # Send code via WhatsApp
     whatsapp_result = await WhatsAppService.send_verification_code(user.phone, code)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from src.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from src.core.database import get_async_db
 from src.models.demand import Demand
 from src.models.demand_supporter import DemandSupporter
 from src.models.user import User
@@ -10,11 +10,13 @@ from typing import List, Dict
 router = APIRouter(prefix="/api/community", tags=["Community"])
 
 @router.get("/stats")
-async def get_community_stats(db: Session = Depends(get_db)):
-    demands_count = db.query(Demand).filter(Demand.status == 'active').count()
-    contributions_count = db.query(DemandSupporter).count()
+async def get_community_stats(db: AsyncSession = Depends(get_async_db)):
+    demands_count = await db.scalar(
+        select(func.count()).select_from(Demand).where(Demand.status == 'active')
+    )
+    contributions_count = await db.scalar(select(func.count()).select_from(DemandSupporter))
     # Engaged users: simple count of users for now
-    engaged_count = db.query(User).count()
+    engaged_count = await db.scalar(select(func.count()).select_from(User))
     
     return {
         "demands": demands_count,
@@ -23,9 +25,11 @@ async def get_community_stats(db: Session = Depends(get_db)):
     }
 
 @router.get("/categories")
-async def get_category_stats(db: Session = Depends(get_db)):
+async def get_category_stats(db: AsyncSession = Depends(get_async_db)):
     # Group demands by theme and count
-    stats = db.query(Demand.theme, func.count(Demand.id)).group_by(Demand.theme).all()
+    stats = (await db.execute(
+        select(Demand.theme, func.count(Demand.id)).group_by(Demand.theme)
+    )).all()
     
     result = []
     for theme, count in stats:
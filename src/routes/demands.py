@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, select
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from src.core.database import get_db
+from src.core.database import get_async_db
 from src.models.demand import Demand
 from src.models.demand_supporter import DemandSupporter
 from src.models.user import User
 from src.routes.user import get_current_user, get_current_user_optional
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.config import settings
 from src.core.gemini import gemini_client
+from src.services.demand_service import DemandService
 import logging
 import uuid
 
@@ -16,6 +19,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/demands", tags=["Demands"])
 
+demand_service = DemandService()
+
 # Pydantic Models
 class DemandItem(BaseModel):
     id: str
@@ -118,7 +123,7 @@ async def formalize_demand_ai(
     """
     
     try:
-        content = await gemini_client.generate_content(prompt)
+        content = await gemini_client.generate_content(prompt, call_site="formalize")
         parsed = gemini_client.parse_json(content)
         
         return FormalizeResponse(
@@ -127,6 +132,12 @@ async def formalize_demand_ai(
             location=parsed.get("location", request.location or ""),
             category=parsed.get("category", request.category or "")
         )
+    except CircuitOpenError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="IA temporariamente indisponível, tente novamente em instantes",
+            headers={"Retry-After": str(int(settings.GEMINI_BREAKER_OPEN_SECONDS))}
+        )
     except Exception as e:
         logger.error(f"Error in formalize-ai: {e}")
         raise HTTPException(
@@ -139,7 +150,7 @@ async def formalize_demand_ai(
 async def create_demand(
     request: CreateDemandRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new demand
@@ -159,8 +170,8 @@ async def create_demand(
     )
     
     db.add(new_demand)
-    db.commit()
-    db.refresh(new_demand)
+    await db.commit()
+    await db.refresh(new_demand)
     
     return DemandItem(
         id=str(new_demand.id),
@@ -177,12 +188,12 @@ async def create_demand(
 async def formalize_demand(
     demand_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Formalize an existing demand
     """
-    demand = db.query(Demand).filter(Demand.id == demand_id).first()
+    demand = await db.get(Demand, demand_id)
     
     if not demand:
         raise HTTPException(
@@ -193,8 +204,8 @@ async def formalize_demand(
     # Update status to indicate formalization
     demand.status = "formalized"
     
-    db.commit()
-    db.refresh(demand)
+    await db.commit()
+    await db.refresh(demand)
     
     # Return detailed response
     # We can reuse the logic from get_demand_detail, but we need to call it or duplicate logic.
@@ -254,18 +265,18 @@ async def list_demands(
     status_filter: Optional[str] = Query(None, alias="status", description="Status filter"),
     page: int = Query(1, ge=1, description="Page number"),
     pageSize: int = Query(20, ge=1, le=100, description="Items per page"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     List demands with optional filters and pagination
     """
     # Build query
-    query = db.query(Demand)
+    query = select(Demand)
     
     # Apply filters
     if q:
         search_term = f"%{q}%"
-        query = query.filter(
+        query = query.where(
             or_(
                 Demand.title.ilike(search_term),
                 Demand.description.ilike(search_term)
@@ -274,20 +285,22 @@ async def list_demands(
     
     if city:
         # Filter by city in location JSON
-        query = query.filter(Demand.location['city'].astext.ilike(f"%{city}%"))
+        query = query.where(Demand.location['city'].astext.ilike(f"%{city}%"))
     
     if category:
-        query = query.filter(Demand.theme.ilike(f"%{category}%"))
+        query = query.where(Demand.theme.ilike(f"%{category}%"))
     
     if status_filter:
-        query = query.filter(Demand.status.ilike(f"%{status_filter}%"))
+        query = query.where(Demand.status.ilike(f"%{status_filter}%"))
     
     # Get total count
-    total = query.count()
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
     
     # Apply pagination
     offset = (page - 1) * pageSize
-    demands = query.order_by(Demand.created_at.desc()).offset(offset).limit(pageSize).all()
+    demands = (await db.scalars(
+        query.order_by(Demand.created_at.desc()).offset(offset).limit(pageSize)
+    )).all()
     
     # Format response
     items = []
@@ -326,7 +339,7 @@ async def list_demands(
 @router.get("/{demand_id}", response_model=DemandDetailResponse)
 async def get_demand_detail(
     demand_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
@@ -334,7 +347,7 @@ async def get_demand_detail(
     Authentication is optional - if provided, will include supportedByUser flag.
     """
     # Find demand
-    demand = db.query(Demand).filter(Demand.id == demand_id).first()
+    demand = await db.get(Demand, demand_id)
     
     if not demand:
         raise HTTPException(
@@ -345,10 +358,7 @@ async def get_demand_detail(
     # Check if current user supports this demand
     supported_by_user = False
     if current_user:
-        support = db.query(DemandSupporter).filter(
-            DemandSupporter.demand_id == demand.id,
-            DemandSupporter.user_id == current_user.id
-        ).first()
+        support = await db.get(DemandSupporter, (demand.id, current_user.id))
         supported_by_user = support is not None
     
     # Format location
@@ -424,13 +434,13 @@ async def get_demand_detail(
 async def support_demand(
     demand_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Add support to a demand (authenticated users only)
     """
     # Find demand
-    demand = db.query(Demand).filter(Demand.id == demand_id).first()
+    demand = await db.get(Demand, demand_id)
     
     if not demand:
         raise HTTPException(
@@ -438,30 +448,17 @@ async def support_demand(
             detail="Demanda não encontrada"
         )
     
-    # Check if already supported
-    existing_support = db.query(DemandSupporter).filter(
-        DemandSupporter.demand_id == demand.id,
-        DemandSupporter.user_id == current_user.id
-    ).first()
+    # Add support (False if already supported)
+    added = await demand_service.add_supporter(demand.id, current_user.id, db)
     
-    if existing_support:
+    if not added:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Você já apoia esta demanda"
         )
     
-    # Add support
-    support = DemandSupporter(
-        demand_id=demand.id,
-        user_id=current_user.id
-    )
-    db.add(support)
-    
-    # Update counter
-    demand.supporters_count = (demand.supporters_count or 0) + 1
-    
-    db.commit()
-    db.refresh(demand)
+    # Counter was incremented in the database
+    await db.refresh(demand)
     
     return SupportResponse(
         message="Apoio registrado",
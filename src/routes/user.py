@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, select
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-from src.core.database import get_db
+from src.core.database import get_async_db
+from src.core.phone import phone_variants
 from src.models.user import User
 from src.models.demand import Demand
 from src.models.demand_supporter import DemandSupporter
@@ -51,7 +52,7 @@ class UpdateProfileResponse(BaseModel):
 # Dependency to get current user from JWT token
 async def get_current_user(
     authorization: str = Header(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """
     Extract and verify JWT token from Authorization header
@@ -76,7 +77,7 @@ async def get_current_user(
     
     # Get user from database
     user_id = payload.get("user_id")
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     
     if not user:
         raise HTTPException(
@@ -90,7 +91,7 @@ async def get_current_user(
 # Optional authentication dependency
 async def get_current_user_optional(
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[User]:
     """
     Extract and verify JWT token from Authorization header (optional)
@@ -119,7 +120,7 @@ async def get_current_user_optional(
     if not user_id:
         return None
         
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     return user
     
     if not user:
@@ -134,22 +135,22 @@ async def get_current_user_optional(
 @router.get("/profile", response_model=UserProfileResponse)
 async def get_profile(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get current user's profile with stats and activities
     """
     # Calculate stats
-    created_count = db.query(func.count(Demand.id)).filter(Demand.creator_id == current_user.id).scalar() or 0
-    supported_count = db.query(func.count(DemandSupporter.demand_id)).filter(DemandSupporter.user_id == current_user.id).scalar() or 0
-    active_count = db.query(func.count(Demand.id)).filter(
+    created_count = await db.scalar(select(func.count(Demand.id)).where(Demand.creator_id == current_user.id)) or 0
+    supported_count = await db.scalar(select(func.count(DemandSupporter.demand_id)).where(DemandSupporter.user_id == current_user.id)) or 0
+    active_count = await db.scalar(select(func.count(Demand.id)).where(
         Demand.creator_id == current_user.id,
         Demand.status == 'active'
-    ).scalar() or 0
-    completed_count = db.query(func.count(Demand.id)).filter(
+    )) or 0
+    completed_count = await db.scalar(select(func.count(Demand.id)).where(
         Demand.creator_id == current_user.id,
         Demand.status == 'completed'
-    ).scalar() or 0
+    )) or 0
     
     stats = {
         "created": created_count,
@@ -160,7 +161,9 @@ async def get_profile(
     
     # Get recent activities (last 5 demands created/supported)
     activities = []
-    recent_demands = db.query(Demand).filter(Demand.creator_id == current_user.id).order_by(Demand.created_at.desc()).limit(5).all()
+    recent_demands = (await db.scalars(
+        select(Demand).where(Demand.creator_id == current_user.id).order_by(Demand.created_at.desc()).limit(5)
+    )).all()
     for demand in recent_demands:
         days_ago = (func.now() - demand.created_at).days if hasattr(demand.created_at, 'days') else 0
         activities.append({
@@ -200,7 +203,7 @@ async def get_profile(
 async def update_profile(
     request: UpdateProfileRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update current user's profile
@@ -218,10 +221,10 @@ async def update_profile(
             )
         
         # Check if phone is already used by another user
-        existing_phone = db.query(User).filter(
-            User.phone == request.phone,
+        existing_phone = (await db.scalars(select(User).where(
+            or_(User.phone_e164.in_(phone_variants(request.phone)), User.phone == request.phone),
             User.id != current_user.id
-        ).first()
+        ))).first()
         
         if existing_phone and existing_phone.email:
             raise HTTPException(
@@ -266,8 +269,8 @@ async def update_profile(
         current_user.interests = request.interests
     
     # Save changes
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return UpdateProfileResponse(
         message="Perfil atualizado com sucesso",
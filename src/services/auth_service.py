@@ -1,9 +1,11 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 import bcrypt
 import random
 import re
 from jose import jwt, JWTError
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from src.core.config import settings
 from src.models.user import User
@@ -114,6 +116,39 @@ class AuthService:
             return True
         
         return False
+
+    @staticmethod
+    async def create_verification_code_async(email: str, db: AsyncSession) -> str:
+        """create_verification_code sobre AsyncSession"""
+        await db.execute(
+            delete(VerificationCode).where(VerificationCode.email == email)
+        )
+
+        code = AuthService.generate_verification_code()
+        db.add(VerificationCode(
+            email=email,
+            code=code,
+            expires_at=datetime.now(timezone.utc) + timedelta(minutes=10)
+        ))
+        await db.commit()
+
+        return code
+
+    @staticmethod
+    async def verify_code_async(email: str, code: str, db: AsyncSession) -> bool:
+        """verify_code sobre AsyncSession"""
+        result = await db.execute(
+            delete(VerificationCode)
+            .where(
+                VerificationCode.email == email,
+                VerificationCode.code == code,
+                VerificationCode.expires_at > datetime.now(timezone.utc)
+            )
+            .returning(VerificationCode.id)
+        )
+        verified = result.first() is not None
+        await db.commit()
+        return verified
     
     @staticmethod
     def validate_email(email: str) -> bool:
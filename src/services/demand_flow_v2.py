@@ -2,10 +2,10 @@
 Fluxo V2 de Criação de Demandas - Step by Step
 Coleta progressiva com mensagens fixas (sem desperdício de IA)
 """
-from sqlalchemy.orm import Session
-from src.core.state_manager import ConversationStateManager
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.state_manager import AsyncConversationStateManager
 from src.models.demand import Demand
-from src.models.user import User
+from src.core.user_cache import find_user_async
 from src.services.demand_service import DemandService
 from src.agents.writer import WriterAgent
 import logging
@@ -201,15 +201,15 @@ class DemandValidators:
 # HANDLER PRINCIPAL
 # ============================================================================
 
-async def start_demand_flow(phone: str, db: Session) -> str:
+async def start_demand_flow(phone: str, db: AsyncSession) -> str:
     """Inicia o fluxo de criação de demanda"""
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     
     context = {
         'collected_data': {}
     }
     
-    state_manager.set_state(phone, DemandFlowStates.COLLECTING_DESCRIPTION, context, db)
+    await state_manager.set_state(phone, DemandFlowStates.COLLECTING_DESCRIPTION, context, db)
     logger.info(f"Started demand flow for {phone}")
     
     return DemandMessages.initial_prompt()
@@ -220,11 +220,11 @@ async def process_demand_step(
     text: str,
     current_state: str,
     state_context: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """Processa cada etapa do fluxo"""
     
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     # Deep copy to avoid reference issues with SQLAlchemy objects
     collected = copy.deepcopy(state_context.get('collected_data', {}))
     
@@ -241,7 +241,7 @@ async def process_demand_step(
             'collected_data': collected,
             'last_description': collected['description']
         }
-        state_manager.set_state(phone, DemandFlowStates.COLLECTING_LOCATION, new_context, db)
+        await state_manager.set_state(phone, DemandFlowStates.COLLECTING_LOCATION, new_context, db)
         
         return DemandMessages.ask_location()
     
@@ -259,7 +259,7 @@ async def process_demand_step(
             'last_description': state_context.get('last_description'),
             'last_location': collected['location']
         }
-        state_manager.set_state(phone, DemandFlowStates.COLLECTING_CATEGORY, new_context, db)
+        await state_manager.set_state(phone, DemandFlowStates.COLLECTING_CATEGORY, new_context, db)
         
         return DemandMessages.ask_category()
     
@@ -287,7 +287,7 @@ async def process_demand_step(
             collected['scope_level'] = 1
 
         # Síntese com Gemini ANTES de mostrar resumo
-        user = db.query(User).filter(User.phone == phone).first()
+        user = await find_user_async(phone, db)
         writer = WriterAgent()
         
         category_label_map = {
@@ -343,13 +343,7 @@ async def process_demand_step(
         logger.info(f"💾 Context BEFORE saving - collected_data keys: {list(collected.keys())}")
         logger.info(f"💾 Context BEFORE saving - full collected: {collected}")
         
-        state_manager.set_state(phone, DemandFlowStates.CONFIRMING, new_context, db)
-        
-        # Verificar o que foi salvo
-        saved_state = state_manager.get_state(phone, db)
-        if saved_state:
-            logger.info(f"💾 Context AFTER saving - context_data keys: {list(saved_state.context_data.get('collected_data', {}).keys())}")
-            logger.info(f"💾 Context AFTER saving - full context: {saved_state.context_data}")
+        await state_manager.set_state(phone, DemandFlowStates.CONFIRMING, new_context, db)
         
         logger.info(f"Demand V2 summary with AI synthesis: {collected}")
         return DemandMessages.confirmation_summary(collected)
@@ -371,21 +365,12 @@ async def process_demand_step(
         response = text.strip().lower()
         
         if response in ['sim', 's', 'yes', 'confirmar', 'ok']:
-            # Normalizar telefone (remover @c.us se presente)
-            normalized_phone = phone.replace('@c.us', '')
-            
-            # Criar demanda no banco
-            user = db.query(User).filter(User.phone == normalized_phone).first()
+            # Criar demanda no banco (busca por qualquer formato do telefone)
+            user = await find_user_async(phone, db)
             if not user:
-                # Tentar variação com 9 adicional
-                if len(normalized_phone) == 10 and normalized_phone[2] != '9':
-                    alt_phone = normalized_phone[:2] + '9' + normalized_phone[2:]
-                    user = db.query(User).filter(User.phone == alt_phone).first()
-                
-                if not user:
-                    state_manager.clear_state(phone, db)
-                    logger.error(f"User not found for phone: {normalized_phone}")
-                    return "❌ Erro: usuário não encontrado."
+                await state_manager.clear_state(phone, db)
+                logger.error(f"User not found for phone: {phone}")
+                return "❌ Erro: usuário não encontrado."
             
             # PEGAR OS DADOS DO CONTEXTO SALVO (não do collected local que pode estar vazio)
             demand_data = collected.copy() if collected else {}
@@ -435,13 +420,13 @@ async def process_demand_step(
                 db=db
             )
             
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
             logger.info(f"✅ Demand created: {demand.id}")
             
             return DemandMessages.success_message(str(demand.id))
         
         elif response in ['nao', 'não', 'n', 'no', 'cancelar']:
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
             return (
                 "❌ *Criação cancelada.*\n\n"
                 "Sem problemas! Quando quiser criar uma demanda, é só me chamar. 😊"
@@ -449,7 +434,7 @@ async def process_demand_step(
         
         elif response in ['corrigir', 'editar', 'mudar']:
             # Reiniciar fluxo
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
             return await start_demand_flow(phone, db)
         
         else:
@@ -1,9 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.interaction import Interaction
 from src.services.demand_service import DemandService
 from src.services.similarity_service import SimilarityService
 from src.services.embedding_service import EmbeddingService
-from src.core.state_manager import ConversationStateManager
+from src.core.state_manager import AsyncConversationStateManager
 from src.agents.analyst import AnalystAgent
 from src.agents.writer import WriterAgent
 from src.agents.detective import DetectiveAgent
@@ -19,12 +20,12 @@ async def handle_demand_creation(
     classification: dict,
     user_location: dict,
     interaction_id: str,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Inicia o fluxo de entrevista para criar uma demanda rica.
     """
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     analyst = AnalystAgent()
     writer = WriterAgent()
 
@@ -48,7 +49,7 @@ async def handle_demand_creation(
         missing = analysis['missing_field']
         context['missing_field'] = missing
         
-        state_manager.set_state(phone, 'drafting_demand', context, db)
+        await state_manager.set_state(phone, 'drafting_demand', context, db)
         
         if missing == 'details':
             return await writer.ask_for_more_details()
@@ -64,14 +65,14 @@ async def handle_demand_drafting(
     phone: str,
     text: str,
     state_context: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Processa as respostas da entrevista (loop de perguntas).
     """
     analyst = AnalystAgent()
     writer = WriterAgent()
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
 
     # 1. Atualizar contexto com a nova resposta
     current_full_text = state_context.get('full_text', '') + "\n" + text
@@ -102,8 +103,16 @@ async def handle_demand_drafting(
         missing = analysis['missing_field']
         state_context['missing_field'] = missing
         
-        # Salva estado atualizado
-        state_manager.update_context(phone, state_context, db)
+        # Salva só o que mudou; a resposta é concatenada ao full_text no banco
+        await state_manager.update_context(
+            phone,
+            {
+                'missing_field': missing,
+                'collected_data': state_context.get('collected_data', {})
+            },
+            db,
+            append_text={'full_text': "\n" + text}
+        )
         
         if missing == 'details':
             return await writer.ask_for_more_details()
@@ -115,14 +124,14 @@ async def handle_demand_drafting(
     return await _finalize_demand_draft(phone, state_context, db)
 
 
-async def _finalize_demand_draft(phone: str, context: dict, db: Session) -> str:
+async def _finalize_demand_draft(phone: str, context: dict, db: AsyncSession) -> str:
     """Gera o conteúdo final estruturado e pede confirmação"""
     logger.info(f"Finalizing demand draft for {phone}. Context keys: {context.keys()}")
     
     analyst = AnalystAgent()
     writer = WriterAgent()
     from src.agents.validator import DemandValidatorAgent
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
 
     # Verificar se já existe demand_content (caso tenha voltado de validação)
     # Mas se o campo faltante era location_entity ou ainda há placeholder, forçar regeneração.
@@ -173,14 +182,14 @@ async def _finalize_demand_draft(phone: str, context: dict, db: Session) -> str:
         context['demand_content'] = final_content
         context['scope_level'] = scope_level
         logger.info(f"Validation failed - missing location_entity. Returning to drafting but keeping demand_content")
-        state_manager.set_state(phone, 'drafting_demand', context, db)
+        await state_manager.set_state(phone, 'drafting_demand', context, db)
         return await writer.ask_for_missing_specific_location(context['classification'].get('theme', ''))
 
     # Atualizar contexto para o estágio de confirmação
     context['demand_content'] = final_content
     context['scope_level'] = scope_level
     logger.info(f"Saving state confirming_problem with demand_content: {final_content.get('title', 'N/A')}")
-    state_manager.set_state(phone, 'confirming_problem', context, db)
+    await state_manager.set_state(phone, 'confirming_problem', context, db)
 
     return await writer.confirm_final_demand(
         title=final_content['title'],
@@ -196,7 +205,7 @@ async def handle_problem_confirmation(
     phone: str,
     confirmation_text: str,
     state_context: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Processa a confirmação do entendimento do problema.
@@ -206,7 +215,7 @@ async def handle_problem_confirmation(
 
     logger.info(f"Processing problem confirmation for {phone}. State context keys: {state_context.keys()}")
     
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent() # INSTANCIAÇÃO
     confirmation_lower = confirmation_text.lower().strip()
 
@@ -248,11 +257,11 @@ async def handle_problem_confirmation(
             # Certifica que demand_content e scope_level estão no contexto
             if 'demand_content' not in state_context:
                 logger.warning(f"Missing demand_content in confirming_problem state for {phone}")
-                state_manager.clear_state(phone, db)
+                await state_manager.clear_state(phone, db)
                 return "Ops! Houve um erro ao processar sua demanda. Vamos começar de novo. Por favor, descreva o problema que você gostaria de relatar."
             
             logger.info(f"Transitioning to asking_create_demand with demand_content: {state_context.get('demand_content', {}).get('title', 'N/A')}")
-            state_manager.set_state(phone, 'asking_create_demand', state_context, db)
+            await state_manager.set_state(phone, 'asking_create_demand', state_context, db)
 
             return await writer.present_action_options(has_similar_demands=False)
 
@@ -263,7 +272,7 @@ async def handle_problem_confirmation(
     ]
 
     if any(keyword in confirmation_lower for keyword in negative_keywords):
-        state_manager.clear_state(phone, db)
+        await state_manager.clear_state(phone, db)
 
         return await writer.ask_problem_rephrase()
 
@@ -277,7 +286,7 @@ async def handle_create_demand_decision(
     phone: str,
     decision_text: str,
     state_context: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Processa a decisão de criar demanda, ideia legislativa ou apenas conversar.
@@ -285,7 +294,7 @@ async def handle_create_demand_decision(
 
     logger.info(f"Processing create demand decision for {phone}. Decision: {decision_text}. State context keys: {state_context.keys()}")
     
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent() # INSTANCIAÇÃO
     # ScribeAgent é necessário para a Opção 2
     from src.agents.scribe import ScribeAgent
@@ -297,7 +306,7 @@ async def handle_create_demand_decision(
         # Validação: verificar se demand_content existe
         if 'demand_content' not in state_context:
             logger.error(f"Missing demand_content in state_context for {phone} at asking_create_demand")
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
             return "Ops! Houve um erro ao processar sua demanda. Vamos começar de novo. Por favor, descreva o problema que você gostaria de relatar."
         
         # ... (lógica de embedding e busca de similares) ...
@@ -329,7 +338,7 @@ async def handle_create_demand_decision(
                 {'id': d['id'], 'title': d['title'], 'similarity': d['similarity'], 'supporters_count': d['supporters_count']}
                 for d in similar_demands
             ]
-            state_manager.set_state(phone, 'choosing_similar_or_new', state_context, db)
+            await state_manager.set_state(phone, 'choosing_similar_or_new', state_context, db)
 
             return await writer.show_similar_demands(
                 demands=state_context['similar_demands']
@@ -353,12 +362,12 @@ async def handle_create_demand_decision(
         
         response = await writer.legislative_idea_ready(draft)
         
-        state_manager.clear_state(phone, db)
+        await state_manager.clear_state(phone, db)
         return response
 
     # Opção 3: APENAS CONVERSAR
     elif decision_lower in ['3', 'conversar', 'apenas conversar']:
-        state_manager.clear_state(phone, db)
+        await state_manager.clear_state(phone, db)
 
         return await writer.converse_only_message()
 
@@ -372,16 +381,13 @@ async def _create_new_demand(
     phone: str,
     state_context: dict,
     embedding: list,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Função auxiliar para criar uma nova demanda.
     """
-    from src.services.demand_service import DemandService
-    from src.agents.detective import DetectiveAgent
-
     demand_service = DemandService()
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent() # INSTANCIAÇÃO
 
     demand_content = state_context['demand_content']
@@ -411,13 +417,14 @@ async def _create_new_demand(
 
     # Atualizar interaction se disponível
     if interaction_id:
-        interaction = db.query(Interaction).filter(Interaction.id == interaction_id).first()
+        result = await db.execute(select(Interaction).where(Interaction.id == interaction_id))
+        interaction = result.scalars().first()
         if interaction:
             interaction.demand_id = demand.id
-            db.commit()
+            await db.commit()
 
     # Limpar estado
-    state_manager.clear_state(phone, db)
+    await state_manager.clear_state(phone, db)
     
     # Preparar dados do PL para o WriterAgent
     pl_details = [
@@ -441,14 +448,14 @@ async def handle_demand_choice(
     phone: str,
     choice_text: str,
     state_context: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Processa escolha do usuário: apoiar existente ou criar nova
     """
 
     demand_service = DemandService()
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent() # INSTANCIAÇÃO
 
     choice_lower = choice_text.lower().strip()
@@ -479,7 +486,7 @@ async def handle_demand_choice(
 
 
             # Limpar estado
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
             return response
         else:
             # Opção inválida (número fora do range)
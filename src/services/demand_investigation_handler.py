@@ -12,7 +12,7 @@ Retorna contexto completo para o usuário tomar decisão informada
 
 import logging
 from typing import Dict, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.services.legislative_search_service import legislative_service
 from src.services.law_search_service import law_search_service
 from src.services.similarity_service import SimilarityService
@@ -38,7 +38,7 @@ class DemandInvestigationHandler:
         user_text: str,
         classification_result: Dict,
         user_location: Optional[Dict],
-        db: Session
+        db: AsyncSession
     ) -> str:
         """
         Executa investigação completa e retorna mensagem contextualizada
@@ -136,7 +136,7 @@ class DemandInvestigationHandler:
         theme: str,
         scope_level: int,
         user_location: Optional[Dict],
-        db: Session
+        db: AsyncSession
     ) -> list:
         """Busca demandas similares usando embedding + pgvector"""
         try:
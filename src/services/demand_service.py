@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.demand import Demand
 from src.models.demand_supporter import DemandSupporter
 from src.services.embedding_service import EmbeddingService
@@ -21,16 +22,15 @@ class DemandService:
         location: dict,
         affected_entity: str,
         urgency: str,
-        db: Session
+        db: AsyncSession
     ) -> Demand:
         """Cria nova demanda com embedding"""
-        
-        # Gerar embedding
+
         text_for_embedding = self.embedding_service.prepare_text_for_embedding(
             title, description, theme
         )
         embedding = await self.embedding_service.generate_embedding(text_for_embedding)
-        
+
         demand = Demand(
             creator_id=creator_id,
             title=title,
@@ -41,64 +41,57 @@ class DemandService:
             affected_entity=affected_entity,
             urgency=urgency,
             supporters_count=1,
-            embedding=embedding  # NOVO
+            embedding=embedding
         )
-        
+
         db.add(demand)
-        db.flush()
-        
+        await db.flush()
+
         # Adicionar criador como apoiador
-        supporter = DemandSupporter(
-            demand_id=demand.id,
-            user_id=creator_id
-        )
-        db.add(supporter)
-        
-        db.commit()
-        db.refresh(demand)
-        
+        db.add(DemandSupporter(demand_id=demand.id, user_id=creator_id))
+
+        await db.commit()
+        await db.refresh(demand)
+
         logger.info(f"✅ Demand created with embedding: {demand.id}")
         return demand
-    
+
     async def add_supporter(
         self,
         demand_id: str,
         user_id: str,
-        db: Session
+        db: AsyncSession
     ) -> bool:
         """
         Adiciona usuário como apoiador de uma demanda
-        
+
         Returns:
             bool: True se adicionou, False se já era apoiador
         """
-        # Verificar se já apoia
-        existing = db.query(DemandSupporter).filter(
-            DemandSupporter.demand_id == demand_id,
-            DemandSupporter.user_id == user_id
-        ).first()
-        
-        if existing:
+        result = await db.execute(
+            select(DemandSupporter).where(
+                DemandSupporter.demand_id == demand_id,
+                DemandSupporter.user_id == user_id
+            )
+        )
+        if result.scalars().first():
             logger.info(f"User {user_id} already supports demand {demand_id}")
             return False
-        
-        # Adicionar apoio
-        supporter = DemandSupporter(
-            demand_id=demand_id,
-            user_id=user_id
+
+        db.add(DemandSupporter(demand_id=demand_id, user_id=user_id))
+
+        # Incremento no banco (sem ler-modificar-escrever o contador)
+        await db.execute(
+            update(Demand)
+            .where(Demand.id == demand_id)
+            .values(supporters_count=func.coalesce(Demand.supporters_count, 0) + 1)
         )
-        db.add(supporter)
-        
-        # Incrementar contador
-        demand = db.query(Demand).filter(Demand.id == demand_id).first()
-        if demand:
-            demand.supporters_count += 1
-        
-        db.commit()
-        
+
+        await db.commit()
+
         logger.info(f"✅ User {user_id} now supports demand {demand_id}")
         return True
-    
+
     def get_demand_link(self, demand_id) -> str:
         # Placeholder for link generation
         return f"https://coral.app/demands/{demand_id}"
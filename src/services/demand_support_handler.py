@@ -1,7 +1,8 @@
-from src.core.state_manager import ConversationStateManager
+from src.core.state_manager import AsyncConversationStateManager
 from src.models.demand import Demand
 from src.models.demand_supporter import DemandSupporter
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from src.agents.writer import WriterAgent # NOVO
 import logging
@@ -13,7 +14,7 @@ async def handle_demand_support_choice(
     phone: str,
     text: str,
     state_context: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Handle user's choice to support a specific demand from a list
@@ -24,7 +25,7 @@ async def handle_demand_support_choice(
     3. If 'nova': redirect to demand creation flow
     """
 
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent() # INSTANCIAÇÃO
     choice = text.strip().lower()
 
@@ -38,7 +39,7 @@ async def handle_demand_support_choice(
             logger.info("✅ User chose to create new demand instead of supporting")
 
             # Redirect to demand creation flow
-            state_manager.set_state(
+            await state_manager.set_state(
                 phone=phone,
                 stage="confirming_problem",
                 context={
@@ -65,26 +66,32 @@ async def handle_demand_support_choice(
             demand_id = available_demands[choice_number - 1]
 
             # Check if demand exists
-            demand = db.query(Demand).filter(Demand.id == demand_id).first()
+            demand = (await db.execute(select(Demand).where(Demand.id == demand_id))).scalars().first()
             if not demand:
-                state_manager.clear_state(phone, db)
+                await state_manager.clear_state(phone, db)
                 # Substitui string hardcoded por chamada ao WriterAgent
                 return await writer.demand_not_found()
 
             # Check if user already supports this demand (for immediate response)
-            existing_support = db.query(DemandSupporter).filter(
-                DemandSupporter.demand_id == demand_id,
-                DemandSupporter.user_id == user_id
-            ).first()
+            result = await db.execute(
+                select(DemandSupporter).where(
+                    DemandSupporter.demand_id == demand_id,
+                    DemandSupporter.user_id == user_id
+                )
+            )
+            existing_support = result.scalars().first()
 
             if existing_support:
-                state_manager.clear_state(phone, db)
+                await state_manager.clear_state(phone, db)
                 # Substitui string hardcoded por chamada ao WriterAgent
                 return await writer.demand_already_supported(
                     title=demand.title, 
                     current_count=demand.supporters_count
                 )
 
+            # O rollback expira a demanda (sem lazy load na AsyncSession): guarda o que a resposta usa
+            title, current_count = demand.title, demand.supporters_count
+
             # Add user as supporter
             try:
                 supporter = DemandSupporter(
@@ -96,11 +103,11 @@ async def handle_demand_support_choice(
                 # Update supporters count
                 demand.supporters_count += 1
 
-                db.commit()
+                await db.commit()
 
                 logger.info(f"✅ User {user_id} now supports demand {demand_id}")
 
-                state_manager.clear_state(phone, db)
+                await state_manager.clear_state(phone, db)
 
                 # Substitui string hardcoded por chamada ao WriterAgent (Sucesso)
                 return await writer.demand_supported_success(
@@ -109,12 +116,12 @@ async def handle_demand_support_choice(
                 )
 
             except IntegrityError:
-                db.rollback()
-                state_manager.clear_state(phone, db)
+                await db.rollback()
+                await state_manager.clear_state(phone, db)
                 # Substitui string hardcoded por chamada ao WriterAgent (Fallback de erro de integridade)
                 return await writer.demand_already_supported(
-                    title=demand.title, 
-                    current_count=demand.supporters_count
+                    title=title, 
+                    current_count=current_count
                 )
 
         except ValueError:
@@ -124,6 +131,6 @@ async def handle_demand_support_choice(
 
     except Exception as e:
         logger.error(f"❌ Error handling demand support choice: {e}", exc_info=True)
-        state_manager.clear_state(phone, db)
+        await state_manager.clear_state(phone, db)
         # Substitui string hardcoded por chamada ao WriterAgent (Erro genérico)
         return await writer.generic_error_response()
\ No newline at end of file
@@ -1,14 +1,19 @@
 from google.generativeai import embed_content
 import google.generativeai as genai
+import asyncio
 import logging
+from src.core.config import settings
+from src.core.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Compartilhado entre instâncias: textos iguais em paralelo geram um único embedding
+_in_flight = SingleFlight("embedding")
+
 class EmbeddingService:
     """Gera embeddings para busca semântica"""
     
     def __init__(self):
-        from src.core.config import settings
         genai.configure(api_key=settings.GOOGLE_GEMINI_API_KEY)
         self.model = "models/text-embedding-004"
     
@@ -26,11 +31,16 @@ class EmbeddingService:
             # Limitar tamanho do texto (Gemini tem limite)
             text_truncated = text[:2000]
             
-            result = embed_content(
+            call = lambda: asyncio.to_thread(
+                embed_content,
                 model=self.model,
                 content=text_truncated,
                 task_type="retrieval_document"
             )
+            if settings.LLM_SINGLE_FLIGHT_ENABLED:
+                result = await _in_flight.run((self.model, text_truncated), call)
+            else:
+                result = await call()
             
             embedding = result['embedding']
             logger.info(f"Generated embedding with {len(embedding)} dimensions")
@@ -0,0 +1,147 @@
+"""
+Gravação em lote das linhas de `interactions`
+
+Cada turno do webhook gera uma linha por mensagem original. Em vez de um
+INSERT + COMMIT por turno, as linhas ficam num buffer em memória e são
+gravadas em lote (INSERT multi-linha) quando o buffer chega a
+INTERACTION_LOG_BATCH_SIZE ou a cada INTERACTION_LOG_FLUSH_INTERVAL_SECONDS.
+
+O id (uuid4) e o created_at são gerados no cliente, no momento do turno, então
+nada precisa ser lido de volta do banco.
+
+Durabilidade (INTERACTION_LOG_MODE):
+- batched: o turno responde sem esperar o banco; no shutdown o buffer é
+  gravado de forma síncrona. Só uma queda do processo perde as linhas
+  ainda no buffer (no máximo um intervalo de flush).
+- sync: o turno aguarda a gravação da sua linha antes de responder.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from src.core.config import settings
+from src.core.database import SessionLocal
+from src.core.metrics import metrics
+from src.models.interaction import Interaction
+
+logger = logging.getLogger(__name__)
+
+
+def _insert_rows(rows: List[Dict[str, Any]]):
+    """Um INSERT multi-linha (insertmanyvalues) + COMMIT (roda em thread)"""
+    db = SessionLocal()
+    try:
+        db.execute(insert(Interaction), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class InteractionLogWriter:
+    """Buffer de linhas de `interactions` gravado em lotes"""
+
+    def __init__(self):
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        metrics.register_gauge("interaction_log_buffered", lambda: len(self._buffer))
+
+    async def record(self, rows: List[Dict[str, Any]]):
+        """
+        Registra linhas de `interactions` (id e created_at gerados aqui).
+
+        No modo batched retorna imediatamente; no modo sync retorna depois
+        da gravação. Erros de gravação são logados, nunca propagados.
+        """
+        now = datetime.now(timezone.utc)
+        rows = [{"id": uuid.uuid4(), "created_at": now, **row} for row in rows]
+
+        if settings.INTERACTION_LOG_MODE == "sync" or self._closing:
+            await self._write(rows)
+            return
+
+        self._ensure_started()
+        self._buffer.extend(rows)
+        if len(self._buffer) >= settings.INTERACTION_LOG_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Grava tudo que está no buffer (em lotes de INTERACTION_LOG_BATCH_SIZE)"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[:settings.INTERACTION_LOG_BATCH_SIZE]
+                del self._buffer[:len(batch)]
+                if not await self._write(batch):
+                    self._requeue(batch)
+                    return
+
+    async def close(self):
+        """Para o flush periódico e grava o buffer de forma síncrona (shutdown)"""
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self.flush()
+        if self._buffer:
+            # Última tentativa falhou: as linhas restantes se perdem
+            logger.error(f"❌ {len(self._buffer)} interactions lost on shutdown")
+            metrics.inc("interaction_log_dropped_total", len(self._buffer))
+            self._buffer.clear()
+        self._closing = False
+
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.INTERACTION_LOG_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> bool:
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(_insert_rows, rows)
+        except Exception as e:
+            logger.error(f"❌ Error saving {len(rows)} interactions: {e}")
+            metrics.inc("interaction_log_errors_total")
+            return False
+
+        metrics.observe("interaction_log_flush_seconds", time.perf_counter() - start)
+        metrics.observe("interaction_log_flush_rows", len(rows))
+        logger.debug(f"Interactions saved: {len(rows)}")
+        return True
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        """Devolve um lote que falhou ao início do buffer (até INTERACTION_LOG_MAX_BUFFER)"""
+        self._buffer[:0] = batch
+        overflow = len(self._buffer) - settings.INTERACTION_LOG_MAX_BUFFER
+        if overflow > 0:
+            del self._buffer[:overflow]
+            logger.error(f"❌ Interaction log buffer full, dropped {overflow} oldest rows")
+            metrics.inc("interaction_log_dropped_total", overflow)
+
+
+interaction_log = InteractionLogWriter()
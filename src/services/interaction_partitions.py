@@ -0,0 +1,266 @@
+"""
+Manutenção das partições mensais de `interactions`
+
+`interactions` é particionada por RANGE em created_at, uma partição por mês
+UTC (interactions_pYYYY_MM, ver sql/014_partition_interactions.sql). A cada
+INTERACTIONS_MAINTENANCE_INTERVAL_SECONDS um worker (advisory lock, os demais
+pulam a rodada):
+
+1. cria as partições do mês atual e dos INTERACTIONS_PARTITION_PREMAKE_MONTHS
+   seguintes;
+2. resume todo dia completo em interaction_daily_rollups (contagens por
+   classificação e tipo de mensagem, duração média dos áudios) - as
+   consultas de analytics leem os resumos, não as linhas brutas;
+3. retenção: partições com mais de INTERACTIONS_RETENTION_MONTHS meses têm
+   seus dias resumidos, são desanexadas (DETACH ... CONCURRENTLY, sem
+   bloquear inserts) e apagadas.
+
+O startup (init_db) sempre executa a etapa 1, mesmo com a manutenção
+desligada - sem ela, as partições criadas no startup duram só até o fim dos
+meses criados com antecedência.
+
+Cada comando roda em autocommit; uma rodada interrompida é retomada na
+próxima (resumos são recalculados com upsert, partições desanexadas pela
+metade são finalizadas).
+"""
+
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from src.core.config import settings
+from src.core.database import engine
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "interactions"
+_PARTITION_NAME = re.compile(r"^interactions_p(\d{4})_(\d{2})$")
+_LOCK_SQL = text("SELECT pg_try_advisory_lock(hashtext('interaction_partitions'))")
+_WAIT_LOCK_SQL = text("SELECT pg_advisory_lock(hashtext('interaction_partitions'))")
+_UNLOCK_SQL = text("SELECT pg_advisory_unlock(hashtext('interaction_partitions'))")
+
+_PARTITIONS_SQL = text("""
+    SELECT c.relname, i.inhrelid IS NOT NULL AS attached, COALESCE(i.inhdetachpending, false) AS detach_pending
+    FROM pg_class c
+    LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = CAST(:parent AS regclass)
+    WHERE c.relkind = 'r' AND c.relname LIKE 'interactions\\_p%'
+""")
+
+_ROLLUP_SQL = text("""
+    INSERT INTO interaction_daily_rollups (
+        day, classification, message_type, interactions, distinct_phones, audio_count, audio_seconds_total
+    )
+    SELECT
+        CAST(:day AS date),
+        COALESCE(classification, 'NONE'),
+        message_type,
+        COUNT(*),
+        COUNT(DISTINCT phone),
+        COUNT(audio_duration_seconds),
+        COALESCE(SUM(audio_duration_seconds), 0)
+    FROM interactions
+    WHERE created_at >= :start AND created_at < :end
+    GROUP BY 2, 3
+    ON CONFLICT (day, classification, message_type) DO UPDATE SET
+        interactions = EXCLUDED.interactions,
+        distinct_phones = EXCLUDED.distinct_phones,
+        audio_count = EXCLUDED.audio_count,
+        audio_seconds_total = EXCLUDED.audio_seconds_total,
+        updated_at = NOW()
+""")
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _utc_midnight(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+class InteractionPartitionManager:
+    """Cria, resume e remove partições mensais de interactions"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    # ------------------------------------------------------------------
+    # Operações (conexão em autocommit)
+    # ------------------------------------------------------------------
+
+    def partitions(self, conn: Connection) -> List[Tuple[str, date, bool, bool]]:
+        """
+        Returns:
+            (nome, mês, anexada, detach pendente) de cada tabela interactions_pYYYY_MM, do mês mais antigo ao mais novo
+        """
+        rows = conn.execute(_PARTITIONS_SQL, {"parent": PARENT_TABLE}).all()
+        found = [(row.relname, partition_month(row.relname), row.attached, row.detach_pending) for row in rows]
+        return sorted((p for p in found if p[1] is not None), key=lambda p: p[1])
+
+    def ensure_partitions(self, conn: Connection, today: date) -> List[str]:
+        """Cria as partições do mês atual e dos próximos meses configurados"""
+        created = []
+        existing = {name for name, _, attached, _ in self.partitions(conn) if attached}
+        current = _month_start(today)
+
+        for offset in range(settings.INTERACTIONS_PARTITION_PREMAKE_MONTHS + 1):
+            month = _add_months(current, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{_utc_midnight(month).isoformat()}') "
+                f"TO ('{_utc_midnight(_add_months(month, 1)).isoformat()}')"
+            ))
+            created.append(name)
+            logger.info(f"🗓️ Created partition {name}")
+
+        return created
+
+    def rollup_days(self, conn: Connection, first_day: date, end_day: date) -> int:
+        """Recalcula os resumos de [first_day, end_day), um dia por comando"""
+        days = 0
+        day = first_day
+        while day < end_day:
+            conn.execute(_ROLLUP_SQL, {
+                "day": day,
+                "start": _utc_midnight(day),
+                "end": _utc_midnight(day + timedelta(days=1))
+            })
+            days += 1
+            day += timedelta(days=1)
+        return days
+
+    def rollup_complete_days(self, conn: Connection, today: date) -> int:
+        """
+        Resume os dias completos ainda não resumidos. O último dia já resumido
+        é recalculado (linhas gravadas em lote podem chegar depois da meia-noite).
+        """
+        attached = [month for _, month, is_attached, _ in self.partitions(conn) if is_attached]
+        if not attached:
+            return 0
+
+        last = conn.execute(text("SELECT MAX(day) FROM interaction_daily_rollups")).scalar()
+        first_day = max(last, attached[0]) if last else attached[0]
+        return self.rollup_days(conn, first_day, today)
+
+    def apply_retention(self, conn: Connection, today: date) -> List[str]:
+        """Resume, desanexa e apaga as partições fora da janela de retenção"""
+        retention = settings.INTERACTIONS_RETENTION_MONTHS
+        if retention <= 0:
+            return []
+
+        cutoff = _add_months(_month_start(today), -retention)
+        dropped = []
+
+        for name, month, attached, detach_pending in self.partitions(conn):
+            if month >= cutoff:
+                continue
+
+            if attached:
+                self.rollup_days(conn, month, _add_months(month, 1))
+                mode = "FINALIZE" if detach_pending else "CONCURRENTLY"
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name} {mode}"))
+
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+            logger.info(f"🗑️ Dropped partition {name} (older than {retention} months; rolled up)")
+
+        return dropped
+
+    def ensure_current_partitions(self, today: Optional[date] = None) -> List[str]:
+        """
+        Só a etapa 1 (partição do mês atual e dos próximos), esperando o lock se
+        outro worker estiver em manutenção. Chamada no startup (init_db): sem
+        partição para o mês corrente todo INSERT em interactions falha, mesmo
+        com INTERACTIONS_MAINTENANCE_ENABLED=false.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(_WAIT_LOCK_SQL)
+            try:
+                return self.ensure_partitions(conn, today)
+            finally:
+                conn.execute(_UNLOCK_SQL)
+
+    def run_maintenance(self, today: Optional[date] = None) -> Dict[str, object]:
+        """
+        Uma rodada completa (pula se outro worker estiver rodando).
+
+        Returns:
+            Resumo da rodada: partições criadas, dias resumidos e partições apagadas
+        """
+        today = today or datetime.now(timezone.utc).date()
+        summary: Dict[str, object] = {"skipped": True}
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if not conn.execute(_LOCK_SQL).scalar():
+                logger.info("Interaction partition maintenance running elsewhere; skipping")
+                return summary
+            try:
+                with metrics.timer("interaction_partition_maintenance_seconds"):
+                    summary = {
+                        "skipped": False,
+                        "created": self.ensure_partitions(conn, today),
+                        "rolled_up_days": self.rollup_complete_days(conn, today),
+                        "dropped": self.apply_retention(conn, today),
+                    }
+            finally:
+                conn.execute(_UNLOCK_SQL)
+
+        metrics.inc("interaction_partitions_created_total", len(summary["created"]))
+        metrics.inc("interaction_partitions_dropped_total", len(summary["dropped"]))
+        logger.info(f"🗓️ Interaction partition maintenance: {summary}")
+        return summary
+
+    # ------------------------------------------------------------------
+    # Task de fundo
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._task is not None or not settings.INTERACTIONS_MAINTENANCE_ENABLED:
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self.run_maintenance)
+            except Exception as e:
+                logger.error(f"Error in interaction partition maintenance: {e}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.INTERACTIONS_MAINTENANCE_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+interaction_partitions = InteractionPartitionManager()
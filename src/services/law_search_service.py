@@ -5,8 +5,7 @@ Utiliza prompt engineering avançado para identificar leis que já garantem dire
 
 import logging
 from typing import Optional, Dict, List
-import google.generativeai as genai
-from src.core.config import settings
+from src.core.gemini import gemini_client
 
 logger = logging.getLogger(__name__)
 
@@ -51,11 +50,6 @@ class LawSearchService:
         }
     }
     
-    def __init__(self):
-        genai.configure(api_key=settings.GOOGLE_GEMINI_API_KEY)
-        # Usar gemini-2.0-flash-lite (mais rápido e leve)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
-    
     async def search_existing_laws(
         self,
         user_problem: str,
@@ -296,39 +290,17 @@ IMPORTANTE:
         return prompt
     
     async def _call_gemini(self, prompt: str) -> str:
-        """Chama Gemini com configurações otimizadas e retry"""
-        import time
-        from google.api_core.exceptions import ResourceExhausted
-        
-        max_retries = 2
-        retry_delay = 2  # segundos
-        
-        for attempt in range(max_retries):
-            try:
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.2,  # Baixa para respostas mais determinísticas
-                        top_p=0.8,
-                        top_k=40,
-                        max_output_tokens=2048,
-                    ),
-                )
-                
-                return response.text
-                
-            except ResourceExhausted as e:
-                logger.warning(f"Quota exceeded on attempt {attempt + 1}/{max_retries}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                else:
-                    logger.error(f"Max retries reached. Quota exceeded: {e}")
-                    raise
-            except Exception as e:
-                logger.error(f"Error calling Gemini: {e}")
-                raise
+        """Chama Gemini com configurações otimizadas (cota e retry ficam no llm_scheduler)"""
+        return await gemini_client.generate_content(
+            prompt,
+            call_site="law_search",
+            generation_config={
+                "temperature": 0.2,  # Baixa para respostas mais determinísticas
+                "top_p": 0.8,
+                "top_k": 40,
+                "max_output_tokens": 2048,
+            },
+        )
     
     def _parse_gemini_response(self, response_text: str) -> Dict:
         """Parse da resposta JSON do Gemini"""
@@ -0,0 +1,75 @@
+"""
+Debounce de mensagens por telefone (modo síncrono do /webhook)
+
+Usuários do WhatsApp costumam dividir um relato em várias mensagens curtas.
+Cada mensagem que chega dentro da janela MESSAGE_DEBOUNCE_SECONDS reinicia a
+espera; quando a janela fecha, a ÚLTIMA mensagem da rajada processa todas de
+uma vez (uma classificação, uma investigação, uma resposta). As anteriores
+retornam None e o webhook responde vazio para elas (o bot não envia nada).
+
+A rajada nunca espera mais que MESSAGE_DEBOUNCE_MAX_SECONDS desde a primeira
+mensagem. No modo fila o debounce é feito no banco (webhook_queue.py).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.services.message_processor import InboundMessage
+
+logger = logging.getLogger(__name__)
+
+
+class _Burst:
+    def __init__(self):
+        self.messages: List[InboundMessage] = []
+        self.generation = 0
+        self.started_at = time.monotonic()
+
+
+class MessageDebouncer:
+    """Agrupa rajadas de mensagens do mesmo telefone em um único turno"""
+
+    def __init__(self):
+        self._bursts: Dict[str, _Burst] = {}
+
+    async def submit(self, phone: str, message: InboundMessage) -> Optional[List[InboundMessage]]:
+        """
+        Registra uma mensagem e aguarda a janela de debounce.
+
+        Returns:
+            Lista de mensagens do turno se esta chamada deve processá-lo,
+            ou None se a mensagem foi absorvida por uma mensagem posterior
+        """
+        window = settings.MESSAGE_DEBOUNCE_SECONDS
+        if window <= 0:
+            return [message]
+
+        key = phone.split("@")[0]
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst()
+
+        burst.messages.append(message)
+        burst.generation += 1
+        my_generation = burst.generation
+
+        remaining = burst.started_at + settings.MESSAGE_DEBOUNCE_MAX_SECONDS - time.monotonic()
+        await asyncio.sleep(max(0.0, min(window, remaining)))
+
+        if burst.generation != my_generation:
+            # Uma mensagem mais nova assumiu a rajada
+            metrics.inc("debounce_absorbed_messages_total")
+            return None
+
+        if self._bursts.get(key) is burst:
+            del self._bursts[key]
+
+        if len(burst.messages) > 1:
+            logger.info(f"⏱️ Debounced {len(burst.messages)} messages from {phone}")
+        return burst.messages
+
+
+message_debouncer = MessageDebouncer()
@@ -0,0 +1,219 @@
+"""
+Deduplicação de mensagens do /webhook (idempotência por message_id)
+
+Restarts do whatsapp-bot e retries do axios reenviam a mesma mensagem. Cada
+message_id é reservado uma única vez em `processed_messages` (chave primária
+no Postgres, compartilhada entre workers/nós) e a resposta final fica
+guardada lá e em um LRU em memória. Cópias recebem a resposta guardada sem
+rodar Whisper/Gemini de novo; cópias que chegam enquanto a original ainda
+está em processamento aguardam o resultado dela.
+
+Entradas expiram após MESSAGE_DEDUP_TTL_SECONDS. Uma reserva 'processing'
+mais antiga que MESSAGE_DEDUP_STALE_SECONDS (processo morreu no meio) pode
+ser retomada por uma cópia - exceto se o job da fila associado ainda estiver
+pendente ou em processamento (retries com backoff não renovam a reserva).
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+from sqlalchemy import and_, or_, exists, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.database import SessionLocal
+from src.core.metrics import metrics
+from src.models.processed_message import ProcessedMessage
+from src.models.webhook_job import WebhookJob
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre limpezas de entradas expiradas no banco
+_PURGE_INTERVAL_SECONDS = 300
+_WAIT_POLL_SECONDS = 0.25
+_LIVE_JOB_STATUSES = ('pending', 'processing')
+
+
+def _job_alive(job_id):
+    """O job (ou o job que o absorveu no debounce) ainda está pendente ou em processamento"""
+    leader = aliased(WebhookJob)
+    return exists().where(
+        WebhookJob.id == job_id,
+        or_(
+            WebhookJob.status.in_(_LIVE_JOB_STATUSES),
+            and_(
+                WebhookJob.status == 'merged',
+                exists().where(leader.id == WebhookJob.merged_into, leader.status.in_(_LIVE_JOB_STATUSES))
+            )
+        )
+    )
+
+
+@dataclass
+class DuplicateMessage:
+    """Mensagem já recebida antes"""
+    response: Optional[str] = None  # resposta guardada (None enquanto a original está em processamento)
+    job_id: Optional[str] = None  # job da fila que processa a original
+    in_flight: bool = False
+
+
+class MessageDeduplicator:
+    """Reserva message_ids e guarda a resposta final de cada mensagem"""
+
+    def __init__(self):
+        self._cache = TTLCache(
+            maxsize=settings.MESSAGE_DEDUP_CACHE_SIZE,
+            ttl=settings.MESSAGE_DEDUP_TTL_SECONDS
+        )
+        self._last_purge = 0.0
+
+    def claim(self, message_id: str, phone: str, db: Session) -> Optional[DuplicateMessage]:
+        """
+        Reserva o message_id para esta requisição.
+
+        Returns:
+            None se a mensagem é nova (quem chamou deve processá-la e depois
+            chamar complete() ou release()), ou DuplicateMessage se é uma cópia
+        """
+        cached = self._cache.get(message_id)
+        if cached is not None:
+            metrics.inc("webhook_duplicates_total", source="memory")
+            return cached
+
+        self._purge_expired(db)
+
+        now = func.now()
+        stmt = insert(ProcessedMessage).values(
+            message_id=message_id,
+            phone=phone,
+            status='processing'
+        )
+        # Entrada expirada ou reserva abandonada: esta requisição assume a mensagem
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProcessedMessage.message_id],
+            set_={
+                'phone': stmt.excluded.phone,
+                'status': 'processing',
+                'response': None,
+                'job_id': None,
+                'created_at': now,
+                'updated_at': now
+            },
+            where=or_(
+                ProcessedMessage.created_at < now - timedelta(seconds=settings.MESSAGE_DEDUP_TTL_SECONDS),
+                and_(
+                    ProcessedMessage.status == 'processing',
+                    ProcessedMessage.updated_at < now - timedelta(seconds=settings.MESSAGE_DEDUP_STALE_SECONDS),
+                    # Job da fila ainda vivo (em backoff entre retries): não é reserva abandonada
+                    ~_job_alive(ProcessedMessage.job_id)
+                )
+            )
+        ).returning(ProcessedMessage.message_id)
+
+        claimed = db.execute(stmt).scalar()
+        db.commit()
+
+        if claimed:
+            return None
+
+        row = db.query(ProcessedMessage).filter(ProcessedMessage.message_id == message_id).first()
+        metrics.inc("webhook_duplicates_total", source="database")
+        if row is None:
+            # Removida entre o INSERT e a leitura (release concorrente): trata como em andamento
+            return DuplicateMessage(in_flight=True)
+
+        job_id = str(row.job_id) if row.job_id else None
+        if row.status == 'done':
+            duplicate = DuplicateMessage(response=row.response or "", job_id=job_id)
+            self._cache.set(message_id, duplicate)
+            return duplicate
+
+        return DuplicateMessage(job_id=job_id, in_flight=True)
+
+    def attach_job(self, message_id: str, job_id, db: Session):
+        """Associa a mensagem ao job da fila que vai processá-la"""
+        db.query(ProcessedMessage).filter(ProcessedMessage.message_id == message_id).update(
+            {ProcessedMessage.job_id: job_id, ProcessedMessage.updated_at: func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+
+    def complete(self, message_id: str, response: str, db: Session):
+        """Guarda a resposta final; cópias futuras recebem este texto"""
+        row = db.query(ProcessedMessage).filter(ProcessedMessage.message_id == message_id).first()
+        if row is None:
+            return
+
+        row.status = 'done'
+        row.response = response
+        db.commit()
+        self._cache.set(
+            message_id,
+            DuplicateMessage(response=response, job_id=str(row.job_id) if row.job_id else None)
+        )
+
+    def release(self, message_id: str, db: Session):
+        """Desfaz a reserva após uma falha, para que um reenvio seja processado de novo"""
+        try:
+            db.rollback()
+            db.query(ProcessedMessage).filter(
+                ProcessedMessage.message_id == message_id,
+                ProcessedMessage.status == 'processing'
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.error(f"❌ Error releasing message {message_id}: {e}")
+            db.rollback()
+        self._cache.delete(message_id)
+
+    async def wait_for_response(self, message_id: str) -> Optional[str]:
+        """
+        Aguarda a requisição original terminar (até MESSAGE_DEDUP_INFLIGHT_WAIT_SECONDS).
+
+        Returns:
+            Resposta da original, ou None se ela não terminou a tempo ou falhou
+        """
+        deadline = time.monotonic() + settings.MESSAGE_DEDUP_INFLIGHT_WAIT_SECONDS
+
+        while time.monotonic() < deadline:
+            cached = self._cache.get(message_id)
+            if cached is not None and not cached.in_flight:
+                return cached.response
+
+            row = await asyncio.to_thread(self._fetch, message_id)
+            if row is None:
+                return None
+            if row[0] == 'done':
+                return row[1] or ""
+
+            await asyncio.sleep(_WAIT_POLL_SECONDS)
+
+        return None
+
+    def _fetch(self, message_id: str):
+        db = SessionLocal()
+        try:
+            return db.query(ProcessedMessage.status, ProcessedMessage.response).filter(
+                ProcessedMessage.message_id == message_id
+            ).first()
+        finally:
+            db.close()
+
+    def _purge_expired(self, db: Session):
+        if time.monotonic() - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+
+        deleted = db.query(ProcessedMessage).filter(
+            ProcessedMessage.created_at < func.now() - timedelta(seconds=settings.MESSAGE_DEDUP_TTL_SECONDS)
+        ).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            logger.info(f"🧹 Purged {deleted} expired message ids")
+
+
+message_dedup = MessageDeduplicator()
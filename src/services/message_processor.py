@@ -0,0 +1,509 @@
+"""
+Processamento de mensagens do WhatsApp (classificação + máquina de estados)
+
+Usado tanto pelo /webhook síncrono quanto pelos workers da fila
+(src/services/webhook_queue.py).
+
+Cada turno abre a sua AsyncSession: os handlers consultam e gravam pelo
+AsyncConversationStateManager e pelos serviços assíncronos, sem bloquear o
+event loop. O usuário e o estado da conversa são carregados primeiro (em
+paralelo). Estados determinísticos (menus numéricos, fluxo V2, handlers
+V1) são despachados pela tabela STATE_DISPATCH sem chamar o Gemini; a
+classificação do RouterAgent só roda quando o turno precisa dela e é
+disparada assim que isso é conhecido, sobrepondo-se ao restante do trabalho.
+As linhas de `interactions` são gravadas em lote pelo interaction_log, fora
+do caminho crítico da resposta.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.core.metrics import metrics
+from src.core.phone_lock import phone_lock
+from src.models.user import User
+from src.models.conversation_state import ConversationState
+from src.agents.router import RouterAgent
+from src.agents.profiler import ProfilerAgent
+from src.agents.writer import WriterAgent
+from src.core.state_manager import AsyncConversationStateManager
+from src.services.interaction_log import interaction_log
+from src.services.onboarding_handler import handle_onboarding
+# Importação completa dos Handlers para o roteamento de estado
+from src.services.demand_handler import handle_problem_confirmation, handle_create_demand_decision, handle_demand_choice, handle_demand_drafting
+from src.services.question_action_handler import handle_question_action_choice
+from src.services.demand_support_handler import handle_demand_support_choice
+from src.services.question_handler import handle_question
+from src.services.demand_investigation_handler import investigation_handler
+# Import V2 Flow (sem IA para textos simples)
+from src.services.demand_flow_v2 import start_demand_flow, process_demand_step, DemandFlowStates
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyClassification:
+    """
+    Classificação do RouterAgent calculada sob demanda (no máximo uma vez por turno).
+
+    Menus e fluxos guiados não usam a classificação; só os handlers que
+    precisam dela pagam a chamada ao Gemini.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._result: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def resolved(self) -> bool:
+        return self.peek() is not None
+
+    def peek(self) -> Optional[dict]:
+        """Retorna a classificação se já foi calculada, sem disparar a chamada"""
+        if self._result is None and self._task is not None and self._task.done():
+            if not self._task.cancelled() and self._task.exception() is None:
+                self._result = self._task.result()
+        return self._result
+
+    def start(self):
+        """Dispara a classificação em segundo plano (get() aguarda o resultado)"""
+        if self._result is None and self._task is None:
+            self._task = asyncio.create_task(self._classify())
+
+    def cancel(self):
+        """Descarta uma classificação especulativa que o turno não vai usar"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            metrics.inc("classification_speculative_cancelled_total")
+
+    async def _classify(self) -> dict:
+        router = RouterAgent()
+        with metrics.timer("webhook_stage_seconds", stage="classification"):
+            result = await router.classify_and_extract(self.text)
+        logger.info(f"Classification: {result}")
+        return result
+
+    async def get(self) -> dict:
+        if self._result is None:
+            self.start()
+            self._result = await self._task
+        return self._result
+
+
+@dataclass
+class TurnContext:
+    """Dados de um turno repassados aos handlers de estado"""
+    phone: str
+    text: str
+    user: User
+    state: ConversationState
+    classification: LazyClassification
+    db: AsyncSession
+
+
+@dataclass
+class InboundMessage:
+    """Uma mensagem recebida (texto ou transcrição de áudio)"""
+    text: str
+    msg_type: str = "text"
+    audio_duration: Optional[float] = None
+    transcription_tier: Optional[str] = None
+
+
+def merge_turn_text(messages: List[InboundMessage]) -> str:
+    """Junta as mensagens de uma rajada em um único texto, na ordem de chegada"""
+    return "\n".join(m.text.strip() for m in messages if m.text and m.text.strip())
+
+
+async def process_turn(
+    phone: str,
+    messages: List[InboundMessage]
+) -> str:
+    """
+    Processa um turno da conversa e retorna o texto de resposta.
+
+    Um turno normalmente tem uma única mensagem; com debounce ativo, pode
+    reunir várias mensagens enviadas em sequência pelo mesmo telefone
+    (classificadas juntas, mas registradas uma a uma em `interactions`).
+
+    Mensagens do mesmo telefone são serializadas (phone_lock) para que
+    leituras/escritas do ConversationState não se sobreponham.
+
+    Args:
+        phone: Telefone do remetente (formato do WhatsApp, ex: 5511999999999@c.us)
+        messages: Mensagens do turno, em ordem de chegada
+
+    Returns:
+        str: Mensagem de resposta para o usuário
+
+    Raises:
+        PhoneLockTimeout: se outra mensagem do mesmo telefone segurar o lock por tempo demais
+        Exception: erros inesperados sobem para o chamador decidir (erro genérico ou retry)
+    """
+    with metrics.timer("webhook_turn_seconds"):
+        async with phone_lock(phone), AsyncSessionLocal() as db:
+            return await _route_turn(phone, messages, db)
+
+
+# ============================================================================
+# LOG DE INTERAÇÕES (em lote, ver interaction_log)
+# ============================================================================
+
+def _interaction_rows(
+    phone: str,
+    user: Optional[User],
+    messages: List[InboundMessage],
+    classification: Optional[dict]
+) -> List[Dict[str, Any]]:
+    """Uma linha de `interactions` por mensagem original"""
+    return [
+        {
+            "phone": phone,
+            "user_id": user.id if user else None,
+            "message_type": message.msg_type,
+            "original_message": message.text if message.msg_type == "text" else None,
+            "transcription": message.text if message.msg_type == "audio" else None,
+            "audio_duration_seconds": message.audio_duration,
+            "transcription_tier": message.transcription_tier,
+            "classification": (classification or {}).get("classification"),
+            "extracted_data": classification
+        }
+        for message in messages
+    ]
+
+
+async def drain_interaction_logs():
+    """Grava as interações ainda no buffer (chamado no shutdown)"""
+    await interaction_log.close()
+
+
+# ============================================================================
+# HANDLERS DE ESTADO (despacho determinístico, sem classificação)
+# ============================================================================
+
+async def _handle_v2_step(ctx: TurnContext) -> str:
+    # NOVO FLUXO V2 (Step-by-step sem IA)
+    logger.info(f"Handling V2 demand flow: {ctx.state.current_stage}")
+    return await process_demand_step(
+        phone=ctx.phone,
+        text=ctx.text,
+        current_state=ctx.state.current_stage,
+        state_context=ctx.state.context_data,
+        db=ctx.db
+    )
+
+
+async def _handle_help_type_menu(ctx: TurnContext) -> str:
+    # Menu de escolha de tipo de ajuda
+    choice = ctx.text.strip()
+    state_manager = AsyncConversationStateManager()
+
+    if choice == '1':
+        # Iniciar fluxo de criação de demanda
+        logger.info(f"User chose to create demand: {ctx.user.id}")
+        await state_manager.clear_state(ctx.phone, ctx.db)
+        return await start_demand_flow(ctx.phone, ctx.db)
+
+    if choice == '2':
+        # Ver demandas próximas (TODO: implementar busca por localização)
+        logger.info(f"User wants to see nearby demands: {ctx.user.id}")
+        await state_manager.clear_state(ctx.phone, ctx.db)
+        return (
+            "🔍 *Buscar demandas próximas*\n\n"
+            "Esta funcionalidade estará disponível em breve!\n\n"
+            "Por enquanto, você pode:\n"
+            "• Criar uma nova demanda (digite *1*)\n"
+            "• Tirar uma dúvida (digite *3*)"
+        )
+
+    if choice == '3':
+        # Tirar dúvida
+        logger.info(f"User wants to ask question: {ctx.user.id}")
+        await state_manager.clear_state(ctx.phone, ctx.db)
+        await state_manager.set_state(ctx.phone, 'asking_question', {}, ctx.db)
+        return (
+            "❓ *Tirar Dúvida*\n\n"
+            "Faça sua pergunta sobre:\n"
+            "• Leis municipais ou estaduais\n"
+            "• Projetos de lei em tramitação\n"
+            "• Serviços públicos\n"
+            "• Como funciona a Câmara/Assembleia\n\n"
+            "Digite sua pergunta:"
+        )
+
+    return (
+        "❌ Opção inválida.\n\n"
+        "Digite *1*, *2* ou *3*"
+    )
+
+
+async def _handle_law_found_menu(ctx: TurnContext) -> str:
+    # Estado quando encontrou lei vigente
+    choice = ctx.text.strip()
+    state_manager = AsyncConversationStateManager()
+
+    if choice == '1':
+        # Criar demanda comunitária mesmo tendo lei
+        logger.info(f"User chose to create demand despite existing law: {ctx.user.id}")
+        await state_manager.clear_state(ctx.phone, ctx.db)
+        return await start_demand_flow(ctx.phone, ctx.db)
+
+    if choice == '2':
+        # Orientação completa
+        logger.info(f"User wants full guidance: {ctx.user.id}")
+        await state_manager.clear_state(ctx.phone, ctx.db)
+        return (
+            "📋 *Orientação Completa*\n\n"
+            "Em breve você terá acesso a:\n"
+            "• Passo a passo detalhado\n"
+            "• Modelos de reclamação\n"
+            "• Contatos dos órgãos\n"
+            "• Exemplos de sucesso\n\n"
+            "Por enquanto, use as informações que já te passei para exercer seu direito! 💪"
+        )
+
+    if choice == '3':
+        # Nada por enquanto
+        logger.info(f"User understood their rights: {ctx.user.id}")
+        await state_manager.clear_state(ctx.phone, ctx.db)
+        return (
+            "✅ Perfeito! Agora você conhece seus direitos.\n\n"
+            "Se precisar de ajuda no futuro, é só me chamar! 💙"
+        )
+
+    return (
+        "❌ Opção inválida.\n\n"
+        "Digite *1*, *2* ou *3*"
+    )
+
+
+async def _handle_asking_question(ctx: TurnContext) -> str:
+    # Estado de pergunta ativa (o handler de dúvida usa tema/keywords da classificação)
+    logger.info(f"Processing user question: {ctx.user.id}")
+    await AsyncConversationStateManager().clear_state(ctx.phone, ctx.db)
+
+    return await handle_question(
+        user_id=str(ctx.user.id),
+        phone=ctx.phone,
+        text=ctx.text,
+        classification=await ctx.classification.get(),
+        user_location=ctx.user.location_primary,
+        db=ctx.db
+    )
+
+
+def _legacy_handler(handler: Callable, input_arg: str, with_location: bool = False):
+    """Adapta um handler do FLUXO V1 LEGADO (mantido para compatibilidade) ao despacho"""
+
+    async def dispatch(ctx: TurnContext) -> str:
+        logger.info(f"Handling state: {ctx.state.current_stage}")
+        kwargs = {
+            "user_id": str(ctx.user.id),
+            "phone": ctx.phone,
+            "state_context": ctx.state.context_data,
+            "db": ctx.db,
+            input_arg: ctx.text
+        }
+        if with_location:
+            kwargs["user_location"] = ctx.user.location_primary
+        return await handler(**kwargs)
+
+    return dispatch
+
+
+StateHandler = Callable[[TurnContext], Awaitable[Optional[str]]]
+
+# Estados despachados pela tabela que mesmo assim usam a classificação
+CLASSIFIED_STATES = {'asking_question'}
+
+# Estágio -> handler. Todos são determinísticos exceto 'asking_question',
+# que pede a classificação explicitamente.
+STATE_DISPATCH: Dict[str, StateHandler] = {
+    DemandFlowStates.COLLECTING_DESCRIPTION: _handle_v2_step,
+    DemandFlowStates.COLLECTING_LOCATION: _handle_v2_step,
+    DemandFlowStates.COLLECTING_CATEGORY: _handle_v2_step,
+    DemandFlowStates.CONFIRMING: _handle_v2_step,
+    'choosing_help_type': _handle_help_type_menu,
+    'law_found': _handle_law_found_menu,
+    'asking_question': _handle_asking_question,
+    'drafting_demand': _legacy_handler(handle_demand_drafting, 'text'),
+    'confirming_problem': _legacy_handler(handle_problem_confirmation, 'confirmation_text'),
+    'asking_create_demand': _legacy_handler(handle_create_demand_decision, 'decision_text'),
+    'choosing_similar_or_new': _legacy_handler(handle_demand_choice, 'text'),
+    'awaiting_demand_choice': _legacy_handler(handle_demand_choice, 'text'),  # Mantido por compatibilidade
+    'choosing_demand_action_after_question': _legacy_handler(handle_question_action_choice, 'text', with_location=True),
+    'choosing_demand_to_support': _legacy_handler(handle_demand_support_choice, 'text'),
+}
+
+
+# ============================================================================
+# ROTEAMENTO POR INTENÇÃO (usa a classificação)
+# ============================================================================
+
+async def _route_by_intent(ctx: TurnContext) -> str:
+    """Sem estado ativo (ou estado sem resposta): roteia pela classificação do RouterAgent"""
+    writer = WriterAgent()
+    user, phone, text, db = ctx.user, ctx.phone, ctx.text, ctx.db
+    classification_result = await ctx.classification.get()
+    classification = classification_result.get('classification')
+
+    # Tratamento de ONBOARDING (Saudação) para usuário ativo
+    if classification == 'ONBOARDING':
+        logger.info(f"Active user greeting: {user.id}")
+        return await writer.welcome_message(is_new_user=False)
+
+    # Tratamento de DEMANDA (mostra opções primeiro)
+    if classification == 'DEMANDA':
+        logger.info(f"User mentioned a problem: {user.id}")
+
+        # Enviar feedback imediato ao usuário
+        feedback_message = "🔍 *Aguarde um momento...*\n\nEstou pesquisando leis, projetos e demandas relacionadas ao seu problema."
+
+        # Tentar enviar feedback via WhatsApp (não bloqueia se falhar)
+        try:
+            from src.services.whatsapp_service import WhatsAppService
+            await WhatsAppService.send_message(phone.replace('@c.us', ''), feedback_message)
+        except Exception as e:
+            logger.warning(f"Could not send feedback message: {e}")
+
+        # NOVO FLUXO: Investigação completa antes de apresentar opções
+        response_text = await investigation_handler.investigate_and_present_options(
+            user_text=text,
+            classification_result=classification_result,
+            user_location=user.location_primary,
+            db=db
+        )
+
+        logger.info(f"Investigation result length: {len(response_text)} chars")
+        logger.info(f"Investigation result preview: {response_text[:200]}...")
+        logger.info(f"First char (repr): {repr(response_text[0])} | Starts with 🎯: {response_text.startswith('🎯')}")
+
+        # IMPORTANTE: Salvar contexto SOMENTE se não encontrou lei vigente
+        # (Lei vigente tem opções diferentes: criar demanda, orientação, nada)
+        state_manager = AsyncConversationStateManager()
+
+        # Detectar se é resposta de lei vigente (começa com 🎯)
+        if response_text.startswith("🎯"):
+            logger.info("Found existing law - setting state: law_found")
+            await state_manager.set_state(phone, 'law_found', {'original_text': text, 'response': response_text}, db)
+        else:
+            logger.info("No law found - setting state: choosing_help_type")
+            await state_manager.set_state(phone, 'choosing_help_type', {'original_text': text}, db)
+
+        return response_text
+
+    # Tratamento de DUVIDA (perguntas sobre legislação)
+    if classification == 'DUVIDA':
+        return await handle_question(
+            user_id=str(user.id), phone=phone, text=text,
+            classification=classification_result, user_location=user.location_primary,
+            db=db
+        )
+
+    # Outros tipos de mensagem (OUTRO, interrupção de fluxo sem resposta)
+    logger.warning(f"Unrecognized classification or fallback for active user: {classification}")
+    # Fallback com opções
+    return await writer.ask_for_help_options()
+
+
+async def _fetch_state(phone: str) -> Optional[ConversationState]:
+    """Busca o estado em uma sessão assíncrona própria, em paralelo com a busca do usuário"""
+    async with AsyncSessionLocal() as db:
+        return await AsyncConversationStateManager().get_state(phone, db)
+
+
+def _needs_classification(user: Optional[User], stage: Optional[str]) -> bool:
+    """Indica se o turno vai usar a classificação (para dispará-la o quanto antes)"""
+    if not user or user.status == 'onboarding_incomplete':
+        return False
+    return stage not in STATE_DISPATCH or stage in CLASSIFIED_STATES
+
+
+async def _route_turn(
+    phone: str,
+    messages: List[InboundMessage],
+    db: AsyncSession
+) -> str:
+    text = merge_turn_text(messages)
+
+    if len(messages) > 1:
+        logger.info(f"Merged {len(messages)} messages from {phone} into one turn")
+    metrics.observe("webhook_turn_messages", len(messages))
+
+    classification = LazyClassification(text)
+    if not settings.STATE_DISPATCH_ENABLED or settings.SPECULATIVE_CLASSIFICATION:
+        # Gemini em paralelo com as consultas ao banco
+        classification.start()
+
+    # 2. VERIFICAÇÃO DE ESTADO E USUÁRIO (Profiler) - usuário (na sessão do turno) e estado em paralelo
+    profiler = ProfilerAgent()
+
+    try:
+        with metrics.timer("webhook_stage_seconds", stage="user_state_lookup"):
+            user, current_state = await asyncio.gather(
+                profiler.find_user_async(phone, db),
+                _fetch_state(phone)
+            )
+    except BaseException:
+        # Falha (ou cancelamento) nas consultas: a classificação especulativa não será usada
+        classification.cancel()
+        raise
+    stage = current_state.current_stage if current_state else None
+
+    # 3. CLASSIFICAÇÃO (Agente Roteador) - só quando o turno vai usá-la
+    if not settings.STATE_DISPATCH_ENABLED:
+        await classification.get()
+    elif _needs_classification(user, stage):
+        classification.start()
+    else:
+        classification.cancel()
+
+    # 4. ROTEAMENTO DE FLUXO
+    routing_start = time.perf_counter()
+
+    try:
+        # FLUXO A: Usuário Novo ou Onboarding Incompleto (não usa a classificação)
+        if not user or user.status == 'onboarding_incomplete':
+            logger.info(f"Routing to onboarding for {phone}")
+            response_text = await handle_onboarding(
+                phone, text, classification.peek() or {},
+                user, current_state, db
+            )
+
+        # FLUXO B: Usuário Ativo (Já cadastrado)
+        else:
+            logger.info(f"Routing to Active/Demand Flow for {phone}")
+            ctx = TurnContext(
+                phone=phone,
+                text=text,
+                user=user,
+                state=current_state,
+                classification=classification,
+                db=db
+            )
+
+            # --- PRIORIDADE 1: FLUXO DE ESTADO (MULTI-TURN) ---
+            response_text = None
+            handler = STATE_DISPATCH.get(stage) if stage else None
+            if handler:
+                response_text = await handler(ctx)
+
+            # --- PRIORIDADE 2: SEM ESTADO ATIVO OU RESPOSTA PENDENTE ---
+            if not response_text:
+                response_text = await _route_by_intent(ctx)
+
+        metrics.observe("webhook_stage_seconds", time.perf_counter() - routing_start, stage="routing")
+
+    finally:
+        # 5. SALVAR INTERAÇÃO (LOG) - uma linha por mensagem original, fora do caminho crítico
+        result = classification.peek()
+        classification.cancel()
+        if result is None:
+            metrics.inc("classification_skipped_total", stage=stage or "onboarding")
+        with metrics.timer("webhook_stage_seconds", stage="interaction_log"):
+            await interaction_log.record(_interaction_rows(phone, user, messages, result))
+
+    return response_text
@@ -1,10 +1,10 @@
 import logging
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.models.user import User
 from src.models.conversation_state import ConversationState
 from src.agents.profiler import ProfilerAgent
-from src.core.state_manager import ConversationStateManager
+from src.core.state_manager import AsyncConversationStateManager
 from src.agents.writer import WriterAgent # NOVO
 
 logger = logging.getLogger(__name__)
@@ -15,7 +15,7 @@ async def handle_onboarding(
     classification: dict,
     user: Optional[User],
     state: Optional[ConversationState],
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Gerencia todo o fluxo de onboarding do usuário.
@@ -29,7 +29,7 @@ async def handle_onboarding(
     """
     
     profiler = ProfilerAgent()
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent() # INSTANCIA O AGENTE REDATOR
     
     # Estado 1: Novo usuário ou sem estado
@@ -37,7 +37,7 @@ async def handle_onboarding(
         # Substitui string hardcoded por chamada ao WriterAgent
         welcome_msg = await writer.welcome_message(is_new_user=True)
         
-        state_manager.set_state(phone, 'awaiting_location', {}, db)
+        await state_manager.set_state(phone, 'awaiting_location', {}, db)
         logger.info(f"Onboarding started for {phone}")
         return welcome_msg
     
@@ -77,7 +77,7 @@ async def handle_onboarding(
             'location_data': location_data,
             'geocoded': geocoded
         }
-        state_manager.set_state(phone, 'confirming_location', context, db)
+        await state_manager.set_state(phone, 'confirming_location', context, db)
         
         # Prepara dados para o WriterAgent
         address_for_writer = {
@@ -123,7 +123,7 @@ async def handle_onboarding(
                     # Update existing user
                     user.location_primary = location_json
                     user.status = 'active'
-                    db.commit()
+                    await db.commit()
                     logger.info(f"Updated user {user.id} location")
                 else:
                     # Create new user
@@ -131,7 +131,7 @@ async def handle_onboarding(
                     logger.info(f"Created new user {user.id}")
                 
                 # Clear conversation state
-                state_manager.clear_state(phone, db)
+                await state_manager.clear_state(phone, db)
                 
                 # Substitui string hardcoded por chamada ao WriterAgent
                 return await writer.onboarding_complete()
@@ -144,7 +144,7 @@ async def handle_onboarding(
         elif is_negative:
             # User said no, ask for location again
             logger.info(f"Location rejected by {phone}, asking again")
-            state_manager.set_state(phone, 'awaiting_location', {}, db)
+            await state_manager.set_state(phone, 'awaiting_location', {}, db)
             # Substitui string hardcoded por chamada ao WriterAgent
             return await writer.ask_location_retry()
         
@@ -156,6 +156,6 @@ async def handle_onboarding(
     
     # Fallback - should not reach here in normal flow
     logger.warning(f"Unexpected state in onboarding: {state.current_stage if state else 'None'} for {phone}")
-    state_manager.set_state(phone, 'awaiting_location', {}, db)
+    await state_manager.set_state(phone, 'awaiting_location', {}, db)
     # Substitui string hardcoded por chamada ao WriterAgent
     return await writer.ask_location_retry()
\ No newline at end of file
@@ -1,12 +1,11 @@
-from src.core.state_manager import ConversationStateManager
+from src.core.state_manager import AsyncConversationStateManager
 # Agora importamos handle_demand_creation diretamente para iniciar a entrevista
 from src.services.demand_handler import handle_demand_creation
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
-import google.generativeai as genai
-from src.core.config import settings
+from src.core.gemini import gemini_client
 from src.models.demand import Demand
-from src.services.similarity_service import SimilarityService
 from src.services.embedding_service import EmbeddingService
 from src.agents.writer import WriterAgent
 
@@ -19,9 +18,6 @@ async def _reformulate_question_to_demand(question: str, theme: str, keywords: l
     logger.info(f"🔄 Starting reformulation: question='{question}', theme='{theme}', keywords={keywords}")
     
     try:
-        genai.configure(api_key=settings.GOOGLE_GEMINI_API_KEY)
-        model = genai.GenerativeModel(settings.GEMINI_MODEL_FLASH)
-        
         prompt = f"""Você é um assistente que ajuda cidadãos a criar demandas por melhorias e legislação.
 
 O usuário fez a seguinte pergunta sobre legislação:
@@ -50,13 +46,13 @@ Demanda: "Gostaria que estabelecimentos comerciais fossem obrigados a fornecer 
 Agora reformule a pergunta do usuário:"""
 
         logger.debug("📡 Calling Gemini API for reformulation...")
-        response = await model.generate_content_async(prompt)
+        response_text = await gemini_client.generate_content(prompt, call_site="question_reformulation")
         
-        if not response or not response.text:
+        if not response_text:
             logger.error("❌ Gemini returned empty response")
             return question
             
-        reformulated = response.text.strip()
+        reformulated = response_text.strip()
         
         # Remove quotes if present
         reformulated = reformulated.strip('"\'')
@@ -75,13 +71,13 @@ async def handle_question_action_choice(
     text: str,
     state_context: dict,
     user_location: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Handle user's choice after seeing PLs and similar demands from a question
     """
 
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent()
     choice = text.strip().lower()
 
@@ -118,7 +114,7 @@ async def handle_question_action_choice(
             
             # 2. INICIA O FLUXO DE ENTREVISTA DINÂMICA
             # Limpa o estado atual antes de chamar o próximo handler principal (para evitar conflito de stages)
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
 
             return await handle_demand_creation(
                 user_id=user_id,
@@ -139,7 +135,7 @@ async def handle_question_action_choice(
             
             # Lógica para carregar demandas e IDs (mantido igual)
             for demand_id in similar_demands_context:
-                demand = db.query(Demand).filter(Demand.id == demand_id).first()
+                demand = (await db.execute(select(Demand).where(Demand.id == demand_id))).scalars().first()
                 if demand:
                     demands_data.append({
                         'id': str(demand.id),
@@ -151,12 +147,12 @@ async def handle_question_action_choice(
                     available_demands_ids.append(str(demand.id))
 
             if not demands_data:
-                state_manager.clear_state(phone, db)
+                await state_manager.clear_state(phone, db)
                 return await writer.demand_not_found()
 
             response = await writer.show_similar_demands_for_support(demands=demands_data)
 
-            state_manager.set_state(
+            await state_manager.set_state(
                 phone=phone,
                 stage="choosing_demand_to_support",
                 context={
@@ -171,7 +167,7 @@ async def handle_question_action_choice(
         # Opção de Conversar (3 ou 4)
         elif choice in converse_choices:
             logger.info("💬 User chose to continue conversation")
-            state_manager.clear_state(phone, db)
+            await state_manager.clear_state(phone, db)
 
             return await writer.converse_only_message()
 
@@ -183,5 +179,5 @@ async def handle_question_action_choice(
 
     except Exception as e:
         logger.error(f"❌ Error handling question action choice: {e}", exc_info=True)
-        state_manager.clear_state(phone, db)
+        await state_manager.clear_state(phone, db)
         return await writer.generic_error_response()
\ No newline at end of file
@@ -1,10 +1,9 @@
 from typing import List
 from src.agents.detective import DetectiveAgent
-from src.services.similarity_service import SimilarityService
 from src.services.embedding_service import EmbeddingService
-from src.core.state_manager import ConversationStateManager
+from src.core.state_manager import AsyncConversationStateManager
 from src.agents.writer import WriterAgent  # NOVO
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,7 +14,7 @@ async def handle_question(
     text: str,
     classification: dict,
     user_location: dict,
-    db: Session
+    db: AsyncSession
 ) -> str:
     """
     Processa dúvidas do usuário buscando legislação via Gemini (DetectiveAgent)
@@ -24,7 +23,7 @@ async def handle_question(
 
     # Instancia os serviços e agentes
     detective = DetectiveAgent()
-    state_manager = ConversationStateManager()
+    state_manager = AsyncConversationStateManager()
     writer = WriterAgent()  # INSTANCIAÇÃO
     
     theme = classification.get('theme', 'outros')
@@ -56,7 +55,7 @@ async def handle_question(
         )
 
         # 3. Salvar Estado (para a próxima escolha do usuário)
-        state_manager.set_state(
+        await state_manager.set_state(
             phone=phone,
             stage="choosing_demand_action_after_question",
             context={
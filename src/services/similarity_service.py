@@ -1,10 +1,34 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from src.models.demand import Demand
 import logging
 
 logger = logging.getLogger(__name__)
 
+# O embedding vai como texto e é convertido no banco: funciona igual com
+# psycopg2 e asyncpg (que não tem codec para o tipo vector)
+SIMILAR_DEMANDS_QUERY = text("""
+    SELECT
+        id,
+        title,
+        description,
+        scope_level,
+        theme,
+        location,
+        supporters_count,
+        created_at,
+        1 - (embedding <=> CAST(CAST(:embedding AS TEXT) AS vector)) as similarity
+    FROM demands
+    WHERE
+        status = 'active'
+        AND theme = :theme
+        AND scope_level = :scope_level
+        AND embedding IS NOT NULL
+        AND 1 - (embedding <=> CAST(CAST(:embedding AS TEXT) AS vector)) >= :threshold
+    ORDER BY similarity DESC
+    LIMIT :max_results
+""")
+
 class SimilarityService:
     """Busca demandas similares usando pgvector"""
     
@@ -14,94 +38,81 @@ class SimilarityService:
         theme: str,
         scope_level: int,
         user_location: dict,
-        db: Session,
+        db: AsyncSession,
         similarity_threshold: float = 0.80,
         max_results: int = 5
     ) -> list:
         """
         Busca demandas similares usando busca vetorial
-        
+
         Args:
             embedding: Vetor de embedding da nova demanda
             theme: Tema da demanda (filtro)
             scope_level: Escopo da demanda (filtro)
             user_location: Localização do usuário (para filtro geográfico em Nível 1)
-            db: Sessão do banco
+            db: Sessão assíncrona do banco
             similarity_threshold: Threshold de similaridade cosseno (0.0-1.0)
             max_results: Máximo de resultados
-        
+
         Returns:
             list: Lista de demandas similares com score de similaridade
         """
-        
-        # Converter embedding para string PostgreSQL
-        embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-        
-        # Query com sintaxe correta para SQLAlchemy + psycopg2
-        query = text("""
-            SELECT 
-                id,
-                title,
-                description,
-                scope_level,
-                theme,
-                location,
-                supporters_count,
-                created_at,
-                1 - (embedding <=> CAST(:embedding AS vector)) as similarity
-            FROM demands
-            WHERE 
-                status = 'active'
-                AND theme = :theme
-                AND scope_level = :scope_level
-                AND embedding IS NOT NULL
-                AND 1 - (embedding <=> CAST(:embedding AS vector)) >= :threshold
-            ORDER BY similarity DESC
-            LIMIT :max_results
-        """)
-        
         try:
-            # Executar query
-            result = db.execute(
-                query,
-                {
-                    "embedding": embedding_str,
-                    "theme": theme,
-                    "scope_level": scope_level,
-                    "threshold": similarity_threshold,
-                    "max_results": max_results
-                }
+            result = await db.execute(
+                SIMILAR_DEMANDS_QUERY,
+                self._query_params(embedding, theme, scope_level, similarity_threshold, max_results)
             )
-            
-            similar_demands = []
-            for row in result:
-                demand_dict = {
-                    "id": str(row.id),
-                    "title": row.title,
-                    "description": row.description,
-                    "scope_level": row.scope_level,
-                    "theme": row.theme,
-                    "location": row.location,
-                    "supporters_count": row.supporters_count,
-                    "created_at": row.created_at,
-                    "similarity": float(row.similarity)
-                }
-                
-                # Filtro geográfico adicional para Nível 1 (hiper-local)
-                if scope_level == 1:
-                    if self._is_geographically_close(demand_dict['location'], user_location):
-                        similar_demands.append(demand_dict)
-                else:
-                    similar_demands.append(demand_dict)
-            
+            similar_demands = self._collect_results(result, scope_level, user_location)
+
             logger.info(f"✅ Found {len(similar_demands)} similar demands (threshold: {similarity_threshold})")
             return similar_demands
-            
+
         except Exception as e:
             logger.error(f"❌ Error finding similar demands: {e}")
             # Retornar lista vazia em caso de erro
             return []
-    
+
+    def _query_params(
+        self,
+        embedding: list,
+        theme: str,
+        scope_level: int,
+        similarity_threshold: float,
+        max_results: int
+    ) -> dict:
+        # Converter embedding para string PostgreSQL
+        embedding_str = '[' + ','.join(map(str, embedding)) + ']'
+        return {
+            "embedding": embedding_str,
+            "theme": theme,
+            "scope_level": scope_level,
+            "threshold": similarity_threshold,
+            "max_results": max_results
+        }
+
+    def _collect_results(self, rows, scope_level: int, user_location: dict) -> list:
+        similar_demands = []
+        for row in rows:
+            demand_dict = {
+                "id": str(row.id),
+                "title": row.title,
+                "description": row.description,
+                "scope_level": row.scope_level,
+                "theme": row.theme,
+                "location": row.location,
+                "supporters_count": row.supporters_count,
+                "created_at": row.created_at,
+                "similarity": float(row.similarity)
+            }
+
+            # Filtro geográfico adicional para Nível 1 (hiper-local)
+            if scope_level == 1:
+                if self._is_geographically_close(demand_dict['location'], user_location):
+                    similar_demands.append(demand_dict)
+            else:
+                similar_demands.append(demand_dict)
+        return similar_demands
+
     def _is_geographically_close(self, demand_location: dict, user_location: dict, max_distance_km: float = 2.0) -> bool:
         """
         Verifica se localização da demanda está próxima do usuário
@@ -0,0 +1,112 @@
+"""
+Varredura de estados de conversa expirados
+
+Conversas abandonadas ficam em `conversation_states` com o contexto JSONB
+(às vezes o texto inteiro da investigação em 'law_found'). A cada
+STATE_SWEEP_INTERVAL_SECONDS o sweeper apaga os estados expirados (TTL por
+estágio, ver state_ttl) em lotes de STATE_SWEEP_BATCH_SIZE:
+
+    DELETE ... WHERE phone IN (SELECT phone ... LIMIT n FOR UPDATE SKIP LOCKED)
+
+Cada lote é uma transação curta e linhas em uso por outra transação são
+puladas (ficam para a próxima rodada), então a varredura nunca bloqueia um
+turno em andamento. Vários workers podem varrer ao mesmo tempo.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from src.core.config import settings
+from src.core.database import SessionLocal
+from src.core.metrics import metrics
+from src.core.state_ttl import sweep_filters
+from src.models.conversation_state import ConversationState
+
+logger = logging.getLogger(__name__)
+
+
+class StateSweeper:
+    """Remove estados expirados em lotes, em uma task de fundo"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.last_removed: Dict[str, int] = {}
+
+    def sweep(self, db: Session) -> int:
+        """
+        Apaga todos os estados expirados, lote a lote.
+
+        Args:
+            db: Sessão do banco de dados (cada lote é commitado)
+
+        Returns:
+            Total de linhas removidas
+        """
+        removed: Dict[str, int] = {}
+        batch_size = settings.STATE_SWEEP_BATCH_SIZE
+
+        for label, condition in sweep_filters():
+            expired = (
+                select(ConversationState.phone)
+                .where(condition)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            while True:
+                deleted = db.execute(
+                    delete(ConversationState)
+                    .where(ConversationState.phone.in_(expired.scalar_subquery()))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+
+                if deleted:
+                    removed[label] = removed.get(label, 0) + deleted
+                    metrics.inc("conversation_states_expired_total", deleted, stage=label)
+                if deleted < batch_size:
+                    break
+
+        total = sum(removed.values())
+        self.last_removed = removed
+        if total:
+            logger.info(f"🧹 Swept {total} expired conversation states: {removed}")
+        return total
+
+    def start(self):
+        if self._task is not None or not settings.STATE_SWEEP_ENABLED or not sweep_filters():
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._loop())
+        logger.info("🧹 Conversation state sweeper started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self._sweep_with_session)
+            except Exception as e:
+                logger.error(f"Error sweeping conversation states: {e}")
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.STATE_SWEEP_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _sweep_with_session(self) -> int:
+        db = SessionLocal()
+        try:
+            return self.sweep(db)
+        finally:
+            db.close()
+
+
+state_sweeper = StateSweeper()
@@ -0,0 +1,192 @@
+"""
+Cache de transcrições endereçado pelo conteúdo do áudio
+
+A mesma nota de voz costuma ser encaminhada ao bot por vários moradores do
+bairro, e usuários reenviam o áudio quando não recebem resposta. A chave é o
+SHA-256 dos bytes recebidos (+ WHISPER_MODEL): cópias idênticas reaproveitam
+o texto sem passar pelo Whisper.
+
+Só são guardadas transcrições feitas no melhor nível para a duração do
+áudio: um resultado rebaixado pela fila no pico (modelo "fast"/busca gulosa)
+não é reaproveitado, e a próxima cópia transcrita fora do pico substitui
+qualquer entrada rebaixada.
+
+Duas camadas:
+1. LRU + TTL em memória (TRANSCRIPTION_CACHE_SIZE / TRANSCRIPTION_CACHE_TTL_SECONDS)
+2. Tabela `transcription_cache` no Postgres (TRANSCRIPTION_CACHE_PERSIST),
+   compartilhada entre workers e preservada entre deploys
+
+Cópias que chegam enquanto a primeira ainda está sendo transcrita aguardam
+o mesmo resultado (uma única transcrição em andamento por hash, via
+src/core/single_flight.py: cancelar a requisição que a iniciou não derruba
+as cópias que aguardam).
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.database import SessionLocal
+from src.core.metrics import metrics
+from src.core.single_flight import SingleFlight
+from src.models.transcription_cache import TranscriptionCacheEntry
+from src.services.transcription_engine import TranscriptionResult
+from src.services.transcription_policy import choose_tier
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre limpezas de entradas expiradas no banco
+_PURGE_INTERVAL_SECONDS = 3600
+
+
+class TranscriptionCache:
+    """Transcrições por hash do áudio (memória + Postgres)"""
+
+    def __init__(self):
+        self._memory = TTLCache(
+            maxsize=settings.TRANSCRIPTION_CACHE_SIZE,
+            ttl=settings.TRANSCRIPTION_CACHE_TTL_SECONDS
+        )
+        self._in_flight = SingleFlight("transcription")
+        self._last_purge = 0.0
+        metrics.register_gauge("transcription_cache_hit_rate", self.hit_rate)
+
+    @staticmethod
+    def audio_key(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def is_best_tier(result: TranscriptionResult) -> bool:
+        """
+        True se o texto veio do nível que a política usaria com a fila vazia
+        (ex: "full" para áudios longos, "fast" para respostas curtas). Só
+        esses resultados são guardados; None = entrada anterior aos níveis.
+        """
+        return result.tier is None or result.tier == choose_tier(result.file_seconds, 0).name
+
+    def hit_rate(self) -> float:
+        hits = (
+            metrics.get_counter("transcription_cache_requests_total", result="hit_memory")
+            + metrics.get_counter("transcription_cache_requests_total", result="hit_db")
+            + metrics.get_counter("transcription_cache_requests_total", result="hit_in_flight")
+        )
+        total = hits + metrics.get_counter("transcription_cache_requests_total", result="miss")
+        return round(hits / total, 4) if total else 0.0
+
+    async def get_or_transcribe(
+        self,
+        content: bytes,
+        transcribe: Callable[[bytes], Awaitable[TranscriptionResult]]
+    ) -> TranscriptionResult:
+        """
+        Retorna a transcrição do áudio, chamando `transcribe` só em caso de miss.
+        """
+        if not settings.TRANSCRIPTION_CACHE_ENABLED:
+            return await transcribe(content)
+
+        key = self.audio_key(content)
+
+        cached = self._memory.get(key)
+        if cached is not None:
+            metrics.inc("transcription_cache_requests_total", result="hit_memory")
+            return cached
+
+        if key in self._in_flight:
+            metrics.inc("transcription_cache_requests_total", result="hit_in_flight")
+        return await self._in_flight.run(key, lambda: self._load_or_transcribe(key, content, transcribe))
+
+    async def _load_or_transcribe(self, key, content, transcribe) -> TranscriptionResult:
+        if settings.TRANSCRIPTION_CACHE_PERSIST:
+            stored = await asyncio.to_thread(self._load, key)
+            if stored is not None:
+                metrics.inc("transcription_cache_requests_total", result="hit_db")
+                self._memory.set(key, stored)
+                logger.info(f"♻️ Transcription cache hit (db) for audio {key[:12]}")
+                return stored
+
+        metrics.inc("transcription_cache_requests_total", result="miss")
+        result = await transcribe(content)
+        if not self.is_best_tier(result):
+            # Nível rebaixado pela fila: não fica 7 dias servindo cópias; a
+            # próxima cópia fora do pico é transcrita de novo e guardada
+            metrics.inc("transcription_cache_skipped_total", tier=result.tier)
+            return result
+        self._memory.set(key, result)
+
+        if settings.TRANSCRIPTION_CACHE_PERSIST:
+            try:
+                await asyncio.to_thread(self._store, key, result)
+            except Exception as e:
+                # O cache é best-effort: a transcrição já foi feita
+                logger.warning(f"Could not persist transcription {key[:12]}: {e}")
+        return result
+
+    def _load(self, key: str) -> Optional[TranscriptionResult]:
+        db = SessionLocal()
+        try:
+            self._purge_expired(db)
+
+            entry = db.query(TranscriptionCacheEntry).filter(
+                TranscriptionCacheEntry.audio_sha256 == key,
+                TranscriptionCacheEntry.model == settings.WHISPER_MODEL,
+                TranscriptionCacheEntry.created_at > func.now() - timedelta(seconds=settings.TRANSCRIPTION_CACHE_TTL_SECONDS)
+            ).first()
+            if entry is None:
+                return None
+            result = TranscriptionResult(entry.text, entry.audio_seconds, entry.file_seconds, entry.tier)
+            if not self.is_best_tier(result):
+                return None  # gravada em nível rebaixado: será substituída pela próxima transcrição
+
+            entry.hit_count += 1
+            entry.last_hit_at = func.now()
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def _store(self, key: str, result: TranscriptionResult):
+        db = SessionLocal()
+        try:
+            stmt = insert(TranscriptionCacheEntry).values(
+                audio_sha256=key,
+                model=settings.WHISPER_MODEL,
+                text=result.text,
+                audio_seconds=result.audio_seconds,
+                file_seconds=result.file_seconds,
+                tier=result.tier
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[TranscriptionCacheEntry.audio_sha256, TranscriptionCacheEntry.model],
+                set_={
+                    "text": stmt.excluded.text,
+                    "audio_seconds": stmt.excluded.audio_seconds,
+                    "file_seconds": stmt.excluded.file_seconds,
+                    "tier": stmt.excluded.tier,
+                    "created_at": func.now()
+                }
+            )
+            db.execute(stmt)
+            db.commit()
+        finally:
+            db.close()
+
+    def _purge_expired(self, db):
+        if time.monotonic() - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+
+        deleted = db.query(TranscriptionCacheEntry).filter(
+            TranscriptionCacheEntry.created_at < func.now() - timedelta(seconds=settings.TRANSCRIPTION_CACHE_TTL_SECONDS)
+        ).delete(synchronize_session=False)
+        db.commit()
+        if deleted:
+            logger.info(f"🧹 Purged {deleted} expired transcriptions")
+
+
+transcription_cache = TranscriptionCache()
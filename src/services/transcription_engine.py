@@ -0,0 +1,562 @@
+"""
+Motor de transcrição (Faster-Whisper) com concorrência limitada
+
+A transcrição roda em um executor dedicado, fora do thread pool padrão do
+asyncio (que continua livre para banco/HTTP):
+
+- WHISPER_WORKER_MODE=thread: um WhisperModel com num_workers=WHISPER_WORKERS
+  atendido por WHISPER_WORKERS threads
+- WHISPER_WORKER_MODE=process: WHISPER_WORKERS processos, cada um com o seu
+  modelo (isola o GIL e a memória do CTranslate2)
+
+Cada worker usa WHISPER_CPU_THREADS threads do CTranslate2 (0 = núcleos /
+workers), de modo que workers x threads não ultrapassa a CPU.
+
+Até WHISPER_QUEUE_SIZE áudios aguardam um worker livre; além disso a chamada
+levanta TranscriptionQueueFull e quem chamou decide entre rejeitar (503) ou
+adiar (fila durável).
+
+Com WHISPER_BATCHING_ENABLED, cada áudio passa pelo VAD ao chegar e seus
+trechos de fala ficam pendentes por até WHISPER_BATCH_WINDOW_MS; os trechos
+de todos os áudios pendentes são transcritos juntos em um único lote
+(BatchedInferencePipeline, WHISPER_BATCH_SIZE trechos por passo do modelo) e
+o texto de cada trecho volta para o áudio de origem.
+
+Áudios longos (>= WHISPER_PARALLEL_MIN_SECONDS) com mais de um worker são
+cortados pelo VAD em trechos de fala, agrupados em partes contíguas (uma por
+worker) e as partes são transcritas em paralelo; os textos voltam em ordem.
+
+Modelo e beam de cada transcrição (ou lote) vêm de transcription_policy.py,
+conforme a duração do áudio e a fila no momento em que um worker o assume.
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+import av
+import numpy as np
+from faster_whisper import BatchedInferencePipeline, decode_audio
+from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps
+from src.core.config import settings
+from src.core.metrics import metrics
+from src.core.whisper_model import whisper_singleton
+from src.services.transcription_policy import TranscriptionTier, choose_tier, tiers
+
+logger = logging.getLogger(__name__)
+
+# Taxa de amostragem esperada pelo Whisper
+SAMPLE_RATE = 16000
+
+TRANSCRIBE_OPTIONS = {
+    "language": "pt",
+    "beam_size": 5,
+    "vad_filter": True,
+}
+
+# Trechos de fala de até 30 s (janela do Whisper), como no modo batched do faster-whisper
+CHUNK_SECONDS = 30
+VAD_OPTIONS = VadOptions(max_speech_duration_s=CHUNK_SECONDS, min_silence_duration_ms=160)
+
+AudioInput = Union[bytes, np.ndarray, str]
+
+
+class TranscriptionQueueFull(Exception):
+    """Todos os workers ocupados e a fila de espera cheia"""
+
+
+@dataclass
+class TranscriptionResult:
+    text: str
+    audio_seconds: float  # duração das amostras transcritas
+    file_seconds: float  # duração declarada no cabeçalho do arquivo
+    tier: Optional[str] = None  # nível de qualidade usado (transcription_policy)
+
+
+def _header_duration(content: bytes) -> Optional[float]:
+    """Duração do áudio lida do cabeçalho do container (sem decodificar)"""
+    try:
+        with av.open(io.BytesIO(content), metadata_errors="ignore") as container:
+            if container.duration:
+                return container.duration / av.time_base
+
+            stream = container.streams.audio[0]
+            if stream.duration and stream.time_base:
+                return float(stream.duration * stream.time_base)
+    except Exception as e:
+        logger.warning(f"Could not read audio duration from header: {e}")
+    return None
+
+
+def decode_audio_bytes(content: bytes) -> Tuple[np.ndarray, float]:
+    """
+    Decodifica o upload (Ogg/Opus do WhatsApp) uma única vez, em memória,
+    para PCM float32 mono 16 kHz - o formato que o WhisperModel consome.
+
+    Returns:
+        (amostras, duração do arquivo em segundos)
+    """
+    duration = _header_duration(content)
+    audio = decode_audio(io.BytesIO(content), sampling_rate=SAMPLE_RATE)
+
+    if duration is None:
+        duration = len(audio) / SAMPLE_RATE
+    return audio, duration
+
+
+def _to_samples(audio: AudioInput) -> Tuple[np.ndarray, float]:
+    if isinstance(audio, bytes):
+        return decode_audio_bytes(audio)
+    if isinstance(audio, str):
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    return audio, len(audio) / SAMPLE_RATE
+
+
+def _transcribe_samples(samples: np.ndarray, tier: TranscriptionTier, **options) -> str:
+    model = whisper_singleton.get_model(tier.model, tier.compute_type)
+    segments, info = model.transcribe(samples, **{**TRANSCRIBE_OPTIONS, "beam_size": tier.beam_size, **options})
+    return " ".join([segment.text for segment in segments]).strip()
+
+
+def _transcribe_with(audio: AudioInput, queue_depth: int) -> TranscriptionResult:
+    """Decodifica (se preciso), escolhe o nível de qualidade e transcreve; roda dentro de um worker"""
+    audio, file_seconds = _to_samples(audio)
+    tier = choose_tier(file_seconds, queue_depth)
+    text = _transcribe_samples(audio, tier)
+    return TranscriptionResult(text, len(audio) / SAMPLE_RATE, file_seconds, tier.name)
+
+
+def _transcribe_part(samples: np.ndarray, tier: TranscriptionTier) -> str:
+    """Transcreve uma parte de um áudio longo (VAD já aplicado); roda dentro de um worker"""
+    return _transcribe_samples(samples, tier, vad_filter=False)
+
+
+def _transcribe_in_thread(audio: AudioInput, queue_depth: int) -> TranscriptionResult:
+    return _transcribe_with(audio, queue_depth)
+
+
+def _warmup_worker() -> Tuple[Optional[float], float]:
+    """Carrega (se preciso) e aquece o modelo do worker; retorna (carga, aquecimento) em segundos"""
+    whisper_singleton.get_model()
+    fast = tiers()["fast"]
+    if settings.WHISPER_ADAPTIVE_QUALITY and (fast.model or fast.compute_type):
+        # Modelo do nível "fast" também carregado no startup, não no primeiro áudio curto
+        whisper_singleton.get_model(fast.model, fast.compute_type)
+    return whisper_singleton.load_seconds, whisper_singleton.warmup()
+
+
+# Modo process: tempos do aquecimento feito no initializer e barreira do warmup
+_process_warmup: Optional[Tuple[Optional[float], float]] = None
+_warmup_barrier = None
+_WARMUP_BARRIER_TIMEOUT = 600
+
+
+def _init_process_worker(barrier):
+    # Carrega e aquece o modelo na inicialização do processo, não na primeira
+    # mensagem: nenhum processo do pool recebe áudio antes de estar aquecido
+    global _process_warmup, _warmup_barrier
+    _warmup_barrier = barrier
+    _process_warmup = _warmup_worker()
+
+
+def _warmup_report() -> Tuple[Optional[float], float]:
+    """
+    Tempos do aquecimento deste processo. Só retorna quando todos os processos
+    chegaram à barreira, então cada processo executa exatamente uma tarefa.
+    """
+    try:
+        _warmup_barrier.wait(timeout=_WARMUP_BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        logger.warning("Whisper warmup barrier broken (worker slow to start)")
+    return _process_warmup
+
+
+def _transcribe_in_process(audio: AudioInput, queue_depth: int) -> TranscriptionResult:
+    return _transcribe_with(audio, queue_depth)
+
+
+@dataclass
+class _PreparedAudio:
+    """Áudio decodificado e cortado pelo VAD (lote ou transcrição em partes)"""
+    chunks: List[np.ndarray]
+    audio_seconds: float
+    file_seconds: float
+
+
+def _prepare_chunks(audio: AudioInput) -> _PreparedAudio:
+    """Decodifica e separa os trechos de fala (até CHUNK_SECONDS cada)"""
+    samples, file_seconds = _to_samples(audio)
+    speech = get_speech_timestamps(samples, VAD_OPTIONS)
+    chunks, _ = collect_chunks(samples, speech, max_duration=CHUNK_SECONDS)
+    return _PreparedAudio(
+        chunks=[chunk for chunk in chunks if len(chunk) > 0],
+        audio_seconds=len(samples) / SAMPLE_RATE,
+        file_seconds=file_seconds
+    )
+
+
+def _split_parts(chunks: List[np.ndarray], num_parts: int) -> List[np.ndarray]:
+    """
+    Agrupa trechos de fala consecutivos em até num_parts partes de duração
+    parecida, sem reordenar (cada parte termina em uma fronteira do VAD).
+    """
+    num_parts = max(1, min(num_parts, len(chunks)))
+    target = sum(len(chunk) for chunk in chunks) / num_parts
+
+    parts, current, current_len = [], [], 0
+    for index, chunk in enumerate(chunks):
+        current.append(chunk)
+        current_len += len(chunk)
+        chunks_left = len(chunks) - index - 1
+        parts_left = num_parts - len(parts) - 1
+        if parts_left > 0 and (current_len >= target or chunks_left == parts_left):
+            parts.append(np.concatenate(current))
+            current, current_len = [], 0
+
+    if current:
+        parts.append(np.concatenate(current))
+    return parts
+
+
+_pipelines = threading.local()
+
+
+def _transcribe_batch(chunk_lists: List[List[np.ndarray]], tier: TranscriptionTier) -> List[str]:
+    """
+    Transcreve os trechos de vários áudios em um único lote.
+
+    Os trechos são concatenados e passados como clip_timestamps (VAD já
+    aplicado); cada segmento volta para o áudio dono do trecho em que começa.
+
+    Returns:
+        Um texto por item de chunk_lists, na mesma ordem
+    """
+    cache = getattr(_pipelines, "by_model", None)
+    if cache is None:
+        cache = _pipelines.by_model = {}
+    key = (tier.model, tier.compute_type)
+    pipeline = cache.get(key)
+    if pipeline is None:
+        pipeline = cache[key] = BatchedInferencePipeline(whisper_singleton.get_model(tier.model, tier.compute_type))
+
+    clips, owners, pieces = [], [], []
+    offset = 0
+    for owner, chunks in enumerate(chunk_lists):
+        for chunk in chunks:
+            clips.append({"start": offset / SAMPLE_RATE, "end": (offset + len(chunk)) / SAMPLE_RATE})
+            owners.append(owner)
+            pieces.append(chunk)
+            offset += len(chunk)
+
+    texts: List[List[str]] = [[] for _ in chunk_lists]
+    if not pieces:
+        return ["" for _ in chunk_lists]
+
+    segments, info = pipeline.transcribe(
+        np.concatenate(pieces),
+        clip_timestamps=clips,
+        batch_size=settings.WHISPER_BATCH_SIZE,
+        **{**TRANSCRIBE_OPTIONS, "vad_filter": False, "beam_size": tier.beam_size}
+    )
+
+    starts = [clip["start"] for clip in clips]
+    for segment in segments:
+        clip_index = max(0, bisect_right(starts, segment.start + 1e-3) - 1)
+        texts[owners[clip_index]].append(segment.text)
+
+    return [" ".join(parts).strip() for parts in texts]
+
+
+class TranscriptionEngine:
+    """Executor dedicado + fila limitada para o Faster-Whisper"""
+
+    def __init__(
+        self,
+        num_workers: int,
+        queue_size: int,
+        mode: str = "thread",
+        batching: bool = False,
+        batch_size: int = 8,
+        batch_window: float = 0.05
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Invalid WHISPER_WORKER_MODE: {mode}")
+
+        self.num_workers = max(1, num_workers)
+        self.queue_size = max(0, queue_size)
+        self.mode = mode
+        self.batching = batching
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self._batch: List[Tuple[_PreparedAudio, asyncio.Future, float]] = []
+        self._batch_timer: Optional[asyncio.TimerHandle] = None
+        self._dispatch_pending = False
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiting = 0
+        self._running = 0
+
+        metrics.register_gauge("transcription_queue_depth", lambda: self._waiting)
+        metrics.register_gauge("transcription_in_flight", lambda: self._running)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=context,
+                    initializer=_init_process_worker,
+                    initargs=(context.Barrier(self.num_workers),)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.num_workers,
+                    thread_name_prefix="whisper"
+                )
+            logger.info(f"🎙️ Transcription engine started: {self.num_workers} {self.mode} worker(s)")
+        return self._executor
+
+    async def transcribe(self, audio: AudioInput) -> TranscriptionResult:
+        """
+        Transcreve um áudio (bytes do upload, amostras 16 kHz ou caminho).
+
+        Raises:
+            TranscriptionQueueFull: se já houver WHISPER_QUEUE_SIZE áudios aguardando
+        """
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.num_workers)
+            self._slots_loop = loop
+
+        if self._slots.locked() and self._waiting >= self.queue_size:
+            metrics.inc("transcription_rejected_total")
+            raise TranscriptionQueueFull(f"{self._waiting} transcriptions waiting")
+
+        if self.batching:
+            return await self._transcribe_batched(audio)
+
+        if self._should_split(audio):
+            return await self._transcribe_parallel(audio)
+
+        await self._acquire_slot()
+
+        # Fila vista quando o worker assume o áudio (decide o nível de qualidade)
+        queue_depth = self._waiting
+        self._running += 1
+        started_at = time.perf_counter()
+        try:
+            worker_fn = _transcribe_in_process if self.mode == "process" else _transcribe_in_thread
+            result = await loop.run_in_executor(self._get_executor(), worker_fn, audio, queue_depth)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+        elapsed = time.perf_counter() - started_at
+        metrics.inc("transcription_tier_total", tier=result.tier)
+        metrics.observe("transcription_seconds", elapsed, tier=result.tier)
+        if result.audio_seconds > 0:
+            # Real-time factor: segundos de processamento por segundo de áudio
+            metrics.observe("transcription_rtf", elapsed / result.audio_seconds)
+        return result
+
+    async def _acquire_slot(self):
+        self._waiting += 1
+        enqueued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        metrics.observe("transcription_queue_wait_seconds", time.perf_counter() - enqueued_at)
+
+    def _should_split(self, audio: AudioInput) -> bool:
+        """Áudio longo o bastante para ser dividido entre os workers"""
+        threshold = settings.WHISPER_PARALLEL_MIN_SECONDS
+        if threshold <= 0 or self.num_workers < 2:
+            return False
+
+        if isinstance(audio, bytes):
+            duration = _header_duration(audio)
+        elif isinstance(audio, np.ndarray):
+            duration = len(audio) / SAMPLE_RATE
+        else:
+            duration = None
+        return duration is not None and duration >= threshold
+
+    async def _transcribe_parallel(self, audio: AudioInput) -> TranscriptionResult:
+        """Transcreve as partes de um áudio longo em workers diferentes e junta os textos em ordem"""
+        started_at = time.perf_counter()
+        prepared = await asyncio.to_thread(_prepare_chunks, audio)
+        if not prepared.chunks:
+            return TranscriptionResult("", prepared.audio_seconds, prepared.file_seconds)
+
+        tier = choose_tier(prepared.file_seconds, self._waiting)
+        parts = _split_parts(prepared.chunks, self.num_workers)
+        texts = await asyncio.gather(*[self._run_part(part, tier) for part in parts])
+
+        elapsed = time.perf_counter() - started_at
+        metrics.inc("transcription_tier_total", tier=tier.name)
+        metrics.inc("transcription_parallel_total")
+        metrics.observe("transcription_parallel_parts", len(parts))
+        metrics.observe("transcription_seconds", elapsed, tier=tier.name)
+        if prepared.audio_seconds > 0:
+            metrics.observe("transcription_rtf", elapsed / prepared.audio_seconds)
+
+        text = " ".join(text for text in texts if text)
+        return TranscriptionResult(text, prepared.audio_seconds, prepared.file_seconds, tier.name)
+
+    async def _run_part(self, samples: np.ndarray, tier: TranscriptionTier) -> str:
+        await self._acquire_slot()
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), _transcribe_part, samples, tier)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def _transcribe_batched(self, audio: AudioInput) -> TranscriptionResult:
+        self._waiting += 1
+        enqueued_at = time.perf_counter()
+        try:
+            prepared = await asyncio.to_thread(_prepare_chunks, audio)
+        except BaseException:
+            self._waiting -= 1
+            raise
+
+        if not prepared.chunks:
+            # Sem fala detectada: nada a transcrever
+            self._waiting -= 1
+            return TranscriptionResult("", prepared.audio_seconds, prepared.file_seconds)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((prepared, future, enqueued_at))
+
+        if sum(len(item[0].chunks) for item in self._batch) >= self.batch_size:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = loop.call_later(self.batch_window, self._flush_batch)
+
+        return await future
+
+    def _flush_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+
+        if self._batch and not self._dispatch_pending:
+            self._dispatch_pending = True
+            asyncio.get_running_loop().create_task(self._dispatch_batch())
+
+    def _take_batch(self) -> List[Tuple[_PreparedAudio, asyncio.Future, float]]:
+        """Retira da fila os áudios que cabem em um lote (pelo menos um)"""
+        items, chunks = [], 0
+        while self._batch:
+            prepared = self._batch[0][0]
+            if items and chunks + len(prepared.chunks) > self.batch_size:
+                break
+            items.append(self._batch.pop(0))
+            chunks += len(prepared.chunks)
+        return items
+
+    async def _dispatch_batch(self):
+        # O lote só é fechado quando há worker livre: áudios que chegam
+        # enquanto todos estão ocupados entram no mesmo lote
+        await self._slots.acquire()
+        self._dispatch_pending = False
+
+        items = self._take_batch()
+        self._waiting -= len(items)
+        # O áudio mais longo do lote e a fila restante decidem o nível do lote todo
+        tier = choose_tier(max(item[0].file_seconds for item in items), self._waiting)
+
+        if self._batch:
+            pending_chunks = sum(len(item[0].chunks) for item in self._batch)
+            if pending_chunks >= self.batch_size:
+                self._flush_batch()
+            elif self._batch_timer is None:
+                self._batch_timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush_batch)
+
+        await self._run_batch(items, tier)
+
+    async def _run_batch(self, items: List[Tuple[_PreparedAudio, asyncio.Future, float]], tier: TranscriptionTier):
+        now = time.perf_counter()
+        for _, _, enqueued_at in items:
+            metrics.observe("transcription_queue_wait_seconds", now - enqueued_at)
+
+        self._running += len(items)
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            texts = await loop.run_in_executor(
+                self._get_executor(), _transcribe_batch, [item[0].chunks for item in items], tier
+            )
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._running -= len(items)
+            self._slots.release()
+
+        elapsed = time.perf_counter() - started_at
+        audio_seconds = sum(item[0].audio_seconds for item in items)
+        metrics.inc("transcription_tier_total", value=len(items), tier=tier.name)
+        metrics.observe("transcription_seconds", elapsed, tier=tier.name)
+        metrics.observe("transcription_batch_requests", len(items))
+        metrics.observe("transcription_batch_chunks", sum(len(item[0].chunks) for item in items))
+        if audio_seconds > 0:
+            metrics.observe("transcription_rtf", elapsed / audio_seconds)
+
+        for (prepared, future, _), text in zip(items, texts):
+            if not future.done():
+                future.set_result(TranscriptionResult(text, prepared.audio_seconds, prepared.file_seconds, tier.name))
+
+    async def warmup(self):
+        """
+        Carrega e aquece o modelo em cada worker (chamado no startup).
+
+        No modo process o aquecimento roda no initializer de cada processo (o
+        pool não garante uma tarefa por processo); aqui são enviadas
+        WHISPER_WORKERS tarefas que esperam numa barreira, o que faz o pool
+        criar todos os processos e coleta os tempos uma vez por processo.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+
+        if self.mode == "process":
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _warmup_report) for _ in range(self.num_workers)
+            ])
+        else:
+            results = [await loop.run_in_executor(executor, _warmup_worker)]
+
+        for load_seconds, warmup_seconds in results:
+            if load_seconds is not None:
+                metrics.observe("whisper_model_load_seconds", load_seconds)
+            metrics.observe("whisper_warmup_seconds", warmup_seconds)
+        logger.info(f"🎙️ Whisper warmed up on {len(results)} worker(s)")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+transcription_engine = TranscriptionEngine(
+    num_workers=settings.WHISPER_WORKERS,
+    queue_size=settings.WHISPER_QUEUE_SIZE,
+    mode=settings.WHISPER_WORKER_MODE,
+    batching=settings.WHISPER_BATCHING_ENABLED,
+    batch_size=settings.WHISPER_BATCH_SIZE,
+    batch_window=settings.WHISPER_BATCH_WINDOW_MS / 1000
+)
@@ -0,0 +1,64 @@
+"""
+Política de qualidade da transcrição (níveis adaptativos)
+
+beam_size=5 no WHISPER_MODEL é lento demais no pico e desnecessário para
+respostas curtas ("sim", "não", "1"). A política escolhe modelo, beam e
+compute_type de cada áudio pela duração e pela fila do motor de transcrição:
+
+- fast: WHISPER_FAST_MODEL (ou WHISPER_MODEL), busca gulosa - áudios com
+  menos de WHISPER_SHORT_AUDIO_SECONDS ou fila >= WHISPER_FAST_QUEUE_DEPTH
+- greedy: WHISPER_MODEL, busca gulosa - fila >= WHISPER_GREEDY_QUEUE_DEPTH
+- full: WHISPER_MODEL, beam WHISPER_FULL_BEAM_SIZE - demais casos
+
+O nível usado é gravado em interactions.transcription_tier.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+from src.core.config import settings
+
+
+@dataclass(frozen=True)
+class TranscriptionTier:
+    name: str
+    model: Optional[str]  # None = WHISPER_MODEL
+    beam_size: int
+    compute_type: Optional[str] = None  # None = padrão do device (int8 na CPU)
+
+
+def tiers() -> dict:
+    """Níveis configurados, do mais rápido ao mais preciso"""
+    return {
+        "fast": TranscriptionTier(
+            "fast",
+            settings.WHISPER_FAST_MODEL or None,
+            1,
+            settings.WHISPER_FAST_COMPUTE_TYPE or None
+        ),
+        "greedy": TranscriptionTier("greedy", None, 1),
+        "full": TranscriptionTier("full", None, settings.WHISPER_FULL_BEAM_SIZE),
+    }
+
+
+def choose_tier(audio_seconds: Optional[float], queue_depth: int) -> TranscriptionTier:
+    """
+    Escolhe o nível de qualidade de uma transcrição.
+
+    Args:
+        audio_seconds: duração do áudio (None se desconhecida)
+        queue_depth: transcrições aguardando worker no momento da escolha
+
+    Returns:
+        TranscriptionTier com modelo, beam e compute_type a usar
+    """
+    available = tiers()
+    if not settings.WHISPER_ADAPTIVE_QUALITY:
+        return available["full"]
+
+    if audio_seconds is not None and audio_seconds < settings.WHISPER_SHORT_AUDIO_SECONDS:
+        return available["fast"]
+    if queue_depth >= settings.WHISPER_FAST_QUEUE_DEPTH:
+        return available["fast"]
+    if queue_depth >= settings.WHISPER_GREEDY_QUEUE_DEPTH:
+        return available["greedy"]
+    return available["full"]
@@ -0,0 +1,400 @@
+"""
+Fila durável do /webhook
+
+Com WEBHOOK_QUEUE_ENABLED=true o endpoint apenas persiste a mensagem em
+`webhook_jobs` e responde 202. Um pool de workers assíncronos reivindica os
+jobs (SELECT ... FOR UPDATE SKIP LOCKED), processa a mensagem e entrega a
+resposta via WhatsAppService.send_message.
+
+Falhas são reagendadas com backoff exponencial (com jitter) até
+WEBHOOK_QUEUE_MAX_ATTEMPTS.
+
+Com MESSAGE_DEBOUNCE_SECONDS > 0, cada nova mensagem adia os jobs pendentes
+do mesmo telefone; o worker que reivindica o job mais antigo absorve os
+demais pendentes (status 'merged') e processa todos como um único turno.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from sqlalchemy import and_, or_, func, exists
+from sqlalchemy.orm import Session, aliased
+from src.core.config import settings
+from src.core.database import with_session
+from src.core.metrics import metrics
+from src.models.webhook_job import WebhookJob
+from src.services.message_dedup import message_dedup
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookQueue:
+    """Operações da fila sobre a tabela webhook_jobs"""
+
+    def enqueue(
+        self,
+        phone: str,
+        message_type: str,
+        db: Session,
+        text: Optional[str] = None,
+        audio_data: Optional[bytes] = None,
+        message_id: Optional[str] = None
+    ) -> WebhookJob:
+        """
+        Persiste uma mensagem recebida para processamento assíncrono.
+
+        Args:
+            phone: Telefone do remetente
+            message_type: 'text' ou 'audio'
+            db: Sessão do banco de dados
+            text: Texto da mensagem (mensagens de texto)
+            audio_data: Bytes do áudio (transcrito pelo worker)
+            message_id: Id da mensagem no WhatsApp (a resposta final é guardada para deduplicação)
+
+        Returns:
+            WebhookJob criado
+        """
+        job = WebhookJob(
+            phone=phone,
+            message_type=message_type,
+            text=text,
+            audio_data=audio_data,
+            message_id=message_id,
+            status='pending'
+        )
+
+        window = settings.MESSAGE_DEBOUNCE_SECONDS
+        if window > 0:
+            # Debounce: esta mensagem e as pendentes do mesmo telefone esperam a janela reiniciar
+            job.available_at = func.now() + timedelta(seconds=window)
+            db.query(WebhookJob).filter(
+                WebhookJob.phone == phone,
+                WebhookJob.status == 'pending'
+            ).update(
+                {
+                    WebhookJob.available_at: func.least(
+                        func.now() + timedelta(seconds=window),
+                        WebhookJob.created_at + timedelta(seconds=settings.MESSAGE_DEBOUNCE_MAX_SECONDS)
+                    )
+                },
+                synchronize_session=False
+            )
+
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        metrics.inc("webhook_queue_enqueued_total", message_type=message_type)
+        logger.info(f"📥 Job enqueued: {job.id} ({message_type}) from {phone}")
+        return job
+
+    def claim_next(self, db: Session) -> Optional[WebhookJob]:
+        """
+        Reivindica o próximo job disponível.
+
+        Usa FOR UPDATE SKIP LOCKED: workers concorrentes (inclusive em outros
+        processos/nós) nunca pegam o mesmo job. Jobs presos em 'processing'
+        além do visibility timeout (worker morreu) voltam a ser elegíveis.
+
+        Ordem por telefone: um job só é elegível quando não há job mais antigo
+        do mesmo telefone ainda pendente/em processamento.
+
+        Returns:
+            WebhookJob destacado da sessão, ou None se a fila estiver vazia
+        """
+        stale_before = func.now() - timedelta(seconds=settings.WEBHOOK_QUEUE_VISIBILITY_TIMEOUT)
+        older = aliased(WebhookJob)
+
+        job = db.query(WebhookJob).filter(
+            or_(
+                and_(WebhookJob.status == 'pending', WebhookJob.available_at <= func.now()),
+                and_(WebhookJob.status == 'processing', WebhookJob.started_at < stale_before)
+            ),
+            ~exists().where(
+                older.phone == WebhookJob.phone,
+                older.status.in_(['pending', 'processing']),
+                older.created_at < WebhookJob.created_at
+            )
+        ).order_by(
+            WebhookJob.available_at, WebhookJob.created_at
+        ).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.rollback()
+            return None
+
+        job.status = 'processing'
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = func.now()
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+        return job
+
+    def absorb_pending(self, job: WebhookJob, db: Session) -> List[WebhookJob]:
+        """
+        Absorve as mensagens pendentes do mesmo telefone no job reivindicado (debounce).
+
+        Também devolve as já absorvidas em tentativas anteriores, para que um
+        retry processe exatamente o mesmo turno.
+
+        Returns:
+            Jobs absorvidos (destacados da sessão), em ordem de chegada
+        """
+        if settings.MESSAGE_DEBOUNCE_SECONDS <= 0:
+            return []
+
+        pending = db.query(WebhookJob).filter(
+            WebhookJob.phone == job.phone,
+            WebhookJob.status == 'pending',
+            WebhookJob.id != job.id
+        ).with_for_update(skip_locked=True).all()
+
+        for sibling in pending:
+            sibling.status = 'merged'
+            sibling.merged_into = job.id
+        db.commit()
+
+        absorbed = db.query(WebhookJob).filter(
+            WebhookJob.merged_into == job.id
+        ).order_by(WebhookJob.created_at).all()
+
+        for sibling in absorbed:
+            db.expunge(sibling)
+
+        if pending:
+            metrics.inc("debounce_absorbed_messages_total", len(pending))
+            logger.info(f"⏱️ Job {job.id} absorbed {len(pending)} pending message(s) from {job.phone}")
+        return absorbed
+
+    def save_response(self, job_id, response: str, db: Session):
+        """Guarda a resposta gerada para que retries de entrega não reprocessem a mensagem"""
+        db.query(WebhookJob).filter(WebhookJob.id == job_id).update(
+            {WebhookJob.response: response},
+            synchronize_session=False
+        )
+        db.commit()
+
+    def mark_done(self, job_id, db: Session):
+        db.query(WebhookJob).filter(WebhookJob.id == job_id).update(
+            {
+                WebhookJob.status: 'done',
+                WebhookJob.finished_at: func.now(),
+                WebhookJob.audio_data: None  # libera espaço; o áudio não é mais necessário
+            },
+            synchronize_session=False
+        )
+        db.query(WebhookJob).filter(WebhookJob.merged_into == job_id).update(
+            {WebhookJob.finished_at: func.now(), WebhookJob.audio_data: None},
+            synchronize_session=False
+        )
+        db.commit()
+
+    def mark_failed(self, job_id, error: str, db: Session) -> bool:
+        """
+        Registra a falha e reagenda com backoff exponencial.
+
+        Returns:
+            True se o job foi reagendado, False se esgotou as tentativas
+        """
+        job = db.query(WebhookJob).filter(WebhookJob.id == job_id).first()
+        if not job:
+            return False
+
+        job.last_error = error[:2000]
+
+        if job.attempts >= settings.WEBHOOK_QUEUE_MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.finished_at = func.now()
+            db.commit()
+            metrics.inc("webhook_queue_failed_total")
+            logger.error(f"❌ Job {job_id} failed permanently after {job.attempts} attempts: {error}")
+            return False
+
+        delay = self._retry_delay(job.attempts)
+        job.status = 'pending'
+        job.available_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        db.commit()
+        metrics.inc("webhook_queue_retries_total")
+        logger.warning(f"⚠️ Job {job_id} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {error}")
+        return True
+
+    def defer(self, job_id, delay: float, db: Session):
+        """Devolve o job à fila sem contar como tentativa (backpressure, não falha)"""
+        db.query(WebhookJob).filter(WebhookJob.id == job_id).update(
+            {
+                WebhookJob.status: 'pending',
+                WebhookJob.attempts: WebhookJob.attempts - 1,
+                WebhookJob.started_at: None,
+                WebhookJob.available_at: func.now() + timedelta(seconds=delay)
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        metrics.inc("webhook_queue_deferred_total")
+
+    def message_ids(self, job_id, db: Session) -> List[str]:
+        """message_ids do job e das mensagens absorvidas por ele (debounce)"""
+        rows = db.query(WebhookJob.message_id).filter(
+            or_(WebhookJob.id == job_id, WebhookJob.merged_into == job_id),
+            WebhookJob.message_id.isnot(None)
+        ).all()
+        return [row.message_id for row in rows]
+
+    def pending_count(self, db: Session) -> int:
+        return db.query(WebhookJob).filter(WebhookJob.status == 'pending').count()
+
+    def _retry_delay(self, attempts: int) -> float:
+        """Backoff exponencial com jitter: base * 2^(n-1), limitado ao máximo"""
+        delay = min(
+            settings.WEBHOOK_QUEUE_RETRY_MAX_SECONDS,
+            settings.WEBHOOK_QUEUE_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+        )
+        return delay * random.uniform(0.5, 1.0)
+
+
+class WebhookWorkerPool:
+    """Pool de workers asyncio que consomem a fila do webhook"""
+
+    def __init__(self, queue: WebhookQueue, num_workers: int):
+        self.queue = queue
+        self.num_workers = num_workers
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        if self._tasks:
+            return
+
+        self._stopping.clear()
+        metrics.register_gauge(
+            "webhook_queue_depth",
+            lambda: with_session(self.queue.pending_count)
+        )
+        for worker_id in range(self.num_workers):
+            self._tasks.append(asyncio.create_task(self._worker_loop(worker_id)))
+        logger.info(f"🚀 Webhook queue started with {self.num_workers} workers")
+
+    async def stop(self):
+        if not self._tasks:
+            return
+
+        self._stopping.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Webhook queue workers stopped")
+
+    async def _worker_loop(self, worker_id: int):
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(with_session, self.queue.claim_next)
+            except Exception as e:
+                logger.error(f"Worker {worker_id}: error claiming job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=settings.WEBHOOK_QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._handle_job(job)
+
+    async def _handle_job(self, job: WebhookJob):
+        # Imports tardios: message_processor importa todos os agentes
+        from src.agents.writer import WriterAgent
+        from src.services import whisper_service
+        from src.services.message_processor import InboundMessage, process_turn
+        from src.services.transcription_engine import TranscriptionQueueFull
+        from src.services.whatsapp_service import WhatsAppService
+
+        if job.started_at and job.created_at:
+            metrics.observe(
+                "webhook_queue_wait_seconds",
+                (job.started_at - job.created_at).total_seconds()
+            )
+
+        if job.attempts > settings.WEBHOOK_QUEUE_MAX_ATTEMPTS:
+            await asyncio.to_thread(with_session, self.queue.mark_failed, job.id, "visibility timeout exceeded")
+            await self._release_messages(job.id)
+            return
+
+        writer = WriterAgent()
+        response_text = job.response
+
+        try:
+            if response_text is None:
+                absorbed = await asyncio.to_thread(with_session, self.queue.absorb_pending, job)
+                messages = []
+
+                for queued in [job] + absorbed:
+                    text = queued.text
+                    audio_duration = queued.audio_duration_seconds
+                    tier = None
+
+                    if queued.message_type == 'audio':
+                        with metrics.timer("webhook_stage_seconds", stage="transcription"):
+                            text, audio_duration, tier = await whisper_service.transcribe_audio_bytes(queued.audio_data)
+                        logger.info(f"Transcription: {text}")
+
+                    if text and text.strip():
+                        messages.append(InboundMessage(text, queued.message_type, audio_duration, tier))
+
+                if not messages:
+                    response_text = await writer.empty_message_response(is_audio=job.message_type == 'audio')
+                else:
+                    response_text = await process_turn(job.phone, messages)
+
+                await asyncio.to_thread(with_session, self.queue.save_response, job.id, response_text)
+
+                if settings.MESSAGE_DEDUP_ENABLED:
+                    # Reenvios destas mensagens não geram novo processamento
+                    for queued in [job] + absorbed:
+                        if queued.message_id:
+                            await asyncio.to_thread(
+                                with_session, message_dedup.complete, queued.message_id,
+                                response_text if queued is job else ""
+                            )
+
+            with metrics.timer("webhook_stage_seconds", stage="delivery"):
+                result = await WhatsAppService.send_message(job.phone, response_text)
+            if not result.get("success"):
+                raise RuntimeError(result.get("error", "WhatsApp delivery failed"))
+
+            await asyncio.to_thread(with_session, self.queue.mark_done, job.id)
+            metrics.inc("webhook_queue_processed_total")
+
+            if job.created_at:
+                metrics.observe(
+                    "webhook_queue_end_to_end_seconds",
+                    (datetime.now(timezone.utc) - job.created_at).total_seconds()
+                )
+
+        except TranscriptionQueueFull:
+            logger.info(f"🎙️ Transcription queue full, deferring job {job.id}")
+            await asyncio.to_thread(
+                with_session, self.queue.defer, job.id, settings.WHISPER_QUEUE_RETRY_AFTER_SECONDS
+            )
+
+        except Exception as e:
+            logger.error(f"Error processing job {job.id}: {e}", exc_info=True)
+            rescheduled = await asyncio.to_thread(with_session, self.queue.mark_failed, job.id, str(e))
+
+            # Sem mais tentativas e sem resposta gerada: avisa o usuário como o webhook síncrono faria
+            if not rescheduled and response_text is None:
+                await self._release_messages(job.id)
+                await WhatsAppService.send_message(job.phone, await writer.generic_error_response())
+
+    async def _release_messages(self, job_id):
+        """Falha definitiva: libera o message_id do job e das mensagens absorvidas, para que reenvios sejam processados"""
+        if not settings.MESSAGE_DEDUP_ENABLED:
+            return
+        for message_id in await asyncio.to_thread(with_session, self.queue.message_ids, job_id):
+            await asyncio.to_thread(with_session, message_dedup.release, message_id)
+
+
+webhook_queue = WebhookQueue()
+webhook_worker_pool = WebhookWorkerPool(webhook_queue, settings.WEBHOOK_QUEUE_WORKERS)
@@ -1,36 +1,49 @@
-from src.core.whisper_model import whisper_singleton
+from src.services.transcription_engine import (
+    transcription_engine,
+    decode_audio_bytes,
+    SAMPLE_RATE,
+)
+from src.services.transcription_cache import transcription_cache
+from typing import Optional, Tuple, Union
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
-async def transcribe_audio(audio_path: str) -> str:
+# O bot acelera o áudio em 1.25x (ffmpeg atempo) antes de enviar
+BOT_SPEEDUP = 1.25
+
+
+async def transcribe_audio(audio: Union[str, np.ndarray]) -> str:
     """
     Transcribes audio using the local Faster-Whisper model.
+
+    Args:
+        audio: caminho de um arquivo ou amostras float32 mono 16 kHz (decode_audio_bytes)
+
+    Raises:
+        TranscriptionQueueFull: se a fila de transcrição estiver cheia
     """
     try:
-        model = whisper_singleton.get_model()
-        
-        # Run transcription in a thread pool since it's CPU bound and blocking
-        # For async FastAPI, we usually want to offload this. 
-        # However, faster-whisper releases GIL, so it might be okay.
-        # But to be safe and keep event loop responsive:
-        import asyncio
-        from functools import partial
-        
-        loop = asyncio.get_event_loop()
-        
-        def _run_transcribe():
-            segments, info = model.transcribe(
-                audio_path,
-                language="pt",
-                beam_size=5,
-                vad_filter=True
-            )
-            return " ".join([segment.text for segment in segments])
-
-        text = await loop.run_in_executor(None, _run_transcribe)
-        return text.strip()
-        
+        result = await transcription_engine.transcribe(audio)
+        return result.text
     except Exception as e:
         logger.error(f"Error in transcription: {e}")
         raise
+
+
+async def transcribe_audio_bytes(content: bytes) -> Tuple[str, float, Optional[str]]:
+    """
+    Transcreve um áudio recebido em memória (upload do WhatsApp), sem arquivo
+    temporário: o áudio é decodificado uma vez (no worker de transcrição) e as
+    amostras vão direto ao modelo. Áudios idênticos já transcritos (notas
+    encaminhadas/reenviadas) vêm do transcription_cache.
+
+    Returns:
+        (texto transcrito, duração real estimada em segundos, nível de qualidade usado)
+
+    Raises:
+        TranscriptionQueueFull: se a fila de transcrição estiver cheia
+    """
+    result = await transcription_cache.get_or_transcribe(content, transcription_engine.transcribe)
+    return result.text, result.file_seconds * BOT_SPEEDUP, result.tier
@@ -6,6 +6,7 @@ async function sendToBackend(msg) {
   try {
     const payload = {
       from: msg.from,
+      message_id: msg.id._serialized,
       body: msg.body,
       timestamp: msg.timestamp,
       type: msg.type,
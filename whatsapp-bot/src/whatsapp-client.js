@@ -122,6 +122,7 @@ class WhatsappBot {
     async sendAudioToBackend(msg, filePath) {
         const form = new FormData();
         form.append('from', msg.from);
+        form.append('message_id', msg.id._serialized);
         form.append('message_type', 'audio');
         form.append('timestamp', msg.timestamp);
         form.append('audio_file', fs.createReadStream(filePath));